@@ -1,6 +1,9 @@
+import hashlib
 import os
+import secrets
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -10,7 +13,12 @@ from pydantic import BaseModel
 # Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-for-dev-only")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+# Short-lived access tokens; clients renew them via /auth/refresh instead of logging in again
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# A rotated refresh token presented again within this window is a client race
+# (two tabs refreshing at once), not a replay; it is rejected without revoking the family.
+REFRESH_REUSE_GRACE_SECONDS = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -63,3 +71,75 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         full_name=user.get("full_name"),
         profile=user.get("profile"),
     )
+
+
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are 256-bit random strings; a fast hash is enough at rest (no bcrypt)."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue_refresh_token(user_id: str, email: str, family_id: Optional[str] = None) -> str:
+    """New opaque refresh token; only its hash is stored. Rotations share the login's family_id."""
+    from app.db.mongodb import mongodb_client
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    mongodb_client.save_refresh_token({
+        "_id": hash_refresh_token(token),
+        "user_id": user_id,
+        "email": email,
+        "family_id": family_id or uuid.uuid4().hex,
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "used_at": None,
+    })
+    return token
+
+
+def rotate_refresh_token(token: str) -> Tuple[str, str]:
+    """
+    Spend a refresh token: returns (email, new refresh token). A token used
+    twice outside the grace window means it leaked, so its whole family is revoked.
+    """
+    from app.db.mongodb import mongodb_client
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    token_hash = hash_refresh_token(token)
+    doc = mongodb_client.consume_refresh_token(token_hash)
+    if doc is None:
+        spent = mongodb_client.get_refresh_token(token_hash)
+        if spent and spent.get("used_at"):
+            if (datetime.utcnow() - spent["used_at"]).total_seconds() > REFRESH_REUSE_GRACE_SECONDS:
+                print(f"DEBUG: [Auth] Refresh token reuse for user {spent['user_id']}, revoking family")
+                mongodb_client.delete_refresh_family(spent["family_id"])
+        raise invalid
+    return doc["email"], issue_refresh_token(doc["user_id"], doc["email"], doc["family_id"])
+
+
+def revoke_refresh_token(token: str):
+    """Log out one session: drop every token in the presented token's family."""
+    from app.db.mongodb import mongodb_client
+    doc = mongodb_client.get_refresh_token(hash_refresh_token(token))
+    if doc:
+        mongodb_client.delete_refresh_family(doc["family_id"])
+
+
+def is_admin_token(authorization: Optional[str]) -> bool:
+    """Cheap admin check from a raw Authorization header (no DB lookup); used by middleware."""
+    from app.core.config import ADMIN_EMAILS
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return False
+    return str(payload.get("sub", "")).lower() in ADMIN_EMAILS
+
+
+async def get_current_admin(current_user=Depends(get_current_user)):
+    from app.core.config import ADMIN_EMAILS
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
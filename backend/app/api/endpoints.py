@@ -1,17 +1,39 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from app.core.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models.schemas import (
     UserProfile, NutritionProfile, RecipeQuery, RecipeResult, 
     MealPlanRequest, CalendarResponse, UserCreate, Token, User,
-    ChatRequest, ChatResponse
+    ChatRequest, ChatResponse, NutritionBatchRequest, RecipeBatchRequest,
+    MealSwapRequest, RefreshRequest
 )
-from app.services.nutrition import calculate_nutrition_profile
-from app.services.meal_planner import meal_planner_service
+from app.services.nutrition import calculate_nutrition_profile, calculate_nutrition_profiles_batch, nutrition_cache_info
+from app.core.prompt_builder import prompt_builder
+from app.services.candidate_pool import candidate_pool_cache
+from app.services.recipe_cache import recipe_cache
+from app.services.suggest import recipe_suggester
+from app.services.chat_retention import chat_retention_service
+from app.services.meal_fitting import best_replacement
+from app.services.compression import prompt_compressor
+from app.services.cohort_planner import cohort_planner, parse_members
+from app.core.config import (
+    RECIPE_BATCH_MAX_IDS, SEARCH_MAX_PAGE_SIZE, MEAL_PLAN_DEADLINE_SECONDS, MEAL_PLAN_MAX_DEADLINE_SECONDS,
+    MEAL_PLAN_MAX_MEALS_PER_DAY
+)
+from app.core.resilience import Deadline
+from app.core.profiling import profile_store
+from app.core.tracing import tracer
+from app.services.meal_planner import meal_planner_service, PlanUnavailable
 from app.services.chat_service import chat_service
-from app.db.mongodb import mongodb_client
-from app.api.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from app.db.mongodb import mongodb_client, parse_page_cursor
+from app.api.auth import (
+    get_password_hash, verify_password, create_access_token, get_current_user, get_current_admin,
+    issue_refresh_token, rotate_refresh_token, revoke_refresh_token, ACCESS_TOKEN_EXPIRE_MINUTES
+)
 
 router = APIRouter()
 
@@ -56,8 +78,38 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if not user or not verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
-    access_token = create_access_token(data={"sub": user["email"]})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _token_pair(user["email"], issue_refresh_token(user["id"], user["email"]))
+
+def _token_pair(email: str, refresh_token: str) -> dict:
+    access_token = create_access_token(
+        data={"sub": email}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+@router.post("/auth/refresh", response_model=Token)
+def refresh(req: RefreshRequest):
+    """
+    Trade a refresh token for a new access token and a new refresh token
+    (rotation). One indexed Mongo update and a SHA-256; no bcrypt, no user lookup.
+    """
+    email, refresh_token = rotate_refresh_token(req.refresh_token)
+    return _token_pair(email, refresh_token)
+
+@router.post("/auth/logout")
+def logout(req: RefreshRequest):
+    """Revoke this session's refresh tokens (the whole rotation family)."""
+    revoke_refresh_token(req.refresh_token)
+    return {"status": "logged_out"}
+
+@router.post("/auth/logout-all")
+def logout_all(current_user: User = Depends(get_current_user)):
+    """Revoke every refresh token the user holds (all devices)."""
+    return {"status": "logged_out", "revoked": mongodb_client.delete_user_refresh_tokens(current_user.id)}
 
 @router.post("/user/nutrition", response_model=NutritionProfile)
 def get_nutrition(profile: UserProfile, current_user: User = Depends(get_current_user)):
@@ -66,6 +118,69 @@ def get_nutrition(profile: UserProfile, current_user: User = Depends(get_current
     mongodb_client.save_user_profile(current_user.id, profile)
     return nutrition
 
+@router.post("/admin/nutrition/batch", response_model=List[NutritionProfile])
+def get_nutrition_batch(req: NutritionBatchRequest, current_user: User = Depends(get_current_admin)):
+    """Vectorized nutrition targets for a cohort of profiles (analytics / recomputation)."""
+    # The batch already yields NutritionProfile-shaped dicts; skip response_model re-validation
+    return ORJSONResponse(calculate_nutrition_profiles_batch(req.profiles))
+
+@router.post("/admin/cohorts/plans")
+async def plan_cohort(request: Request, cohort_id: str, days: int = 7,
+                      meals_per_day: int = Query(3, ge=1, le=MEAL_PLAN_MAX_MEALS_PER_DAY),
+                      llm_overviews: bool = False, current_user: User = Depends(get_current_admin)):
+    """
+    Batch plans for a cohort. Body: JSONL of {"member_id", "profile"} (or bare
+    profiles). Streams NDJSON plan/error lines as they finish, then a summary
+    with plans/sec; plans are upserted into cohort_plans under `cohort_id`.
+    """
+    body = (await request.body()).decode("utf-8")
+    members, parse_errors = parse_members(body.splitlines())
+    if not members:
+        raise HTTPException(status_code=400, detail={"message": "No valid members", "errors": parse_errors[:20]})
+
+    def lines():
+        for record in parse_errors:
+            yield json.dumps(record) + "\n"
+        for record in cohort_planner.run(members, days, meals_per_day, cohort_id, llm_overviews):
+            yield json.dumps(record) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/admin/metrics")
+def get_cache_metrics(current_user: User = Depends(get_current_admin)):
+    """Hit/miss counters for the in-process caches."""
+    return {
+        "nutrition": nutrition_cache_info(),
+        "prompts": prompt_builder.stats(),
+        "candidate_pools": candidate_pool_cache.stats(),
+        "recipes": recipe_cache.stats(),
+        "suggest": recipe_suggester.stats(),
+        "chat_retention": chat_retention_service.stats(),
+        "prompt_compression": prompt_compressor.stats(),
+        "gemini_context_cache": meal_planner_service.context_cache.stats() if meal_planner_service.context_cache else None,
+        "meal_planner": meal_planner_service.stats(),
+    }
+
+@router.get("/admin/profiles")
+def list_profiles(current_user: User = Depends(get_current_admin)):
+    """Recently captured request profiles, newest first."""
+    return profile_store.list()
+
+@router.get("/admin/profiles/{request_id}")
+def download_profile(request_id: str, current_user: User = Depends(get_current_admin)):
+    """Speedscope JSON for one profiled request (open at https://www.speedscope.app)."""
+    profile = profile_store.get(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return ORJSONResponse(profile, headers={
+        "Content-Disposition": f'attachment; filename="profile-{request_id}.speedscope.json"'
+    })
+
+@router.get("/admin/traces/summary")
+def get_trace_summary(current_user: User = Depends(get_current_admin)):
+    """Per-route latency with per-stage (self time) avg/p95/max and the slowest stage."""
+    return tracer.summary.view()
+
 @router.get("/user/me", response_model=User)
 def get_me(current_user: User = Depends(get_current_user)):
     """Return the authenticated user's basic info."""
@@ -90,60 +205,236 @@ def get_user_profile(current_user: User = Depends(get_current_user)):
 def search_recipes(req: RecipeQuery):
     """
     Personalized recipe search using MongoDB text search + filtering.
+    Pages of `top_k` results; when more exist, the X-Next-Cursor header
+    carries the value to send as `cursor` for the next page.
     """
+    if not 1 <= req.top_k <= SEARCH_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {SEARCH_MAX_PAGE_SIZE}")
+    if req.cursor and parse_page_cursor(req.cursor) is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     try:
-        # We handle mapping from MongoDB docs to RecipeResult
-        recipes = mongodb_client.find_recipes(
+        # The Mongo projection already shapes docs like RecipeResult,
+        # so they go straight to orjson without re-validation.
+        recipes, next_cursor = mongodb_client.find_recipes_page(
             query=req.query,
             profile=req.user_profile,
-            limit=req.top_k
+            filters=req.filters,
+            limit=req.top_k,
+            after=req.cursor
         )
-        return [RecipeResult(**r) for r in recipes]
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return ORJSONResponse(recipes, headers=headers)
+    except ValueError as e:
+        # A well-formed cursor from a different query (text vs. _id order)
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/recipes/batch", response_model=List[RecipeResult])
+def get_recipes_batch(req: RecipeBatchRequest):
+    """
+    Resolve many recipe IDs in one round trip (e.g. every meal in a plan).
+    Returned in request order; unknown or malformed IDs are omitted.
+    """
+    if len(req.ids) > RECIPE_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {RECIPE_BATCH_MAX_IDS} ids per request")
+    return ORJSONResponse(recipe_cache.get_many(req.ids))
+
+@router.get("/recipes/suggest")
+def suggest_recipes(q: str = "", k: Optional[int] = None, diet: Optional[str] = None,
+                    allergens: Optional[str] = None):
+    """
+    Title typeahead from the in-memory prefix index: [{"id", "title"}], most
+    popular first. `diet` and `allergens` are comma-separated, with the same
+    meaning as the profile filters in /search.
+    """
+    if k is not None and k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+    return ORJSONResponse(recipe_suggester.suggest(
+        q, k, diets=(diet or "").split(","), allergens=(allergens or "").split(",")
+    ))
+
 @router.get("/recipes/{recipe_id}", response_model=RecipeResult)
 def get_recipe(recipe_id: str):
-    """Fetch a single recipe by its ID from MongoDB."""
+    """Fetch a single recipe by its ID (read-through cache over MongoDB)."""
     from bson import ObjectId
-    try:
-        recipe = mongodb_client.recipes_collection.find_one({"_id": ObjectId(recipe_id)})
-        if not recipe:
-            raise HTTPException(status_code=404, detail="Recipe not found")
-        recipe["id"] = str(recipe.pop("_id"))
-        return RecipeResult(**recipe)
-    except Exception:
+    if not ObjectId.is_valid(recipe_id):
         raise HTTPException(status_code=400, detail="Invalid recipe ID")
+    recipe = recipe_cache.get(recipe_id)
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return ORJSONResponse(recipe)
+
+def _request_deadline(request: Request) -> Deadline:
+    """The client's budget from X-Request-Deadline-Ms, else the server default; capped either way."""
+    raw = request.headers.get("x-request-deadline-ms")
+    if raw is None:
+        return Deadline(MEAL_PLAN_DEADLINE_SECONDS)
+    try:
+        seconds = float(raw) / 1000
+    except ValueError:
+        raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be a number of milliseconds")
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="X-Request-Deadline-Ms must be positive")
+    return Deadline(min(seconds, MEAL_PLAN_MAX_DEADLINE_SECONDS))
 
 @router.post("/meal-plan", response_model=CalendarResponse)
-def generate_meal_plan(req: MealPlanRequest, current_user: User = Depends(get_current_user)):
+def generate_meal_plan(req: MealPlanRequest, request: Request, response: Response,
+                       current_user: User = Depends(get_current_user)):
     """
     Generate an interactive, structured meal plan and save it to the DB.
+    Gemini is used while the deadline allows; otherwise the plan is fitted
+    locally. `generation` in the body and X-Plan-Path say which path was taken.
     """
+    deadline = _request_deadline(request)
     try:
         query = f"I want a {req.days}-day meal plan with {req.meals_per_day} meals per day."
         plan = meal_planner_service.generate_interactive_meal_plan(
             query=query,
             profile=req.user_profile,
             days=req.days,
-            user_id=current_user.id
+            user_id=current_user.id,
+            meals_per_day=req.meals_per_day,
+            deadline=deadline,
         )
         # Store in MongoDB
-        mongodb_client.save_meal_plan(current_user.id, plan.model_dump())
+        with tracer.span("mongo.save_meal_plan"):
+            mongodb_client.save_meal_plan(current_user.id, plan.model_dump(), req.user_profile)
+        response.headers["X-Plan-Path"] = plan.generation.path
         return plan
+    except PlanUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         import traceback
         print(f"Error in generate_meal_plan: {str(e)}")
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Meal plan generation failed")
+
+@router.post("/meal-plan/stream")
+def stream_meal_plan(req: MealPlanRequest, request: Request, current_user: User = Depends(get_current_user)):
+    """
+    Same as POST /meal-plan, but pushes each day as soon as Gemini finishes it.
+    NDJSON by default; Server-Sent Events when the client accepts text/event-stream.
+    Events: {"type": "day"}, then {"type": "plan"} (after it is saved) or {"type": "error"}.
+    """
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+    query = f"I want a {req.days}-day meal plan with {req.meals_per_day} meals per day."
+    deadline = _request_deadline(request)
+
+    def encode(event: dict) -> str:
+        line = json.dumps(event)
+        return f"event: {event['type']}\ndata: {line}\n\n" if use_sse else f"{line}\n"
+
+    def events():
+        try:
+            for kind, payload in meal_planner_service.stream_interactive_meal_plan(
+                query=query,
+                profile=req.user_profile,
+                days=req.days,
+                user_id=current_user.id,
+                meals_per_day=req.meals_per_day,
+                deadline=deadline,
+            ):
+                if kind == "day":
+                    yield encode({"type": "day", "day": payload.model_dump()})
+                else:
+                    plan_data = payload.model_dump()
+                    with tracer.span("mongo.save_meal_plan"):
+                        mongodb_client.save_meal_plan(current_user.id, plan_data, req.user_profile)
+                    yield encode({"type": "plan", "plan": plan_data})
+        except Exception as e:
+            import traceback
+            print(f"Error in stream_meal_plan: {str(e)}")
+            traceback.print_exc()
+            detail = str(e) if isinstance(e, PlanUnavailable) else "Meal plan generation failed"
+            yield encode({"type": "error", "detail": detail})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/meal-plan/latest", response_model=Optional[CalendarResponse])
 def get_latest_meal_plan(current_user: User = Depends(get_current_user)):
-    """Fetch the user's latest generated meal plan."""
+    """Fetch the user's latest generated meal plan (validated when it was saved)."""
     plan_data = mongodb_client.get_latest_meal_plan(current_user.id)
-    if not plan_data:
-        return None
-    return CalendarResponse(**plan_data)
+    return ORJSONResponse(plan_data or None)
+
+def _plan_ics_response(request: Request, user_id: str, start: Optional[str], filename: Optional[str]):
+    """Streamed .ics for the user's latest plan, with ETag / If-None-Match revalidation."""
+    from app.services.ical import iter_plan_ics, plan_etag
+    export = mongodb_client.get_meal_plan_export(user_id)
+    if not export:
+        raise HTTPException(status_code=404, detail="No meal plan found. Generate one first.")
+    saved_at = export["saved_at"]
+    try:
+        base_date = datetime.fromisoformat(start) if start else (saved_at or datetime.utcnow())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start must be a date like 2026-03-01")
+    base_date = datetime(base_date.year, base_date.month, base_date.day)
+
+    etag = plan_etag(export["plan"], base_date, saved_at)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(
+        (chunk.encode("utf-8") for chunk in iter_plan_ics(export["plan"], user_id, base_date, saved_at or base_date)),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers,
+    )
+
+@router.get("/meal-plan/latest.ics")
+def export_latest_meal_plan_ics(request: Request, start: Optional[str] = None,
+                                current_user: User = Depends(get_current_user)):
+    """
+    Download the latest plan as an iCalendar file (no Google account needed).
+    `start` (YYYY-MM-DD) defaults to the day the plan was generated.
+    """
+    return _plan_ics_response(request, current_user.id, start, "fitfork-meal-plan.ics")
+
+@router.patch("/meal-plan/latest/meals", response_model=CalendarResponse)
+def swap_meal(req: MealSwapRequest, current_user: User = Depends(get_current_user)):
+    """
+    Replace one meal of the latest plan with the best-fitting alternative
+    from the cached candidate pool. Ranked locally against what's left of
+    the day's macro budget; no LLM call. Uses the profile the plan was
+    generated for, so later profile edits don't skew the swap.
+    """
+    stored = mongodb_client.get_latest_meal_plan_with_profile(current_user.id)
+    if not stored:
+        raise HTTPException(status_code=404, detail="No meal plan found. Generate one first.")
+    # Plans saved before the profile was stored alongside fall back to the current one
+    profile = stored["profile"] or current_user.profile
+    if not profile:
+        raise HTTPException(status_code=400, detail="Save your profile before swapping meals.")
+
+    plan = CalendarResponse(**stored["plan"])
+    day_index = next((i for i, d in enumerate(plan.days) if d.day_number == req.day_number), None)
+    if day_index is None:
+        raise HTTPException(status_code=404, detail=f"Day {req.day_number} not in plan")
+    day = plan.days[day_index]
+    wanted = req.meal_type.strip().lower()
+    meal_index = next((i for i, m in enumerate(day.meals) if m.meal_type.strip().lower() == wanted), None)
+    if meal_index is None:
+        raise HTTPException(status_code=404, detail=f"No {req.meal_type} on day {req.day_number}")
+
+    targets = plan.nutrition_targets or calculate_nutrition_profile(profile)
+    candidates = meal_planner_service.candidates_for(profile, len(plan.days))
+    used_ids = {m.recipe_id for d in plan.days for m in d.meals} | set(req.exclude_recipe_ids)
+    replacement = best_replacement(day, meal_index, candidates, targets, used_ids)
+    if not replacement:
+        raise HTTPException(status_code=409, detail="No alternative recipe fits this slot")
+
+    old_recipe_id = day.meals[meal_index].recipe_id
+    day.meals[meal_index] = replacement
+    day.total_calories = round(sum(m.calories for m in day.meals), 1)
+    if not mongodb_client.replace_plan_meal(current_user.id, day_index, meal_index, old_recipe_id,
+                                            replacement.model_dump(), day.total_calories):
+        raise HTTPException(status_code=409, detail="Plan changed while swapping; reload and retry")
+    return ORJSONResponse(plan.model_dump())
 
 
 # ── Google Calendar Integration ──────────────────────────
@@ -202,11 +493,13 @@ def sync_to_calendar(
     Sync the user's latest meal plan to Google Calendar.
     Expects: { "start_date": "2026-03-01", "timezone": "Asia/Kolkata" }
     """
-    tokens = mongodb_client.get_google_tokens(current_user.id)
+    with tracer.span("mongo.get_google_tokens"):
+        tokens = mongodb_client.get_google_tokens(current_user.id)
     if not tokens:
         raise HTTPException(status_code=400, detail="Google Calendar not connected. Please connect first.")
 
-    plan_data = mongodb_client.get_latest_meal_plan(current_user.id)
+    with tracer.span("mongo.get_latest_meal_plan"):
+        plan_data = mongodb_client.get_latest_meal_plan(current_user.id)
     if not plan_data:
         raise HTTPException(status_code=404, detail="No meal plan found. Generate one first.")
 
@@ -223,6 +516,35 @@ def sync_to_calendar(
         raise HTTPException(status_code=500, detail=f"Failed to sync: {str(e)}")
 
 
+@router.post("/calendar/feed")
+def create_calendar_feed(request: Request, current_user: User = Depends(get_current_user)):
+    """
+    Create (or rotate) a private subscription URL for the latest plan.
+    Only a hash of the token is stored; rotating invalidates the old URL.
+    """
+    import hashlib
+    import secrets
+    token = secrets.token_urlsafe(24)
+    mongodb_client.set_calendar_feed_hash(current_user.id, hashlib.sha256(token.encode()).hexdigest())
+    feed_url = str(request.url_for("calendar_feed", token=token))
+    return {"feed_url": feed_url, "webcal_url": "webcal://" + feed_url.split("://", 1)[1]}
+
+@router.delete("/calendar/feed")
+def revoke_calendar_feed(current_user: User = Depends(get_current_user)):
+    """Revoke the subscription URL."""
+    mongodb_client.set_calendar_feed_hash(current_user.id, None)
+    return {"status": "revoked"}
+
+@router.get("/calendar/feed/{token}.ics", name="calendar_feed")
+def calendar_feed(token: str, request: Request):
+    """Subscribable .ics feed; the unguessable token in the URL is the credential."""
+    import hashlib
+    user_id = mongodb_client.get_user_id_by_feed_hash(hashlib.sha256(token.encode()).hexdigest())
+    if not user_id:
+        raise HTTPException(status_code=404, detail="Unknown or revoked calendar feed")
+    return _plan_ics_response(request, user_id, None, None)
+
+
 @router.delete("/calendar/disconnect")
 def disconnect_google(current_user: User = Depends(get_current_user)):
     """Remove stored Google Calendar tokens."""
@@ -7,15 +7,111 @@ load_dotenv()
 APP_NAME = "FitFork"
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
+# Comma-separated list of emails allowed to hit admin/cohort endpoints
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
 # MongoDB Config
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "fitfork"
+# Read routing. User, chat, plan and token reads stay on the primary, so a
+# user always reads their own writes. Recipe corpus reads (find_recipes, recipes by
+# ID, the corpus version) use MONGO_RECIPE_READ_PREFERENCE and may be served by a
+# secondary up to MONGO_RECIPE_MAX_STALENESS_SECONDS behind (MongoDB minimum is 90;
+# -1 for no bound). Each role has its own connection pool.
+MONGO_RECIPE_READ_PREFERENCE = os.getenv("MONGO_RECIPE_READ_PREFERENCE", "secondaryPreferred")
+MONGO_RECIPE_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_RECIPE_MAX_STALENESS_SECONDS", "90"))
+MONGO_PRIMARY_POOL_SIZE = int(os.getenv("MONGO_PRIMARY_POOL_SIZE", "50"))
+MONGO_RECIPE_POOL_SIZE = int(os.getenv("MONGO_RECIPE_POOL_SIZE", "100"))
+# How long a process trusts its cached recipe corpus version before re-reading it
+CORPUS_VERSION_TTL_SECONDS = int(os.getenv("CORPUS_VERSION_TTL_SECONDS", "60"))
+# Distinct (diet, allergen, cuisine, goal, region) buckets kept in the candidate pool cache
+CANDIDATE_POOL_MAX_BUCKETS = int(os.getenv("CANDIDATE_POOL_MAX_BUCKETS", "256"))
+# Region-partitioned retrieval widens to the global partition below this many regional matches
+REGION_MIN_RESULTS = int(os.getenv("REGION_MIN_RESULTS", "20"))
+# Read-through cache of RecipeResult objects behind /recipes/{id} and /recipes/batch
+RECIPE_CACHE_MAX_ENTRIES = int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "5000"))
+RECIPE_BATCH_MAX_IDS = int(os.getenv("RECIPE_BATCH_MAX_IDS", "200"))
+# Most profiles per POST /admin/nutrition/batch request
+NUTRITION_BATCH_MAX_PROFILES = int(os.getenv("NUTRITION_BATCH_MAX_PROFILES", "10000"))
+# GET /recipes/suggest: most suggestions per request, and cached (prefix, filters) answers per index build
+SUGGEST_MAX_RESULTS = int(os.getenv("SUGGEST_MAX_RESULTS", "10"))
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", "4096"))
+# Largest /search page (top_k); further results are fetched with the X-Next-Cursor keyset cursor
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "50"))
+
+# Chat retention: recent turns stay one-doc-per-message in chat_sessions,
+# older ones are archived into per-user buckets in chat_archive.
+CHAT_TTL_DAYS = int(os.getenv("CHAT_TTL_DAYS", "180"))
+CHAT_HOT_MESSAGES = int(os.getenv("CHAT_HOT_MESSAGES", "40"))
+CHAT_ARCHIVE_BUCKET_SIZE = int(os.getenv("CHAT_ARCHIVE_BUCKET_SIZE", "100"))
+CHAT_ARCHIVE_CHECK_EVERY = int(os.getenv("CHAT_ARCHIVE_CHECK_EVERY", "20"))
+# Per-user archival lease; a crashed archiver blocks that user's archival at most this long
+CHAT_ARCHIVE_LEASE_SECONDS = int(os.getenv("CHAT_ARCHIVE_LEASE_SECONDS", "300"))
+
+# On-demand request profiling (admin `X-Profile: 1` header or random sampling).
+# With PROFILING_ENABLED off the middleware isn't installed.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+
+# Request tracing: spans around endpoint, Mongo and LLM stages.
+# TRACE_EXPORTER: none | console | file (JSON lines at TRACE_EXPORT_PATH)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+# Traces per route kept for the /admin/traces/summary percentiles
+TRACE_SUMMARY_WINDOW = int(os.getenv("TRACE_SUMMARY_WINDOW", "500"))
+
+# Startup warm-up (connection pools, hot recipes, candidate pools, LLM probe); see /ready
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+WARMUP_USER_SAMPLE = int(os.getenv("WARMUP_USER_SAMPLE", "50"))
+WARMUP_LLM_TIMEOUT_SECONDS = float(os.getenv("WARMUP_LLM_TIMEOUT_SECONDS", "5"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+# Meal-plan time budget: server default and ceiling for the X-Request-Deadline-Ms header.
+# Gemini is only called when the remaining budget covers its expected latency (a moving
+# average starting at LLM_PLAN_ESTIMATE_SECONDS); otherwise the plan is fitted locally.
+MEAL_PLAN_DEADLINE_SECONDS = float(os.getenv("MEAL_PLAN_DEADLINE_SECONDS", "30"))
+MEAL_PLAN_MAX_DEADLINE_SECONDS = float(os.getenv("MEAL_PLAN_MAX_DEADLINE_SECONDS", "120"))
+# Upper bound for meals_per_day on /meal-plan and cohort plans (slots beyond five are snacks)
+MEAL_PLAN_MAX_MEALS_PER_DAY = int(os.getenv("MEAL_PLAN_MAX_MEALS_PER_DAY", "6"))
+LLM_PLAN_ESTIMATE_SECONDS = float(os.getenv("LLM_PLAN_ESTIMATE_SECONDS", "12"))
+# Kept back from the LLM call for the local fallback if it times out
+LOCAL_PLAN_RESERVE_SECONDS = float(os.getenv("LOCAL_PLAN_RESERVE_SECONDS", "1"))
+# Gemini calls allowed in flight per worker, abandoned (timed-out) ones included; beyond it plans go local
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+# Skip Gemini for LLM_BREAKER_COOLDOWN_SECONDS after this many consecutive failures
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "60"))
+
+# Batch cohort planning (scripts/plan_cohort.py, POST /admin/cohorts/plans)
+COHORT_WORKERS = int(os.getenv("COHORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+COHORT_CHUNK_SIZE = int(os.getenv("COHORT_CHUNK_SIZE", "200"))
+COHORT_LLM_CONCURRENCY = int(os.getenv("COHORT_LLM_CONCURRENCY", "4"))
+COHORT_WRITE_BATCH = int(os.getenv("COHORT_WRITE_BATCH", "500"))
 
 # External APIs
 SCALEDOWN_API_KEY = os.getenv("SCALEDOWN_API_KEY")
 OPEN_ROUTER_API_KEY = os.getenv("OPEN_ROUTER_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Gemini explicit context caching (system prompt + recipe candidate block)
+GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "True").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CONTEXT_CACHE_MAX_ENTRIES", "64"))
+# Gemini rejects caches below ~1024 tokens; ~4 chars per token
+GEMINI_CONTEXT_CACHE_MIN_CHARS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_CHARS", "4096"))
+
+# Prompt compression (recipe context + chat history) before Gemini calls.
+# ScaleDown is used for free text when SCALEDOWN_API_KEY is set; otherwise a local compressor.
+PROMPT_COMPRESSION_ENABLED = os.getenv("PROMPT_COMPRESSION_ENABLED", "False").lower() == "true"
+PROMPT_RECIPE_TOKEN_BUDGET = int(os.getenv("PROMPT_RECIPE_TOKEN_BUDGET", "1200"))
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", "400"))
+SCALEDOWN_TIMEOUT_SECONDS = float(os.getenv("SCALEDOWN_TIMEOUT_SECONDS", "3"))
+# Rough prefill cost used to estimate latency saved by dropping prompt tokens
+PROMPT_PREFILL_MS_PER_1K_TOKENS = float(os.getenv("PROMPT_PREFILL_MS_PER_1K_TOKENS", "40"))
+
 # Google Calendar OAuth
 GOOGLE_CLIENT_ID = os.getenv("client_id")
 GOOGLE_CLIENT_SECRET = os.getenv("client_secret")
@@ -23,6 +119,6 @@ GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:8001/au
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
 # API Base URLs
-SCALEDOWN_URL = "https://api.scaledown.xyz/compress/raw/"
+SCALEDOWN_URL = os.getenv("SCALEDOWN_URL", "https://api.scaledown.xyz/compress/raw/")
 OPENROUTER_URL = "https://openrouter.ai/api/v1"
 GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
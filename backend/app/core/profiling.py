@@ -0,0 +1,207 @@
+"""
+On-demand request profiling.
+
+A profiled request gets a background sampler that snapshots the Python
+stacks of every thread running app code (the event loop and the
+threadpool workers that serve sync endpoints) every few milliseconds.
+The result is stored in speedscope format (https://www.speedscope.app),
+one profile per thread, keyed by request ID. Concurrent requests running
+app code at the same time show up in the same file as separate threads.
+
+Profiling is triggered by an admin bearer token plus `X-Profile: 1`, or by
+PROFILE_SAMPLE_RATE. With PROFILING_ENABLED off the middleware is not
+installed at all.
+"""
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from app.core.cache import LRUCache
+from app.core.config import PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_MAX_STORED
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Never profile the profile endpoints themselves or health checks
+SKIP_PATHS = ("/admin/profiles", "/health", "/ready")
+
+Frame = Tuple[str, str, int]
+
+
+class StackSampler:
+    """Wall-clock sampler over sys._current_frames(); only threads inside `include` are kept."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, include: str = APP_DIR):
+        self.interval = interval_ms / 1000
+        self.include = include
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.frames: List[Frame] = []
+        self._frame_index: Dict[Frame, int] = {}
+        # thread id -> (samples, weights)
+        self.samples: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+        self.thread_names: Dict[int, str] = {}
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="fitfork-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration_ms = (time.perf_counter() - self.started_at) * 1000
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(own_id, (now - last) * 1000)
+            last = now
+
+    def _sample(self, own_id: int, weight_ms: float):
+        names = None
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            touches_app = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(self.include) and code.co_filename != __file__:
+                    touches_app = True
+                stack.append(self._index((code.co_name, code.co_filename, code.co_firstlineno)))
+                frame = frame.f_back
+            if not touches_app:
+                continue
+            if thread_id not in self.samples:
+                if names is None:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self.thread_names[thread_id] = names.get(thread_id, str(thread_id))
+                self.samples[thread_id] = ([], [])
+            samples, weights = self.samples[thread_id]
+            samples.append(stack[::-1])
+            weights.append(round(weight_ms, 3))
+
+    def _index(self, frame: Frame) -> int:
+        index = self._frame_index.get(frame)
+        if index is None:
+            index = self._frame_index[frame] = len(self.frames)
+            self.frames.append(frame)
+        return index
+
+    @property
+    def sample_count(self) -> int:
+        return sum(len(samples) for samples, _ in self.samples.values())
+
+    def to_speedscope(self, name: str) -> dict:
+        profiles = []
+        for thread_id, (samples, weights) in self.samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names[thread_id],
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "fitfork-profiler",
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in self.frames]},
+            "profiles": profiles,
+        }
+
+
+class ProfileStore:
+    """Most recent profiles, in memory, keyed by request ID."""
+
+    def __init__(self, maxsize: int = PROFILE_MAX_STORED):
+        self.cache = LRUCache(maxsize=maxsize, name="request_profiles")
+
+    def add(self, request_id: str, meta: dict, speedscope: dict):
+        self.cache.set(request_id, {"meta": meta, "speedscope": speedscope})
+
+    def list(self) -> List[dict]:
+        entries = [self.cache.peek(key) for key in self.cache.keys()]
+        return [entry["meta"] for entry in reversed(entries) if entry]
+
+    def get(self, request_id: str) -> Optional[dict]:
+        entry = self.cache.peek(request_id)
+        return entry["speedscope"] if entry else None
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware so streamed responses are profiled until the last
+    body chunk is sent, not just until headers go out.
+    """
+
+    def __init__(self, app, is_admin: Callable[[Optional[str]], bool], store: ProfileStore,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.is_admin = is_admin
+        self.store = store
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+
+    def _trigger(self, scope) -> Optional[str]:
+        if scope["path"].startswith(SKIP_PATHS):
+            return None
+        headers = Headers(scope=scope)
+        if headers.get("x-profile") == "1" and self.is_admin(headers.get("authorization")):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self._trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        request_id = uuid.uuid4().hex[:16]
+        sampler = StackSampler(self.interval_ms)
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-ID", request_id)
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # stop() joins the sampler thread and the speedscope export walks every
+            # sample; neither belongs on the event loop
+            await asyncio.to_thread(self._finish, sampler, scope, request_id, status_code, trigger)
+
+    def _finish(self, sampler: StackSampler, scope, request_id: str, status_code: int, trigger: str):
+        sampler.stop()
+        name = f"{scope['method']} {scope['path']}"
+        self.store.add(request_id, {
+            "request_id": request_id,
+            "route": name,
+            "status_code": status_code,
+            "trigger": trigger,
+            "duration_ms": round(sampler.duration_ms, 1),
+            "samples": sampler.sample_count,
+            "created_at": datetime.utcnow().isoformat(),
+        }, sampler.to_speedscope(name))
+        print(f"DEBUG: [Profiler] {name} -> {request_id} ({sampler.sample_count} samples, {sampler.duration_ms:.0f}ms)")
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,117 @@
+"""
+Prompt Builder: memoized system prompts and cache-friendly prompt layout.
+
+Everything that is identical across requests is emitted first so that
+Gemini's implicit prefix caching can reuse it; per-request text
+(chat history, the user's own words) always goes last.
+"""
+from typing import List, Optional
+from app.core.cache import LRUCache
+from app.core.prompts import (
+    DISCOVERY_SYSTEM_PROMPT, build_meal_plan_system_prompt, build_meal_plan_user_block
+)
+from app.models.schemas import UserProfile
+
+
+def profile_prompt_key(profile: UserProfile) -> tuple:
+    """The profile fields that actually appear in the prompts."""
+    return (
+        profile.goal,
+        tuple(profile.dietary_restrictions),
+        tuple(profile.cuisine_preferences),
+    )
+
+
+def nutrition_prompt_key(nutrition_profile) -> tuple:
+    return (
+        nutrition_profile.bmr,
+        nutrition_profile.tdee,
+        nutrition_profile.target_calories,
+        nutrition_profile.protein_g,
+        nutrition_profile.carbs_g,
+        nutrition_profile.fat_g,
+    )
+
+
+def format_recipe_line(r: dict) -> str:
+    return (
+        f"- {r['title']} (ID: {str(r.get('id', r.get('_id', 'unknown')))}): "
+        f"{r.get('calories', 'N/A')} kcal, P: {r.get('protein_g','N/A')}g, "
+        f"C: {r.get('carbs_g','N/A')}g, F: {r.get('fat_g','N/A')}g"
+    )
+
+
+def format_recipe_context(recipes: List[dict]) -> str:
+    return "\n".join(format_recipe_line(r) for r in recipes)
+
+
+class PromptBuilder:
+    def __init__(self, maxsize: int = 2048):
+        self.system_prompts = LRUCache(maxsize=maxsize, name="meal_plan_system_prompt")
+        self.discovery_prompts = LRUCache(maxsize=maxsize, name="discovery_system_prompt")
+
+    def meal_plan_system_prompt(self, profile: UserProfile, nutrition_profile, days: int) -> str:
+        key = (profile_prompt_key(profile), nutrition_prompt_key(nutrition_profile), days)
+        return self.system_prompts.get_or_set(
+            key, lambda: build_meal_plan_system_prompt(profile, nutrition_profile, days)
+        )
+
+    def discovery_system_prompt(self, profile: Optional[UserProfile]) -> str:
+        key = profile_prompt_key(profile) if profile else None
+        return self.discovery_prompts.get_or_set(
+            key, lambda: DISCOVERY_SYSTEM_PROMPT.format(profile_summary=self._profile_summary(profile))
+        )
+
+    @staticmethod
+    def _profile_summary(profile: Optional[UserProfile]) -> str:
+        if not profile:
+            return "No profile set yet."
+        return f"Goal: {profile.goal}, Restrictions: {profile.dietary_restrictions}, Cuisines: {profile.cuisine_preferences}"
+
+    def meal_plan_candidate_block(self, recipe_context: str) -> str:
+        return f"Available Recipes (Inject these where possible):\n{recipe_context}"
+
+    def meal_plan_user_prompt(self, query: str, recipe_context: str, history_text: str, days: int) -> str:
+        """
+        Candidates (shared across users in the same bucket) lead, then the
+        per-user chat context, then the request itself.
+        """
+        return (
+            f"{self.meal_plan_candidate_block(recipe_context)}\n\n"
+            "Recent Chat Context:\n"
+            f"{history_text}\n\n"
+            f"User Request: {query}\n"
+            f"Generate a {days}-day plan in JSON format."
+        )
+
+    def meal_plan_cached_request_prompt(self, profile: UserProfile, nutrition_profile, query: str,
+                                        history_text: str, days: int) -> str:
+        """
+        Request text used when the static instructions and candidate block
+        already live in a provider-side cached content, so the per-user
+        block moves out of the system prompt and into the request.
+        """
+        return (
+            f"{build_meal_plan_user_block(profile, nutrition_profile, days)}\n\n"
+            "Recent Chat Context:\n"
+            f"{history_text}\n\n"
+            f"User Request: {query}\n"
+            f"Generate a {days}-day plan in JSON format."
+        )
+
+    def meal_plan_reask_prompt(self, final_prompt: str, day_numbers: List[int]) -> str:
+        """Ask again for just the days that were missing or invalid."""
+        wanted = ", ".join(str(n) for n in day_numbers)
+        return (
+            f"{final_prompt}\n\n"
+            f"Return ONLY these days: {wanted}. "
+            'Respond as {"days": [...]} with one complete entry per requested day_number.'
+        )
+
+    def stats(self) -> dict:
+        return {
+            "meal_plan_system_prompt": self.system_prompts.stats(),
+            "discovery_system_prompt": self.discovery_prompts.stats(),
+        }
+
+prompt_builder = PromptBuilder()
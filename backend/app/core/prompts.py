@@ -1,44 +1,29 @@
+import re
 from app.models.schemas import UserProfile
 from typing import List
 
-def build_meal_plan_system_prompt(profile: UserProfile, nutrition_profile, days: int) -> str:
-    """
-    Build a comprehensive system prompt for Gemini to generate structured meal plans.
-    """
-    restrictions = ", ".join(profile.dietary_restrictions) if profile.dietary_restrictions else "None"
-    cuisines = ", ".join(profile.cuisine_preferences) if profile.cuisine_preferences else "Any"
-    
-    prompt = f"""
+# Static instructions come first and never interpolate anything, so every
+# meal-plan request shares the same leading tokens (Gemini prefix caching).
+MEAL_PLAN_STATIC_INSTRUCTIONS = """
 You are a world-class professional nutritionist and culinary expert.
-Your task is to create a highly personalized {days}-day meal plan for a user.
-
-USER PROFILE:
-- Goal: {profile.goal}
-- Dietary Restrictions: {restrictions}
-- Cuisine Preferences: {cuisines}
-
-NUTRITIONAL TARGETS (DAILY):
-- Calories: {nutrition_profile.target_calories} kcal
-- Protein: {nutrition_profile.protein_g}g
-- Carbs: {nutrition_profile.carbs_g}g
-- Fat: {nutrition_profile.fat_g}g
+Your task is to create a highly personalized multi-day meal plan for a user.
 
 CORE INSTRUCTIONS:
 1. Use ONLY the provided recipe context to select meals.
 2. Ensure nutritional balance according to the user's goal and targets.
 3. Provide a brief, inspiring overview of the meal plan.
-4. Output a FULL {days}-day plan (day 1 to day {days}).
+4. Output a FULL plan covering every requested day (day 1 to the last day).
 5. Output the result strictly in the following JSON format for a calendar UI.
 
 JSON STRUCTURE:
-{{
+{
   "overview": "A brief summary of the plan and why it fits the user.",
   "days": [
-    {{
+    {
       "day_number": 1,
       "total_calories": 2100,
       "meals": [
-        {{
+        {
           "meal_type": "Breakfast",
           "recipe_id": "id_here",
           "recipe_title": "Title here",
@@ -46,25 +31,97 @@ JSON STRUCTURE:
           "protein_g": 30.5,
           "carbs_g": 40.0,
           "fat_g": 15.2
-        }},
+        },
         ... (Include Lunch and Dinner)
       ]
-    }},
-    ... (Repeat for ALL {days} days)
+    },
+    ... (Repeat for ALL requested days)
   ],
-  "nutrition_targets": {{
-      "bmr": {nutrition_profile.bmr},
-      "tdee": {nutrition_profile.tdee},
-      "target_calories": {nutrition_profile.target_calories},
-      "protein_g": {nutrition_profile.protein_g},
-      "carbs_g": {nutrition_profile.carbs_g},
-      "fat_g": {nutrition_profile.fat_g}
-  }}
-}}
+  "nutrition_targets": {
+      "bmr": <from profile>, "tdee": <from profile>, "target_calories": <from profile>,
+      "protein_g": <from profile>, "carbs_g": <from profile>, "fat_g": <from profile>
+  }
+}
 
 Ensure the JSON is perfectly valid and contains no additional text outside the JSON block.
+""".strip()
+
+MEAL_PLAN_USER_BLOCK = """
+PLAN LENGTH: {days} days (day 1 to day {days}).
+
+USER PROFILE:
+- Goal: {goal}
+- Dietary Restrictions: {restrictions}
+- Cuisine Preferences: {cuisines}
+
+NUTRITIONAL TARGETS (DAILY):
+- Calories: {target_calories} kcal
+- Protein: {protein_g}g
+- Carbs: {carbs_g}g
+- Fat: {fat_g}g
+
+Copy these exact values into "nutrition_targets":
+bmr={bmr}, tdee={tdee}, target_calories={target_calories}, protein_g={protein_g}, carbs_g={carbs_g}, fat_g={fat_g}
+""".strip()
+
+DISCOVERY_SYSTEM_PROMPT = """
+You are "Chef Discovery," a world-class culinary expert and metabolic health coach.
+Your goal is to have a short, punchy, and highly personalized discovery chat with a user to help them build the perfect meal plan.
+
+CORE BEHAVIOR:
+1. ASK & LISTEN: Instead of giving a plan immediately, ask 1-2 clarifying questions per turn.
+2. DISCOVER: Ask about their energy levels, favorite seasonal ingredients, kitchen equipment, or time constraints for specific days.
+3. TONE: Premium, encouraging, botanical, and expert.
+4. LIMIT: Aim to finish the discovery in 3-5 turns.
+
+PLAN COMPLETION:
+When you feel you have enough information to build a truly bespoke meal plan, you MUST end your message with the exact token: [PLAN_READY].
+This will signal the system to switch to the generation phase.
+
+USER DATA:
+{profile_summary}
 """
-    return prompt.strip()
+
+# Compiled once at import; build_augmented_query runs on every plan request.
+NOISE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"I want a \d+-day meal plan",
+        r"with \d+ meals per day",
+        r"generate a plan",
+        r"can you make",
+        r"please provide",
+        r"for me",
+    )
+]
+
+
+def build_meal_plan_user_block(profile: UserProfile, nutrition_profile, days: int) -> str:
+    """The per-user part of the meal plan instructions (profile, targets, length)."""
+    restrictions = ", ".join(profile.dietary_restrictions) if profile.dietary_restrictions else "None"
+    cuisines = ", ".join(profile.cuisine_preferences) if profile.cuisine_preferences else "Any"
+
+    return MEAL_PLAN_USER_BLOCK.format(
+        days=days,
+        goal=profile.goal,
+        restrictions=restrictions,
+        cuisines=cuisines,
+        bmr=nutrition_profile.bmr,
+        tdee=nutrition_profile.tdee,
+        target_calories=nutrition_profile.target_calories,
+        protein_g=nutrition_profile.protein_g,
+        carbs_g=nutrition_profile.carbs_g,
+        fat_g=nutrition_profile.fat_g,
+    )
+
+
+def build_meal_plan_system_prompt(profile: UserProfile, nutrition_profile, days: int) -> str:
+    """
+    Build a comprehensive system prompt for Gemini to generate structured meal plans.
+    The static instruction block leads; the per-user block trails it.
+    """
+    user_block = build_meal_plan_user_block(profile, nutrition_profile, days)
+    return f"{MEAL_PLAN_STATIC_INSTRUCTIONS}\n\n{user_block}"
 
 
 def build_augmented_query(query: str, profile: UserProfile, nutrition_profile) -> str:
@@ -72,34 +129,24 @@ def build_augmented_query(query: str, profile: UserProfile, nutrition_profile) -
     Produce a weighted keyword string for MongoDB text search.
     Filters out common sentence noise to focus on food keywords.
     """
-    import re
-    noise_patterns = [
-        r"I want a \d+-day meal plan",
-        r"with \d+ meals per day",
-        r"generate a plan",
-        r"can you make",
-        r"please provide",
-        r"for me"
-    ]
-    
     clean_query = query
-    for pattern in noise_patterns:
-        clean_query = re.sub(pattern, "", clean_query, flags=re.IGNORECASE)
-    
+    for pattern in NOISE_PATTERNS:
+        clean_query = pattern.sub("", clean_query)
+
     terms = []
     if clean_query.strip():
         terms.append(clean_query.strip())
-        
+
     # Profile attributes (Goal and Cuisines)
     terms.append(profile.goal.replace('_', ' '))
-    
+
     if profile.cuisine_preferences:
         terms.extend(profile.cuisine_preferences)
-        
+
     # Dietary hints
     if profile.dietary_restrictions:
         terms.extend(profile.dietary_restrictions)
-        
+
     final_query = " ".join(terms)
     print(f"DEBUG: [RAG] Augmented Query: {final_query}")
     return final_query
@@ -0,0 +1,93 @@
+"""
+Request deadlines and a circuit breaker for slow or failing upstreams (Gemini).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Deadline:
+    """A request's time budget, spent stage by stage; `stages` records what each took (ms)."""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.start = time.monotonic()
+        self.expires_at = self.start + seconds
+        self.stages = {}
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def elapsed_ms(self) -> float:
+        return round((time.monotonic() - self.start) * 1000, 1)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.monotonic() - start) * 1000, 1)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive failures it
+    opens and `allow()` says no for `cooldown` seconds. Then one probe call is
+    let through (half-open): success closes it, failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing or time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.trips += 1
+                    print(f"DEBUG: [CircuitBreaker] {self.name} open after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
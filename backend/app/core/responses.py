@@ -0,0 +1,15 @@
+"""
+Fast JSON response for hot read endpoints.
+
+Handlers return pre-shaped dicts (validated once on write) through this
+class; FastAPI skips response_model validation for Response objects.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
@@ -0,0 +1,243 @@
+"""
+Lightweight request tracing.
+
+Spans follow the OpenTelemetry data model (trace/span/parent IDs, start
+and end in unix nanoseconds, attributes, status) so exported files can be
+converted for any OTel backend, but nothing here needs a collector or the
+OTel SDK. The current span lives in a ContextVar, which Starlette copies
+into the threadpool that runs sync endpoints, so stages called from an
+endpoint nest under the request's root span.
+
+Exporters:
+  - "console": one DEBUG line per finished trace, stages in start order
+  - "file":    one JSON line per span appended to TRACE_EXPORT_PATH
+  - "none":    spans only feed the in-process per-route summary
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from app.core.cache import LRUCache
+from app.core.config import TRACING_ENABLED, TRACE_EXPORTER, TRACE_EXPORT_PATH, TRACE_SUMMARY_WINDOW
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("fitfork_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "attributes",
+                 "start_ns", "end_ns", "status")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: dict):
+        self.tracer = tracer
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.tracer._on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class RouteSummary:
+    """
+    Rolling per-route stage self times (a span's duration minus its
+    children's); the last `window` traces per route.
+    """
+
+    def __init__(self, window: int = TRACE_SUMMARY_WINDOW):
+        self.window = window
+        self._routes: Dict[str, List[Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, total_ms: float, stages: Dict[str, float]):
+        with self._lock:
+            traces = self._routes.setdefault(route, [])
+            traces.append({"__total__": total_ms, **stages})
+            if len(traces) > self.window:
+                del traces[0]
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> float:
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+    def view(self) -> dict:
+        with self._lock:
+            routes = {route: list(traces) for route, traces in self._routes.items()}
+        result = {}
+        for route, traces in routes.items():
+            by_stage: Dict[str, List[float]] = {}
+            for trace in traces:
+                for stage, ms in trace.items():
+                    by_stage.setdefault(stage, []).append(ms)
+            totals = by_stage.pop("__total__")
+            stages = {
+                stage: {
+                    "count": len(values),
+                    "avg_ms": round(sum(values) / len(values), 2),
+                    "p95_ms": round(self._percentile(values, 0.95), 2),
+                    "max_ms": round(max(values), 2),
+                }
+                for stage, values in by_stage.items()
+            }
+            slowest = max(stages, key=lambda s: stages[s]["avg_ms"]) if stages else None
+            result[route] = {
+                "requests": len(totals),
+                "avg_ms": round(sum(totals) / len(totals), 2),
+                "p95_ms": round(self._percentile(totals, 0.95), 2),
+                "slowest_stage": slowest,
+                "stages": dict(sorted(stages.items(), key=lambda kv: -kv[1]["avg_ms"])),
+            }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING_ENABLED, exporter: str = TRACE_EXPORTER,
+                 export_path: str = TRACE_EXPORT_PATH):
+        self.enabled = enabled
+        self.exporter = exporter
+        self.export_path = export_path
+        # Finished child spans waiting for their root; bounded so orphans can't pile up
+        self._pending = LRUCache(maxsize=1024, name="pending_traces")
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.summary = RouteSummary()
+
+    def start_span(self, name: str, **attributes):
+        """Span that doesn't become current; for stages spanning generator yields. Call .end()."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span = Span(self, name, parent, attributes)
+        # set() back to the parent rather than reset(token): generator bodies
+        # resumed by the threadpool run each step in a fresh context copy
+        _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.attributes["error"] = str(e)[:200]
+            raise
+        finally:
+            _current_span.set(parent)
+            span.end()
+
+    def _on_end(self, span: Span):
+        with self._pending_lock:
+            if span.parent_id is not None:
+                children = self._pending.peek(span.trace_id)
+                if children is None:
+                    children = []
+                    self._pending.set(span.trace_id, children)
+                children.append(span)
+                return
+            children = self._pending.pop(span.trace_id) or []
+        # Self time (minus direct children), so nested stages aren't counted twice
+        nested_ms: Dict[str, float] = {}
+        for child in children:
+            nested_ms[child.parent_id] = nested_ms.get(child.parent_id, 0.0) + child.duration_ms
+        stages: Dict[str, float] = {}
+        for child in children:
+            self_ms = max(child.duration_ms - nested_ms.get(child.span_id, 0.0), 0.0)
+            stages[child.name] = stages.get(child.name, 0.0) + self_ms
+        # Only request traces are routes; background roots (warm-up, pool rebuilds) are just exported
+        if span.attributes.get("span.kind") == "server":
+            self.summary.record(span.name, span.duration_ms, stages)
+        self._export(span, children)
+
+    def _export(self, root: Span, children: List[Span]):
+        if self.exporter == "console":
+            parts = ", ".join(f"{c.name}={c.duration_ms:.1f}ms" for c in sorted(children, key=lambda c: c.start_ns))
+            print(f"DEBUG: [Trace] {root.name} {root.duration_ms:.1f}ms ({root.status}) :: {parts}")
+        elif self.exporter == "file":
+            lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in [root, *children])
+            try:
+                with self._write_lock, open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"DEBUG: [Trace] Export to {self.export_path} failed: {str(e)}")
+
+
+class TracingMiddleware:
+    """Root span per HTTP request, named after the matched route template."""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}", **{"span.kind": "server"}) as root:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # /recipes/{recipe_id}, not one summary row per ID (or per 404 path)
+                route = scope.get("route")
+                root.name = f"{scope['method']} {getattr(route, 'path', '<unmatched>')}"
+                root.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    root.status = "error"
+
+
+tracer = Tracer()
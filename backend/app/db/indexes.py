@@ -0,0 +1,149 @@
+"""
+Declarative index registry for every collection MongoDBClient touches.
+
+Indexes are applied by the migration command (scripts/migrate_indexes.py),
+not on process start. Each entry is the IndexModel Mongo should have; the
+query shape that needs it is noted next to it.
+"""
+from typing import Dict, List
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from app.core.config import CHAT_TTL_DAYS
+
+CHAT_TTL_SECONDS = CHAT_TTL_DAYS * 24 * 3600
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # get_user_by_email (every authenticated request), create_user duplicate check
+        IndexModel([("email", ASCENDING)], unique=True),
+        # get_user_id_by_feed_hash (unauthenticated .ics subscriptions); most users have none
+        IndexModel([("calendar_feed_hash", ASCENDING)], unique=True, sparse=True),
+    ],
+    "recipes": [
+        # find_recipes / find_recipes_page: equality prefix, then the _id keyset sort,
+        # then the range filters so they are checked on index keys before any fetch.
+        # At most one array field per compound key (no parallel arrays), so
+        # dietary_tags and meal_types get an index each. allergens $nin can't
+        # bound an index scan and is applied on fetch.
+        IndexModel([("dietary_tags", ASCENDING), ("_id", ASCENDING), ("calories", ASCENDING),
+                    ("protein_g", ASCENDING), ("time_minutes", ASCENDING)]),
+        IndexModel([("meal_types", ASCENDING), ("_id", ASCENDING), ("calories", ASCENDING),
+                    ("protein_g", ASCENDING), ("time_minutes", ASCENDING)]),
+        IndexModel([("cuisine", ASCENDING), ("_id", ASCENDING), ("calories", ASCENDING),
+                    ("protein_g", ASCENDING), ("time_minutes", ASCENDING)]),
+        # find_recipes_regional: the region partition, then the global one ("global" or untagged)
+        IndexModel([("regions", ASCENDING), ("_id", ASCENDING), ("calories", ASCENDING),
+                    ("protein_g", ASCENDING), ("time_minutes", ASCENDING)]),
+        IndexModel([("allergens", ASCENDING)]),
+        # find_recipes / text pages of find_recipes_page: $text over title + description
+        IndexModel([("title", TEXT), ("description", TEXT)]),
+    ],
+    "chat_sessions": [
+        # get_chat_history: filter user_id, sort timestamp; clear_chat_history; archival
+        IndexModel([("user_id", ASCENDING), ("timestamp", ASCENDING)]),
+        # Safety net for messages the archiver never reached
+        IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=CHAT_TTL_SECONDS),
+    ],
+    "chat_archive": [
+        # get_chat_history fallback: newest buckets first; archiver's open-bucket lookup
+        IndexModel([("user_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+        # A bucket expires once its newest message is older than the TTL
+        IndexModel([("last_ts", ASCENDING)], expireAfterSeconds=CHAT_TTL_SECONDS),
+    ],
+    "cohort_plans": [
+        # save_cohort_plans upsert key; partner exports by cohort
+        IndexModel([("cohort_id", ASCENDING), ("member_id", ASCENDING)], unique=True),
+    ],
+    "refresh_tokens": [
+        # _id is the token hash (rotate/consume lookups); these serve revocation
+        IndexModel([("family_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)]),
+        # Expired tokens are deleted at expires_at
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "meta": [],
+}
+
+
+def _key_signature(key) -> tuple:
+    return tuple((field, direction) for field, direction in key.items())
+
+
+def _rebuild_options(info: dict, doc: dict) -> List[str]:
+    """Options of an existing index that differ from the registry and need a drop + recreate."""
+    changed = [option for option in ("unique", "sparse") if bool(info.get(option)) != bool(doc.get(option))]
+    if info.get("partialFilterExpression") != doc.get("partialFilterExpression"):
+        changed.append("partialFilterExpression")
+    if ("expireAfterSeconds" in info) != ("expireAfterSeconds" in doc):
+        changed.append("expireAfterSeconds")  # collMod changes a TTL, but doesn't add or remove one
+    return changed
+
+
+def _errmsg(e: OperationFailure) -> str:
+    return e.details.get("errmsg", str(e)) if e.details else str(e)
+
+
+def apply_indexes(db, dry_run: bool = False, drop_unknown: bool = False) -> dict:
+    """
+    Bring the database's indexes in line with INDEXES.
+    Returns {collection: {"created": [...], "existing": [...], "dropped": [...], "errors": [...]}}.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db.get_collection(collection_name)
+        existing = {
+            name: info for name, info in collection.index_information().items() if name != "_id_"
+        }
+        existing_keys = {_key_signature(dict(info["key"])): name for name, info in existing.items()}
+        result = {"created": [], "existing": [], "dropped": [], "errors": []}
+
+        wanted_names = set()
+        for model in models:
+            doc = model.document
+            signature = _key_signature(doc["key"])
+            name = existing_keys.get(signature, doc["name"])
+            wanted_names.add(name)
+            if name in existing:
+                info = existing[name]
+                changed = _rebuild_options(info, doc)
+                ttl = doc.get("expireAfterSeconds")
+                if changed:
+                    # Only a rebuild changes these (and dropping a TTL)
+                    label = f"{name} (rebuilt: {', '.join(changed)})"
+                    if dry_run:
+                        result["created"].append(label)
+                        continue
+                    try:
+                        collection.drop_index(name)
+                        collection.create_indexes([model])
+                        result["created"].append(label)
+                    except OperationFailure as e:
+                        result["errors"].append(f"{name}: rebuild failed: {_errmsg(e)}")
+                elif info.get("expireAfterSeconds") != ttl:
+                    # TTL changes don't need a rebuild
+                    if not dry_run:
+                        db.command({"collMod": collection_name,
+                                    "index": {"name": name, "expireAfterSeconds": ttl}})
+                    result["created"].append(f"{name} (ttl -> {ttl}s)")
+                else:
+                    result["existing"].append(name)
+                continue
+            if dry_run:
+                result["created"].append(doc["name"])
+                continue
+            try:
+                collection.create_indexes([model])
+                result["created"].append(doc["name"])
+            except OperationFailure as e:
+                # e.g. duplicate emails blocking a unique index
+                result["errors"].append(f"{doc['name']}: {_errmsg(e)}")
+
+        if drop_unknown:
+            for name in existing:
+                if name not in wanted_names:
+                    if not dry_run:
+                        collection.drop_index(name)
+                    result["dropped"].append(name)
+
+        report[collection_name] = result
+    return report
@@ -1,18 +1,187 @@
+import time
 from pymongo import MongoClient
-from typing import Optional
-from app.core.config import MONGO_URI, DB_NAME
-from app.models.schemas import UserProfile
+from pymongo.errors import DuplicateKeyError
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from typing import Optional, Tuple
+from app.core.config import (
+    MONGO_URI, DB_NAME, CORPUS_VERSION_TTL_SECONDS, MONGO_RECIPE_READ_PREFERENCE,
+    MONGO_RECIPE_MAX_STALENESS_SECONDS, MONGO_PRIMARY_POOL_SIZE, MONGO_RECIPE_POOL_SIZE, REGION_MIN_RESULTS,
+    CHAT_ARCHIVE_LEASE_SECONDS
+)
+from app.models.schemas import UserProfile, RecipeResult, RecipeFilters
+
+
+# Shapes recipe documents like RecipeResult inside Mongo (`_id` -> string `id`),
+# so hot read paths can return them without a Pydantic round trip.
+RECIPE_PROJECTION = {
+    "_id": 0,
+    "id": {"$toString": "$_id"},
+    **{field: 1 for field in RecipeResult.model_fields if field != "id"},
+}
+
+# RecipeResult defaults for fields a document may lack
+RECIPE_DEFAULTS = {
+    name: field.get_default(call_default_factory=True)
+    for name, field in RecipeResult.model_fields.items()
+    if not field.is_required()
+}
+
+
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    """Read preference from its URI name (e.g. "secondaryPreferred"). Staleness doesn't apply to primary."""
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference {mode!r}; expected one of {sorted(READ_PREFERENCE_MODES)}")
+    mode_cls = READ_PREFERENCE_MODES[mode]
+    return mode_cls() if mode_cls is Primary else mode_cls(max_staleness=max_staleness)
+
+
+# Availability regions tagged by scripts/enrich_recipes.py; "global" = obtainable anywhere
+RECIPE_REGIONS = ("global", "asia", "europe", "latin_america", "mediterranean", "middle_east", "north_america")
+# Recipes imported before region tagging have no `regions` and count as global
+GLOBAL_PARTITION = {"$in": ["global", None]}
+
+
+def region_partition(profile: UserProfile) -> Optional[str]:
+    """The profile's recipe partition ("asia", ...), or None for global and unknown regions."""
+    region = (profile.region or "").strip().lower().replace("-", "_").replace(" ", "_")
+    return region if region in RECIPE_REGIONS and region != "global" else None
+
+
+def _case_variants(value: str) -> list:
+    """Exact-match spellings to try ("Dinner", "dinner"); keeps the filter an index equality."""
+    value = value.strip()
+    return list(dict.fromkeys([value, value.lower(), value.capitalize()]))
+
+
+def recipe_filter(query: str, profile: UserProfile, filters: Optional[RecipeFilters] = None,
+                  regions=None) -> dict:
+    """
+    The find_recipes filter: profile tags, optional structured filters and $text terms.
+    `regions` restricts it to one partition (a region name or GLOBAL_PARTITION).
+    """
+    # 1. Build Filter (Diets and Allergens)
+    filter_query = {}
+    if regions is not None:
+        filter_query["regions"] = regions
+
+    # Inclusion: Dietary restrictions
+    # Change from $all (strict) to $in (softer) to ensure we get results even with multiple tags
+    if profile.dietary_restrictions:
+        filter_query["dietary_tags"] = {"$in": [r.lower() for r in profile.dietary_restrictions]}
+
+    # Exclusion: Allergens
+    if profile.allergens_to_avoid:
+        filter_query["allergens"] = {"$nin": profile.allergens_to_avoid}
+
+    # Structured filters (see the recipes indexes in app/db/indexes.py)
+    if filters is not None:
+        ranges = {
+            "calories": (filters.min_calories, filters.max_calories),
+            "protein_g": (filters.min_protein_g, filters.max_protein_g),
+            "time_minutes": (None, filters.max_time_minutes),
+        }
+        for field, (low, high) in ranges.items():
+            bounds = {}
+            if low is not None:
+                bounds["$gte"] = low
+            if high is not None:
+                bounds["$lte"] = high
+            if bounds:
+                filter_query[field] = bounds
+        if filters.meal_type:
+            filter_query["meal_types"] = {"$in": _case_variants(filters.meal_type)}
+        if filters.cuisine:
+            filter_query["cuisine"] = {"$in": _case_variants(filters.cuisine)}
+
+    # 2. Refine Text Search Query
+    # Combine user's natural language request with their preferred cuisines
+    search_terms = []
+    if query and query.strip():
+        search_terms.append(query.strip())
+
+    if profile.cuisine_preferences:
+        search_terms.extend(profile.cuisine_preferences)
+
+    final_search_query = " ".join(search_terms)
+
+    if final_search_query:
+        filter_query["$text"] = {"$search": final_search_query}
+    return filter_query
+
+
+def parse_page_cursor(cursor: str) -> Optional[Tuple[Optional[float], str]]:
+    """
+    Split a find_recipes_page cursor into (text_score, last_id). Free-text
+    pages use "<score>:<id>", the rest a bare id (score None). None if malformed.
+    """
+    from bson import ObjectId
+    score, _, last_id = cursor.rpartition(":")
+    if not ObjectId.is_valid(last_id):
+        return None
+    if not score:
+        return (None, last_id) if ":" not in cursor else None
+    try:
+        return float(score), last_id
+    except ValueError:
+        return None
+
+
+def shape_recipe(doc: dict) -> dict:
+    """Fill RecipeResult defaults into a projected recipe document (in place)."""
+    for name, default in RECIPE_DEFAULTS.items():
+        if name not in doc:
+            doc[name] = list(default) if isinstance(default, list) else default
+    return doc
+
+
+def retrieval_bucket(profile: UserProfile) -> tuple:
+    """
+    The profile fields that decide which recipes find_recipes can return:
+    (dietary set, allergen set, cuisine set, goal, region partition). Order-insensitive.
+    """
+    return (
+        tuple(sorted(r.lower() for r in profile.dietary_restrictions)),
+        tuple(sorted(profile.allergens_to_avoid)),
+        tuple(sorted(profile.cuisine_preferences)),
+        profile.goal,
+        region_partition(profile),
+    )
+
 
 class MongoDBClient:
-    def __init__(self):
-        self.client = MongoClient(MONGO_URI) if MONGO_URI else None
-        self.db = self.client.get_database(DB_NAME) if self.client else None
+    def __init__(self, uri: Optional[str] = MONGO_URI, db_name: str = DB_NAME,
+                 primary_pool_size: int = MONGO_PRIMARY_POOL_SIZE, recipe_pool_size: int = MONGO_RECIPE_POOL_SIZE,
+                 recipe_read_preference: str = MONGO_RECIPE_READ_PREFERENCE,
+                 recipe_max_staleness: int = MONGO_RECIPE_MAX_STALENESS_SECONDS, **client_kwargs):
+        # Two clients, one pool each: heavy recipe scans can't starve user/chat traffic of connections
+        self.client = MongoClient(uri, **{"maxPoolSize": primary_pool_size, **client_kwargs}) if uri else None
+        self.recipe_client = MongoClient(uri, **{"maxPoolSize": recipe_pool_size, **client_kwargs}) if uri else None
+        self.db = self.client.get_database(db_name) if self.client else None
+        # Recipe corpus reads only; writes through it still go to the primary
+        self.recipe_db = self.recipe_client.get_database(
+            db_name, read_preference=read_preference(recipe_read_preference, recipe_max_staleness)
+        ) if self.recipe_client else None
         self.users_collection = self.db.get_collection("users") if self.db is not None else None
-        self.recipes_collection = self.db.get_collection("recipes") if self.db is not None else None
+        self.recipes_collection = self.recipe_db.get_collection("recipes") if self.recipe_db is not None else None
         self.chat_collection = self.db.get_collection("chat_sessions") if self.db is not None else None
-        
-        # Build indexes on startup
-        self.create_recipe_indexes()
+        self.meta_collection = self.db.get_collection("meta") if self.db is not None else None
+        # The corpus version is read from the same members as the recipes it versions
+        self.corpus_meta_collection = self.recipe_db.get_collection("meta") if self.recipe_db is not None else None
+        self.chat_archive_collection = self.db.get_collection("chat_archive") if self.db is not None else None
+        self.cohort_plans_collection = self.db.get_collection("cohort_plans") if self.db is not None else None
+        self.refresh_tokens_collection = self.db.get_collection("refresh_tokens") if self.db is not None else None
+        self._corpus_version = None
+        self._corpus_version_checked = 0.0
+        # Indexes are managed by scripts/migrate_indexes.py (see app/db/indexes.py)
 
     # --- CHAT METHODS ---
 
@@ -26,23 +195,149 @@ class MongoDBClient:
             })
 
     def get_chat_history(self, user_id: str, limit: int = 20):
+        """
+        The most recent `limit` turns, oldest first. Reads hot per-message
+        docs and, when those run short, the archived buckets behind them.
+        """
         if self.chat_collection is not None:
-            cursor = self.chat_collection.find({"user_id": user_id}).sort("timestamp", 1).limit(limit)
-            return [{"role": doc["role"], "content": doc["content"]} for doc in cursor]
+            cursor = self.chat_collection.find(
+                {"user_id": user_id}, {"_id": 0, "role": 1, "content": 1}
+            ).sort("timestamp", -1).limit(limit)
+            history = [{"role": doc["role"], "content": doc["content"]} for doc in cursor]
+
+            if len(history) < limit and self.chat_archive_collection is not None:
+                buckets = self.chat_archive_collection.find(
+                    {"user_id": user_id}, {"_id": 0, "messages": 1}
+                ).sort("seq", -1)
+                for bucket in buckets:
+                    for message in reversed(bucket["messages"]):
+                        history.append({"role": message["r"], "content": message["c"]})
+                        if len(history) >= limit:
+                            break
+                    if len(history) >= limit:
+                        break
+
+            history.reverse()
+            return history
         return []
 
     def clear_chat_history(self, user_id: str):
         if self.chat_collection is not None:
             self.chat_collection.delete_many({"user_id": user_id})
+        if self.chat_archive_collection is not None:
+            self.chat_archive_collection.delete_many({"user_id": user_id})
+
+    def claim_chat_archive(self, user_id: str, lease_seconds: float) -> Optional[float]:
+        """
+        Take the user's archival lease in `meta`; returns its expiry, or None
+        while another worker holds it. A held lease fails the filter, so the
+        upsert collides with the existing _id instead of overwriting it.
+        """
+        if self.meta_collection is None:
+            return None
+        now = time.time()
+        until = now + lease_seconds
+        try:
+            self.meta_collection.update_one(
+                {"_id": f"chat_archive:{user_id}", "locked_until": {"$lt": now}},
+                {"$set": {"locked_until": until}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return None
+        return until
+
+    def release_chat_archive(self, user_id: str, lease: float):
+        if self.meta_collection is not None:
+            # Only our own lease; an expired one may already belong to someone else
+            self.meta_collection.delete_one({"_id": f"chat_archive:{user_id}", "locked_until": lease})
+
+    def archive_chat_messages(self, user_id: str, keep_recent: int, bucket_size: int,
+                              lease_seconds: float = CHAT_ARCHIVE_LEASE_SECONDS) -> int:
+        """
+        Move everything but the newest `keep_recent` messages into compact
+        bucket documents ({user_id, seq, count, messages: [{r, c, t}]}),
+        filling the user's open bucket first. Returns the number archived.
+        Runs under a per-user lease so concurrent archivers never move the
+        same range twice; a caller that loses the claim archives nothing.
+        """
+        if self.chat_collection is None or self.chat_archive_collection is None:
+            return 0
+        lease = self.claim_chat_archive(user_id, lease_seconds)
+        if lease is None:
+            return 0
+        try:
+            return self._archive_chat_range(user_id, keep_recent, bucket_size)
+        finally:
+            self.release_chat_archive(user_id, lease)
+
+    def _archive_chat_range(self, user_id: str, keep_recent: int, bucket_size: int) -> int:
+        from pymongo import UpdateOne
+
+        old = list(
+            self.chat_collection.find({"user_id": user_id}, {"role": 1, "content": 1, "timestamp": 1})
+            .sort("timestamp", -1).skip(keep_recent)
+        )
+        if not old:
+            return 0
+        old.reverse()
+
+        last = self.chat_archive_collection.find_one(
+            {"user_id": user_id}, {"seq": 1, "count": 1}, sort=[("seq", -1)]
+        )
+        seq = last["seq"] if last else 0
+        room = bucket_size - last["count"] if last else 0
+
+        ops = []
+        pending = old
+        while pending:
+            if room <= 0:
+                seq += 1
+                room = bucket_size
+            chunk, pending = pending[:room], pending[room:]
+            room -= len(chunk)
+            ops.append(UpdateOne(
+                {"user_id": user_id, "seq": seq},
+                {
+                    "$push": {"messages": {"$each": [
+                        {"r": m["role"], "c": m["content"], "t": m["timestamp"]} for m in chunk
+                    ]}},
+                    "$inc": {"count": len(chunk)},
+                    "$min": {"first_ts": chunk[0]["timestamp"]},
+                    "$max": {"last_ts": chunk[-1]["timestamp"]},
+                },
+                upsert=True,
+            ))
+
+        # Buckets first, then delete: a crash in between duplicates rather than loses turns
+        self.chat_archive_collection.bulk_write(ops, ordered=True)
+        self.chat_collection.delete_many({"_id": {"$in": [m["_id"] for m in old]}})
+        return len(old)
+
+    def chat_users_over(self, keep_recent: int) -> list:
+        """User IDs with more than `keep_recent` hot chat messages."""
+        if self.chat_collection is None:
+            return []
+        # Leading $sort lets the (user_id, timestamp) index drive the scan
+        pipeline = [
+            {"$sort": {"user_id": 1}},
+            {"$project": {"_id": 0, "user_id": 1}},
+            {"$group": {"_id": "$user_id", "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": keep_recent}}},
+        ]
+        return [doc["_id"] for doc in self.chat_collection.aggregate(pipeline)]
 
     # --- USER METHODS ---
     def create_user(self, user_data: dict):
         if self.users_collection is not None:
-            # Check if user exists
-            if self.users_collection.find_one({"email": user_data["email"]}):
+            # Check if user exists (the unique email index also closes the race)
+            if self.users_collection.find_one({"email": user_data["email"]}, {"_id": 1}):
+                return None
+            try:
+                result = self.users_collection.insert_one(user_data)
+            except DuplicateKeyError:
                 return None
-            result = self.users_collection.insert_one(user_data)
-            user_data["id"] = str(result.inserted_id)
+            user_data["id"] = str(user_data.pop("_id", result.inserted_id))
             return user_data
         return None
 
@@ -70,23 +365,43 @@ class MongoDBClient:
                 return UserProfile(**user["profile"])
         return None
 
-    def save_meal_plan(self, user_id: str, plan_data: dict):
-        """Save the latest meal plan for the user."""
+    def save_meal_plan(self, user_id: str, plan_data: dict, profile: Optional[UserProfile] = None):
+        """Save the latest meal plan for the user, with the profile it was generated for."""
         if self.users_collection is not None:
             from bson import ObjectId
             print(f"DEBUG: [MongoDB] Saving meal plan for user {user_id}")
+            fields = {"latest_meal_plan": plan_data,
+                      "latest_meal_plan_at": __import__("datetime").datetime.utcnow()}
+            if profile is not None:
+                fields["latest_meal_plan_profile"] = profile.model_dump()
+            result = self.users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": fields})
+            print(f"DEBUG: [MongoDB] Update result: matched={result.matched_count}, modified={result.modified_count}")
+
+    def replace_plan_meal(self, user_id: str, day_index: int, meal_index: int,
+                          expected_recipe_id: str, meal: dict, total_calories: float) -> bool:
+        """
+        Swap one meal of the stored plan in place. The filter pins the meal
+        being replaced, so a concurrent swap or regeneration isn't overwritten.
+        """
+        if self.users_collection is not None:
+            from bson import ObjectId
+            prefix = f"latest_meal_plan.days.{day_index}"
             result = self.users_collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": {"latest_meal_plan": plan_data}}
+                {"_id": ObjectId(user_id), f"{prefix}.meals.{meal_index}.recipe_id": expected_recipe_id},
+                {"$set": {
+                    f"{prefix}.meals.{meal_index}": meal,
+                    f"{prefix}.total_calories": total_calories,
+                }}
             )
-            print(f"DEBUG: [MongoDB] Update result: matched={result.matched_count}, modified={result.modified_count}")
+            return result.modified_count == 1
+        return False
 
     def get_latest_meal_plan(self, user_id: str) -> Optional[dict]:
         """Fetch the latest meal plan for the user."""
         if self.users_collection is not None:
             from bson import ObjectId
             print(f"DEBUG: [MongoDB] Fetching latest meal plan for user {user_id}")
-            user = self.users_collection.find_one({"_id": ObjectId(user_id)})
+            user = self.users_collection.find_one({"_id": ObjectId(user_id)}, {"latest_meal_plan": 1, "_id": 0})
             if user:
                 plan = user.get("latest_meal_plan")
                 if plan:
@@ -96,6 +411,136 @@ class MongoDBClient:
                 return plan
         return None
 
+    def get_latest_meal_plan_with_profile(self, user_id: str) -> Optional[dict]:
+        """Latest plan plus the profile it was generated for (None for plans saved without one)."""
+        if self.users_collection is None:
+            return None
+        from bson import ObjectId
+        user = self.users_collection.find_one(
+            {"_id": ObjectId(user_id)}, {"_id": 0, "latest_meal_plan": 1, "latest_meal_plan_profile": 1}
+        )
+        if not user or not user.get("latest_meal_plan"):
+            return None
+        profile = user.get("latest_meal_plan_profile")
+        return {"plan": user["latest_meal_plan"], "profile": UserProfile(**profile) if profile else None}
+
+    def recent_users_for_warmup(self, limit: int = 50) -> list:
+        """Profiles and plan recipe IDs of the most recently created users (walks the _id index)."""
+        if self.users_collection is None:
+            return []
+        cursor = self.users_collection.find(
+            {}, {"_id": 0, "profile": 1, "latest_meal_plan.days.meals.recipe_id": 1}
+        ).sort("_id", -1).limit(limit)
+        users = []
+        for doc in cursor:
+            plan = doc.get("latest_meal_plan") or {}
+            recipe_ids = [m.get("recipe_id") for d in plan.get("days", []) for m in d.get("meals", [])]
+            users.append({"profile": doc.get("profile"), "recipe_ids": [r for r in recipe_ids if r]})
+        return users
+
+    def recipe_plan_counts(self) -> dict:
+        """{recipe_id: number of users whose latest plan includes it}; the typeahead popularity signal."""
+        if self.users_collection is None:
+            return {}
+        pipeline = [
+            {"$match": {"latest_meal_plan.days": {"$exists": True}}},
+            {"$project": {"_id": 0, "ids": {"$setUnion": [
+                {"$reduce": {"input": "$latest_meal_plan.days.meals.recipe_id",
+                             "initialValue": [], "in": {"$concatArrays": ["$$value", "$$this"]}}}, []
+            ]}}},
+            {"$unwind": "$ids"},
+            {"$group": {"_id": "$ids", "n": {"$sum": 1}}},
+        ]
+        return {doc["_id"]: doc["n"] for doc in self.users_collection.aggregate(pipeline) if doc["_id"]}
+
+    def ping(self) -> bool:
+        """Round trip through both clients; also opens the first connection of each pool."""
+        if self.client is None:
+            return False
+        self.client.admin.command("ping")
+        self.recipe_client.admin.command("ping")
+        return True
+
+    # --- REFRESH TOKEN METHODS ---
+
+    def save_refresh_token(self, doc: dict):
+        if self.refresh_tokens_collection is not None:
+            self.refresh_tokens_collection.insert_one(doc)
+
+    def consume_refresh_token(self, token_hash: str) -> Optional[dict]:
+        """Atomically mark an unused, unexpired token as used; None if it can't be spent."""
+        if self.refresh_tokens_collection is None:
+            return None
+        now = __import__("datetime").datetime.utcnow()
+        return self.refresh_tokens_collection.find_one_and_update(
+            {"_id": token_hash, "used_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"used_at": now}},
+        )
+
+    def get_refresh_token(self, token_hash: str) -> Optional[dict]:
+        if self.refresh_tokens_collection is None:
+            return None
+        return self.refresh_tokens_collection.find_one({"_id": token_hash})
+
+    def delete_refresh_family(self, family_id: str) -> int:
+        if self.refresh_tokens_collection is None:
+            return 0
+        return self.refresh_tokens_collection.delete_many({"family_id": family_id}).deleted_count
+
+    def delete_user_refresh_tokens(self, user_id: str) -> int:
+        if self.refresh_tokens_collection is None:
+            return 0
+        return self.refresh_tokens_collection.delete_many({"user_id": user_id}).deleted_count
+
+    # --- COHORT METHODS ---
+
+    def save_cohort_plans(self, cohort_id: str, records: list) -> int:
+        """
+        Upsert one plan per (cohort_id, member_id) in a single unordered
+        bulk write, so re-running a cohort replaces instead of duplicating.
+        """
+        if self.cohort_plans_collection is None or not records:
+            return 0
+        from pymongo import ReplaceOne
+        now = __import__("datetime").datetime.utcnow()
+        ops = [
+            ReplaceOne(
+                {"cohort_id": cohort_id, "member_id": r["member_id"]},
+                {"cohort_id": cohort_id, "member_id": r["member_id"], "plan": r["plan"], "created_at": now},
+                upsert=True,
+            )
+            for r in records
+        ]
+        result = self.cohort_plans_collection.bulk_write(ops, ordered=False)
+        return result.upserted_count + result.modified_count
+
+    # --- ICALENDAR FEED METHODS ---
+
+    def get_meal_plan_export(self, user_id: str) -> Optional[dict]:
+        """Latest plan plus when it was saved (for ICS start date, DTSTAMP and ETag)."""
+        if self.users_collection is None:
+            return None
+        from bson import ObjectId
+        user = self.users_collection.find_one(
+            {"_id": ObjectId(user_id)}, {"_id": 0, "latest_meal_plan": 1, "latest_meal_plan_at": 1}
+        )
+        if not user or not user.get("latest_meal_plan"):
+            return None
+        return {"plan": user["latest_meal_plan"], "saved_at": user.get("latest_meal_plan_at")}
+
+    def set_calendar_feed_hash(self, user_id: str, feed_hash: Optional[str]):
+        """Store (or with None, revoke) the hash of the user's calendar feed token."""
+        if self.users_collection is not None:
+            from bson import ObjectId
+            update = {"$set": {"calendar_feed_hash": feed_hash}} if feed_hash else {"$unset": {"calendar_feed_hash": ""}}
+            self.users_collection.update_one({"_id": ObjectId(user_id)}, update)
+
+    def get_user_id_by_feed_hash(self, feed_hash: str) -> Optional[str]:
+        if self.users_collection is None:
+            return None
+        user = self.users_collection.find_one({"calendar_feed_hash": feed_hash}, {"_id": 1})
+        return str(user["_id"]) if user else None
+
     # --- GOOGLE CALENDAR TOKEN METHODS ---
 
     def save_google_tokens(self, user_id: str, tokens: dict):
@@ -133,17 +578,61 @@ class MongoDBClient:
 
     # --- RECIPE METHODS ---
 
-    def create_recipe_indexes(self):
-        """Build indexes for fast filtering and text search."""
-        if self.recipes_collection is not None:
-            self.recipes_collection.create_index([("dietary_tags", 1)])
-            self.recipes_collection.create_index([("allergens", 1)])
-            self.recipes_collection.create_index([
-                ("title", "text"),
-                ("description", "text")
-            ])
+    def get_corpus_version(self) -> str:
+        """
+        Version stamp of the recipe corpus, bumped by the importer.
+        Caches compare against it to know when to rebuild. Re-read at most
+        every CORPUS_VERSION_TTL_SECONDS.
+        """
+        now = time.monotonic()
+        if self._corpus_version is not None and now - self._corpus_version_checked < CORPUS_VERSION_TTL_SECONDS:
+            return self._corpus_version
+        version = "none"
+        if self.corpus_meta_collection is not None:
+            doc = self.corpus_meta_collection.find_one({"_id": "recipes"})
+            if doc and doc.get("version"):
+                version = str(doc["version"])
+            else:
+                version = f"count:{self.recipes_collection.estimated_document_count()}"
+        self._corpus_version = version
+        self._corpus_version_checked = now
+        return version
+
+    def bump_corpus_version(self) -> str:
+        """Mark the recipe corpus as changed so every cache keyed on it rebuilds."""
+        version = str(int(time.time() * 1000))
+        if self.meta_collection is not None:
+            self.meta_collection.update_one(
+                {"_id": "recipes"}, {"$set": {"version": version}}, upsert=True
+            )
+        self._corpus_version = version
+        self._corpus_version_checked = time.monotonic()
+        return version
+
+    def get_recipes_by_ids(self, recipe_ids: list) -> list:
+        """Resolve many recipe IDs with a single $in query. Invalid IDs are skipped."""
+        if self.recipes_collection is None:
+            return []
+        from bson import ObjectId
+        object_ids = [ObjectId(rid) for rid in recipe_ids if ObjectId.is_valid(rid)]
+        if not object_ids:
+            return []
+        cursor = self.recipes_collection.find({"_id": {"$in": object_ids}}, RECIPE_PROJECTION)
+        return [shape_recipe(doc) for doc in cursor]
+
+    def iter_recipe_titles(self, batch_size: int = 5000):
+        """Every recipe's id, title, tags and rating in one streamed scan (typeahead index builds)."""
+        if self.recipes_collection is None:
+            return
+        cursor = self.recipes_collection.find(
+            {}, {"title": 1, "dietary_tags": 1, "allergens": 1, "rating": 1}
+        ).batch_size(batch_size)
+        for doc in cursor:
+            doc["id"] = str(doc.pop("_id"))
+            yield doc
 
-    def find_recipes(self, query: str, profile: UserProfile, limit: int = 50) -> list:
+    def find_recipes(self, query: str, profile: UserProfile, limit: int = 50,
+                     filters: Optional[RecipeFilters] = None, regions=None) -> list:
         """
         No-Vector Retrieval: Deterministic Filter + Refined Text Search.
         Incorporates cuisine preferences into the search seed.
@@ -151,41 +640,105 @@ class MongoDBClient:
         if self.recipes_collection is None:
             return []
 
-        # 1. Build Filter (Diets and Allergens)
-        filter_query = {}
-        
-        # Inclusion: Dietary restrictions
-        # Change from $all (strict) to $in (softer) to ensure we get results even with multiple tags
-        if profile.dietary_restrictions:
-            filter_query["dietary_tags"] = {"$in": [r.lower() for r in profile.dietary_restrictions]}
-            
-        # Exclusion: Allergens
-        if profile.allergens_to_avoid:
-            filter_query["allergens"] = {"$nin": profile.allergens_to_avoid}
-
-        # 2. Refine Text Search Query
-        # Combine user's natural language request with their preferred cuisines
-        search_terms = []
-        if query and query.strip():
-            search_terms.append(query.strip())
-        
-        if profile.cuisine_preferences:
-            search_terms.extend(profile.cuisine_preferences)
-            
-        final_search_query = " ".join(search_terms)
-
-        if final_search_query:
-            filter_query["$text"] = {"$search": final_search_query}
-
-        # 3. Execute Find
-        cursor = self.recipes_collection.find(filter_query).limit(limit)
-        
-        # 4. Map to list
-        recipes = []
-        for doc in cursor:
-            doc["id"] = str(doc.pop("_id"))
-            recipes.append(doc)
-            
-        return recipes
+        # Execute Find (projection already maps _id -> id)
+        cursor = self.recipes_collection.find(
+            recipe_filter(query, profile, filters, regions), RECIPE_PROJECTION
+        ).limit(limit)
+
+        # Map to list
+        return [shape_recipe(doc) for doc in cursor]
+
+    def find_recipes_regional(self, query: str, profile: UserProfile, limit: int = 50,
+                              min_results: int = REGION_MIN_RESULTS) -> Tuple[list, dict]:
+        """
+        find_recipes against the profile's region partition first. Widens to
+        the global partition only when that returns fewer than `min_results`
+        (capped at `limit`). Profiles without a known region search the whole
+        corpus, as before. Returns (recipes, {"region", "regional", "widened"}).
+        """
+        region = region_partition(profile)
+        if region is None or self.recipes_collection is None:
+            recipes = self.find_recipes(query, profile, limit=limit)
+            return recipes, {"region": "global", "regional": len(recipes), "widened": False}
+        recipes = self.find_recipes(query, profile, limit=limit, regions=region)
+        info = {"region": region, "regional": len(recipes), "widened": False}
+        if len(recipes) < min(min_results, limit):
+            from bson import ObjectId
+            # Recipes tagged with both the region and "global" are already in hand
+            seen = [ObjectId(r["id"]) for r in recipes if ObjectId.is_valid(r["id"])]
+            filters = recipe_filter(query, profile, None, GLOBAL_PARTITION)
+            if seen:
+                filters["_id"] = {"$nin": seen}
+            cursor = self.recipes_collection.find(filters, RECIPE_PROJECTION).limit(limit - len(recipes))
+            recipes += [shape_recipe(doc) for doc in cursor]
+            info["widened"] = True
+        return recipes, info
+
+    def find_recipes_page(self, query: str, profile: UserProfile, filters: Optional[RecipeFilters] = None,
+                          limit: int = 20, after: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """
+        One page of find_recipes results (keyset pagination). `after` is the
+        cursor returned with the previous page. Returns (recipes, next_cursor),
+        where next_cursor is None on the last page. Without free text pages
+        are in _id order and each is one bounded index range, so page 100
+        costs the same as page 1. With $text they are in relevance order
+        (see _find_text_page).
+        """
+        if self.recipes_collection is None:
+            return [], None
+        from bson import ObjectId
+        filter_query = recipe_filter(query, profile, filters)
+        is_text = "$text" in filter_query
+        after_score = None
+        if after:
+            parsed = parse_page_cursor(after)
+            # A text cursor carries its score; an _id-ordered one must not
+            if parsed is None or (parsed[0] is not None) != is_text:
+                raise ValueError("Invalid cursor")
+            after_score, after = parsed
+        if is_text:
+            return self._find_text_page(filter_query, limit, after_score, after)
+        if after:
+            filter_query["_id"] = {"$gt": ObjectId(after)}
+        # One extra document tells us whether another page exists
+        cursor = self.recipes_collection.find(filter_query, RECIPE_PROJECTION).sort("_id", 1).limit(limit + 1)
+        recipes = [shape_recipe(doc) for doc in cursor]
+        if len(recipes) > limit:
+            recipes = recipes[:limit]
+            return recipes, recipes[-1]["id"]
+        return recipes, None
+
+    def _find_text_page(self, filter_query: dict, limit: int, after_score: Optional[float],
+                        after_id: Optional[str]) -> Tuple[list, Optional[str]]:
+        """
+        $text page ordered by (textScore desc, _id asc). A text match can't
+        walk a B-tree in _id order, so sorting on _id meant an in-memory sort
+        that also threw relevance away; here the sort is a bounded top-k
+        (limit + 1) over the matches, resumed after the previous page's
+        (score, _id) pair. Cursors are "<score>:<id>".
+        """
+        from bson import ObjectId
+        pipeline = [
+            {"$match": filter_query},  # $text has to be in the first stage
+            {"$addFields": {"_score": {"$meta": "textScore"}}},
+        ]
+        if after_id is not None:
+            last_id = ObjectId(after_id)
+            pipeline.append({"$match": {"$or": [
+                {"_score": {"$lt": after_score}},
+                {"_score": after_score, "_id": {"$gt": last_id}},
+            ]}})
+        pipeline += [
+            {"$sort": {"_score": -1, "_id": 1}},
+            {"$limit": limit + 1},
+            {"$project": {**RECIPE_PROJECTION, "_score": 1}},
+        ]
+        docs = list(self.recipes_collection.aggregate(pipeline))
+        more = len(docs) > limit
+        docs = docs[:limit]
+        next_cursor = f"{docs[-1]['_score']!r}:{docs[-1]['id']}" if more else None
+        for doc in docs:
+            doc.pop("_score", None)
+        return [shape_recipe(doc) for doc in docs], next_cursor
 
 mongodb_client = MongoDBClient()
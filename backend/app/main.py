@@ -1,9 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import router
-from app.core.config import APP_NAME, DEBUG
+from app.api.auth import is_admin_token
+from app.core.config import APP_NAME, DEBUG, PROFILING_ENABLED, WARMUP_ENABLED
+from app.core.responses import ORJSONResponse
+from app.core.profiling import ProfilingMiddleware, profile_store
+from app.core.tracing import TracingMiddleware, tracer
+from app.services.warmup import warmup_service
 
-app = FastAPI(title=APP_NAME, debug=DEBUG)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm in the background so /health answers at once; /ready gates traffic
+    if WARMUP_ENABLED:
+        warmup_service.start()
+    else:
+        warmup_service.skip()
+    yield
+
+app = FastAPI(title=APP_NAME, debug=DEBUG, lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -12,8 +28,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-ID", "X-Plan-Path"],
 )
 
+app.add_middleware(TracingMiddleware, tracer=tracer)
+
+# Request profiling; not installed at all when disabled
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, is_admin=is_admin_token, store=profile_store)
+
 # Include API Router
 app.include_router(router)
 
@@ -21,6 +44,12 @@ app.include_router(router)
 def health_check():
     return {"status": "healthy", "app": APP_NAME}
 
+@app.get("/ready")
+def readiness_check():
+    """503 until this worker's warm-up is done; per-component status and timings."""
+    status = warmup_service.status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8001, reload=DEBUG)
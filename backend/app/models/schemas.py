@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
+from app.core.config import NUTRITION_BATCH_MAX_PROFILES, MEAL_PLAN_MAX_MEALS_PER_DAY
 
 
 class UserProfile(BaseModel):
@@ -24,16 +25,39 @@ class NutritionProfile(BaseModel):
     fat_g: float
 
 
+class CohortMember(BaseModel):
+    """One line of a cohort JSONL; a bare UserProfile line is also accepted."""
+    member_id: Optional[str] = None
+    profile: UserProfile
+
+
+class NutritionBatchRequest(BaseModel):
+    profiles: List[UserProfile] = Field(max_length=NUTRITION_BATCH_MAX_PROFILES)
+
+
+class RecipeFilters(BaseModel):
+    """Structured /search filters; every bound is inclusive and optional."""
+    min_calories: Optional[float] = None
+    max_calories: Optional[float] = None
+    min_protein_g: Optional[float] = None
+    max_protein_g: Optional[float] = None
+    max_time_minutes: Optional[int] = None
+    meal_type: Optional[str] = None
+    cuisine: Optional[str] = None
+
+
 class RecipeQuery(BaseModel):
     query: str
     user_profile: UserProfile
-    top_k: int = 5
+    top_k: int = 5  # page size
+    filters: Optional[RecipeFilters] = None
+    cursor: Optional[str] = None  # X-Next-Cursor from the previous page
 
 
 class MealPlanRequest(BaseModel):
     user_profile: UserProfile
     days: int = 7
-    meals_per_day: int = 3
+    meals_per_day: int = Field(3, ge=1, le=MEAL_PLAN_MAX_MEALS_PER_DAY)
 
 
 class RecipeResult(BaseModel):
@@ -54,6 +78,10 @@ class RecipeResult(BaseModel):
     score: Optional[float] = None
 
 
+class RecipeBatchRequest(BaseModel):
+    ids: List[str]
+
+
 class MealDetail(BaseModel):
     meal_type: str  # Breakfast, Lunch, Dinner
     recipe_id: str
@@ -70,12 +98,45 @@ class DayPlan(BaseModel):
     total_calories: float
 
 
-class CalendarResponse(BaseModel):
+class DayPlanList(BaseModel):
+    """Response schema when the planner re-asks the model for specific days."""
+    days: List[DayPlan]
+
+
+class MealSwapRequest(BaseModel):
+    day_number: int
+    meal_type: str  # which slot of that day to replace, e.g. "Dinner"
+    exclude_recipe_ids: List[str] = []
+
+
+class PlanGeneration(BaseModel):
+    """
+    How a plan was produced: "llm" (every day from Gemini), "partial" (some
+    days filled locally or the stream cut short, with the reason) or "local"
+    (macro fitting, with the reason).
+    """
+    path: str
+    reason: Optional[str] = None
+    budget_ms: Optional[float] = None
+    elapsed_ms: Optional[float] = None
+    stages: dict = {}
+
+
+class GeneratedMealPlan(BaseModel):
+    """
+    Response schema Gemini fills in. Server-side fields live on
+    CalendarResponse only: the Developer API rejects free-form dicts
+    (additionalProperties) in a response schema.
+    """
     overview: str
     days: List[DayPlan]
     nutrition_targets: Optional[NutritionProfile] = None
 
 
+class CalendarResponse(GeneratedMealPlan):
+    generation: Optional[PlanGeneration] = None  # attached after validation, never generated
+
+
 class UserBase(BaseModel):
     email: str
     full_name: Optional[str] = None
@@ -96,6 +157,12 @@ class User(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # access token lifetime, seconds
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class ChatMessage(BaseModel):
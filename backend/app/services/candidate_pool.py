@@ -0,0 +1,177 @@
+"""
+Candidate Pools: pre-materialized recipe candidates per retrieval bucket.
+
+The number of distinct (diet, allergen, cuisine, goal, region) combinations
+is small, so the planner's `find_recipes` round trip (plus the broadening
+fallback) is run once per bucket and kept in memory. Buckets with a region
+read that region's partition first and widen to the global partition only
+when it comes up short; per-region build stats are kept for /admin/metrics. Pools built on an
+older corpus version keep serving while a background worker rebuilds
+them; rare buckets fall out through LRU eviction.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+from app.core.cache import LRUCache
+from app.core.config import CANDIDATE_POOL_MAX_BUCKETS
+from app.core.tracing import tracer
+from app.db.mongodb import mongodb_client, retrieval_bucket
+from app.models.schemas import UserProfile
+
+# Fields the planner actually reads from a candidate
+CANDIDATE_FIELDS = ("id", "title", "calories", "protein_g", "carbs_g", "fat_g", "meal_types", "cuisine")
+
+
+class CandidatePool:
+    __slots__ = ("ids", "recipes", "corpus_version", "built_at", "build_ms")
+
+    def __init__(self, recipes: List[dict], corpus_version: str, build_ms: float):
+        self.recipes = recipes
+        self.ids = [r["id"] for r in recipes]
+        self.corpus_version = corpus_version
+        self.built_at = time.time()
+        self.build_ms = build_ms
+
+
+class CandidatePoolCache:
+    def __init__(self, max_buckets: int = CANDIDATE_POOL_MAX_BUCKETS, primary_limit: int = 40, fallback_limit: int = 20):
+        self.pools = LRUCache(maxsize=max_buckets, name="candidate_pools")
+        self.primary_limit = primary_limit
+        self.fallback_limit = fallback_limit
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="candidate-pool")
+        self._inflight = set()
+        # First-miss builds in progress; concurrent misses on a key wait for the leader's Future
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.background_rebuilds = 0
+        self.region_stats = {}
+
+    @staticmethod
+    def pool_key(search_terms: str, profile: UserProfile) -> tuple:
+        # $text is an OR over terms, so word order doesn't matter
+        terms = " ".join(sorted(set(search_terms.lower().split())))
+        return (retrieval_bucket(profile), terms)
+
+    def _materialize(self, search_terms: str, profile: UserProfile) -> CandidatePool:
+        start = time.perf_counter()
+        version = mongodb_client.get_corpus_version()
+        with tracer.span("mongo.find_recipes", limit=self.primary_limit) as span:
+            recipes, region = mongodb_client.find_recipes_regional(search_terms, profile, limit=self.primary_limit)
+            span.set_attribute("results", len(recipes))
+            span.set_attribute("region", region["region"])
+            span.set_attribute("widened", region["widened"])
+        if not recipes:
+            print("DEBUG: [CandidatePool] No recipes found with strict filters, broadening search")
+            with tracer.span("mongo.find_recipes.broadened", limit=self.fallback_limit) as span:
+                recipes, region = mongodb_client.find_recipes_regional(profile.goal, profile, limit=self.fallback_limit)
+                span.set_attribute("results", len(recipes))
+        slim = [{f: r[f] for f in CANDIDATE_FIELDS if f in r} for r in recipes]
+        build_ms = (time.perf_counter() - start) * 1000
+        self._record_region(region, len(recipes), build_ms)
+        return CandidatePool(slim, version, build_ms)
+
+    def _record_region(self, region: dict, total: int, build_ms: float):
+        with self._lock:
+            stats = self.region_stats.setdefault(
+                region["region"], {"builds": 0, "widened": 0, "regional": 0, "results": 0, "build_ms": 0.0}
+            )
+            stats["builds"] += 1
+            stats["widened"] += region["widened"]
+            stats["regional"] += min(region["regional"], total)
+            stats["results"] += total
+            stats["build_ms"] += build_ms
+
+    def get_candidates(self, search_terms: str, profile: UserProfile) -> List[dict]:
+        """In-memory lookup; only a never-seen bucket pays for the Mongo query."""
+        key = self.pool_key(search_terms, profile)
+        pool: Optional[CandidatePool] = self.pools.get(key)
+        if pool is None:
+            return self._load(key, search_terms, profile).recipes
+
+        if pool.corpus_version != mongodb_client.get_corpus_version():
+            self._schedule_rebuild(key, search_terms, profile)
+        return pool.recipes
+
+    def _load(self, key: tuple, search_terms: str, profile: UserProfile) -> CandidatePool:
+        """First miss: one caller (the leader) queries Mongo, concurrent misses wait for its pool."""
+        with self._lock:
+            # Re-checked under the lock: a leader may have finished since our miss
+            pool = self.pools.peek(key)
+            if pool is not None:
+                return pool
+            pending = self._loading.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._loading[key] = Future()
+        if not leader:
+            return pending.result()
+
+        try:
+            pool = self._materialize(search_terms, profile)
+            self.pools.set(key, pool)
+            pending.set_result(pool)
+            return pool
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def _schedule_rebuild(self, key: tuple, search_terms: str, profile: UserProfile):
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def rebuild():
+            try:
+                # Runs on the pool's own thread, so this is a root span of its own
+                with tracer.span("candidate_pool.rebuild"):
+                    self.pools.set(key, self._materialize(search_terms, profile))
+                self.background_rebuilds += 1
+            except Exception as e:
+                print(f"DEBUG: [CandidatePool] Background rebuild failed for {key[0]}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+        self._executor.submit(rebuild)
+
+    def warm(self, profiles: List[UserProfile], search_terms_for=None) -> int:
+        """
+        Materialize pools for the given profiles up front (e.g. the most
+        common buckets at startup). Returns the number of pools built.
+        """
+        built = 0
+        for profile in profiles:
+            terms = search_terms_for(profile) if search_terms_for else profile.goal
+            key = self.pool_key(terms, profile)
+            if self.pools.peek(key) is None:
+                self.pools.set(key, self._materialize(terms, profile))
+                built += 1
+        return built
+
+    def clear(self):
+        self.pools.clear()
+
+    def stats(self) -> dict:
+        stats = self.pools.stats()
+        stats["background_rebuilds"] = self.background_rebuilds
+        stats["rebuilding"] = len(self._inflight)
+        with self._lock:
+            region_stats = [(region, dict(r)) for region, r in self.region_stats.items()]
+        stats["regions"] = {
+            region: {
+                "builds": r["builds"],
+                "widened_pct": round(100 * r["widened"] / r["builds"], 1),
+                # Share of candidates served from the region's own partition
+                "regional_share": round(r["regional"] / r["results"], 3) if r["results"] else 0.0,
+                "avg_build_ms": round(r["build_ms"] / r["builds"], 2),
+            }
+            for region, r in region_stats
+        }
+        return stats
+
+candidate_pool_cache = CandidatePoolCache()
@@ -0,0 +1,69 @@
+"""
+Chat Retention: keeps chat_sessions small enough to stay in RAM.
+
+Recent turns stay as one document per message; older ones are folded
+into per-user bucket documents in chat_archive (CHAT_ARCHIVE_BUCKET_SIZE
+messages each). TTL indexes on both collections expire stale sessions
+(see app/db/indexes.py). get_chat_history reads both formats.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.core.cache import LRUCache
+from app.core.config import CHAT_HOT_MESSAGES, CHAT_ARCHIVE_BUCKET_SIZE, CHAT_ARCHIVE_CHECK_EVERY
+from app.db.mongodb import mongodb_client
+
+
+class ChatRetentionService:
+    def __init__(self, keep_recent: int = CHAT_HOT_MESSAGES, bucket_size: int = CHAT_ARCHIVE_BUCKET_SIZE,
+                 check_every: int = CHAT_ARCHIVE_CHECK_EVERY):
+        self.keep_recent = keep_recent
+        self.bucket_size = bucket_size
+        self.check_every = check_every
+        # Writes since each user's last check; bounded, an evicted user just starts counting again
+        self._writes = LRUCache(maxsize=10000, name="chat_retention_writes")
+        self._lock = threading.Lock()
+        # Archival runs off the chat request thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-archive")
+        self.archived = 0
+
+    def record_write(self, user_id: str):
+        """Called after each saved chat message; queues archival every `check_every` writes."""
+        with self._lock:
+            writes = self._writes.get(user_id, 0) + 1
+            due = writes >= self.check_every
+            if due:
+                self._writes.pop(user_id)
+            else:
+                self._writes.set(user_id, writes)
+        if due:
+            self._executor.submit(self._archive_quietly, user_id)
+
+    def _archive_quietly(self, user_id: str):
+        try:
+            self.archive_user(user_id)
+        except Exception as e:
+            # Archival is housekeeping; never let it surface anywhere
+            print(f"DEBUG: [ChatRetention] Archival failed for {user_id}: {str(e)}")
+
+    def archive_user(self, user_id: str) -> int:
+        moved = mongodb_client.archive_chat_messages(user_id, self.keep_recent, self.bucket_size)
+        if moved:
+            with self._lock:
+                self.archived += moved
+            print(f"DEBUG: [ChatRetention] Archived {moved} messages for {user_id}")
+        return moved
+
+    def archive_all(self) -> dict:
+        """Sweep every user over the hot limit (cron / scripts/archive_chat.py)."""
+        users = mongodb_client.chat_users_over(self.keep_recent)
+        moved = sum(self.archive_user(user_id) for user_id in users)
+        return {"users": len(users), "archived": moved}
+
+    def stats(self) -> dict:
+        return {
+            "keep_recent": self.keep_recent,
+            "bucket_size": self.bucket_size,
+            "archived": self.archived,
+        }
+
+chat_retention_service = ChatRetentionService()
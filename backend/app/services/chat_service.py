@@ -1,25 +1,14 @@
 from google import genai
 from app.core.config import GEMINI_API_KEY
 from app.db.mongodb import mongodb_client
+from app.core.prompt_builder import prompt_builder
+from app.core.tracing import tracer
+from app.services.chat_retention import chat_retention_service
+from app.services.compression import prompt_compressor
 from app.models.schemas import UserProfile, ChatResponse
 
-DISCOVERY_SYSTEM_PROMPT = """
-You are "Chef Discovery," a world-class culinary expert and metabolic health coach. 
-Your goal is to have a short, punchy, and highly personalized discovery chat with a user to help them build the perfect meal plan.
-
-CORE BEHAVIOR:
-1. ASK & LISTEN: Instead of giving a plan immediately, ask 1-2 clarifying questions per turn.
-2. DISCOVER: Ask about their energy levels, favorite seasonal ingredients, kitchen equipment, or time constraints for specific days.
-3. TONE: Premium, encouraging, botanical, and expert.
-4. LIMIT: Aim to finish the discovery in 3-5 turns.
-
-PLAN COMPLETION:
-When you feel you have enough information to build a truly bespoke meal plan, you MUST end your message with the exact token: [PLAN_READY].
-This will signal the system to switch to the generation phase.
-
-USER DATA:
-{profile_summary}
-"""
+# Newest turns always sent verbatim; older ones may be compressed
+VERBATIM_TURNS = 4
 
 class ChatService:
     def __init__(self):
@@ -28,18 +17,15 @@ class ChatService:
 
     def get_chef_response(self, user_id: str, message: str, profile: UserProfile = None) -> ChatResponse:
         # 1. Store user message
-        mongodb_client.save_chat_message(user_id, "user", message)
+        with tracer.span("mongo.save_chat_message"):
+            mongodb_client.save_chat_message(user_id, "user", message)
 
         # 2. Get history
-        history = mongodb_client.get_chat_history(user_id)
+        with tracer.span("mongo.get_chat_history"):
+            history = mongodb_client.get_chat_history(user_id)
         
-        # 3. Format profile for prompt
-        profile_text = "No profile set yet."
-        if profile:
-            profile_text = f"Goal: {profile.goal}, Restrictions: {profile.dietary_restrictions}, Cuisines: {profile.cuisine_preferences}"
-
-        # 4. Build prompt (Native Gemini Format)
-        system_msg = DISCOVERY_SYSTEM_PROMPT.format(profile_summary=profile_text)
+        # 3-4. Build prompt (Native Gemini Format); system prompt is memoized per profile
+        system_msg = prompt_builder.discovery_system_prompt(profile)
         
         contents = []
         for h in history:
@@ -54,17 +40,21 @@ class ChatService:
         while contents and contents[0]["role"] == "model":
             contents.pop(0)
 
+        with tracer.span("prompt.compress_history"):
+            contents = self._compress_older_turns(contents)
+
         # 5. Call Gemini
         if not self.client:
             return ChatResponse(reply="API key missing, but I'm listening!", is_complete=False)
 
         try:
             print(f"DEBUG: Calling Gemini with {len(contents)} history items")
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=contents,
-                config={"system_instruction": system_msg}
-            )
+            with tracer.span("gemini.generate", turns=len(contents)):
+                response = self.client.models.generate_content(
+                    model=self.model_name,
+                    contents=contents,
+                    config={"system_instruction": system_msg}
+                )
             reply = response.text or ""
             print(f"DEBUG: Received reply: {reply[:50]}...")
         except Exception as e:
@@ -90,7 +80,10 @@ class ChatService:
         clean_reply = reply.replace("[PLAN_READY]", "").strip()
 
         # 7. Store assistant response
-        mongodb_client.save_chat_message(user_id, "assistant", clean_reply)
+        with tracer.span("mongo.save_chat_message"):
+            mongodb_client.save_chat_message(user_id, "assistant", clean_reply)
+        with tracer.span("chat.retention"):
+            chat_retention_service.record_write(user_id)
 
         return ChatResponse(
             reply=clean_reply,
@@ -98,6 +91,22 @@ class ChatService:
             suggested_actions=self._generate_suggestions(is_complete)
         )
 
+    def _compress_older_turns(self, contents: list) -> list:
+        """Fold turns before the last VERBATIM_TURNS into a compressed note on the first kept user turn."""
+        if not prompt_compressor.enabled or len(contents) <= VERBATIM_TURNS:
+            return contents
+        split = len(contents) - VERBATIM_TURNS
+        while split < len(contents) and contents[split]["role"] != "user":
+            split += 1
+        if split >= len(contents):
+            return contents
+        older, recent = contents[:split], contents[split:]
+        older_text = "\n".join(f"{c['role']}: {c['parts'][0]['text']}" for c in older)
+        summary = prompt_compressor.compress_history(older_text, prompt="Continue this culinary discovery chat")
+        first = dict(recent[0])
+        first["parts"] = [{"text": f"(Earlier conversation, condensed)\n{summary}"}] + list(first["parts"])
+        return [first] + recent[1:]
+
     def _generate_suggestions(self, is_complete: bool):
         if is_complete:
             return ["✨ Generate My Plan", "🤔 Wait, one more thing..."]
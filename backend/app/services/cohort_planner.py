@@ -0,0 +1,188 @@
+"""
+Cohort Planner: meal plans for many members at once (gyms, partners).
+
+Members are grouped by retrieval bucket so candidate retrieval (and its
+find_recipes round trips) runs once per bucket, nutrition targets are
+computed in one NumPy pass, and days are filled locally by meal_fitting
+across a process pool. Each task is a chunk of one bucket, so a
+candidate pool is pickled once per chunk rather than once per member.
+Overviews are templated, or written by Gemini with at most
+COHORT_LLM_CONCURRENCY calls in flight. Results are yielded as they
+finish and upserted into cohort_plans in bulk.
+"""
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from app.core.config import COHORT_WORKERS, COHORT_CHUNK_SIZE, COHORT_LLM_CONCURRENCY, COHORT_WRITE_BATCH
+from app.db.mongodb import mongodb_client, retrieval_bucket
+from app.models.schemas import CohortMember, NutritionProfile, UserProfile
+from app.services.meal_fitting import plan_days, template_overview
+from app.services.nutrition import calculate_nutrition_profiles_batch
+
+OVERVIEW_MODEL = "gemini-2.5-flash-lite"
+
+
+def parse_members(lines: Iterable[str]) -> Tuple[List[CohortMember], List[dict]]:
+    """JSONL -> members; bad lines are reported, not fatal. Missing member_ids become line numbers."""
+    members, errors = [], []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+            member = CohortMember(**data) if "profile" in data else CohortMember(profile=UserProfile(**data))
+        except (ValueError, TypeError, ValidationError) as e:
+            errors.append({"type": "error", "line": number, "error": str(e)[:200]})
+            continue
+        if not member.member_id:
+            member.member_id = str(number)
+        members.append(member)
+    return members, errors
+
+
+def _plan_chunk(task: tuple) -> List[dict]:
+    """Process-pool worker: plan every member of one bucket chunk. Module-level so it pickles."""
+    members, candidates, days, meals_per_day = task
+    results = []
+    for member_id, goal, targets in members:
+        try:
+            plan = plan_days(days, meals_per_day, candidates, NutritionProfile(**targets))
+            if len(plan) < days:
+                raise ValueError("not enough candidate recipes for this profile")
+            results.append({
+                "type": "plan",
+                "member_id": member_id,
+                "plan": {
+                    "overview": template_overview(days, targets, goal, len(candidates)),
+                    "days": [day.model_dump() for day in plan],
+                    "nutrition_targets": targets,
+                },
+            })
+        except Exception as e:
+            results.append({"type": "error", "member_id": member_id, "error": str(e)[:200]})
+    return results
+
+
+class CohortPlanner:
+    def __init__(self, workers: int = COHORT_WORKERS, chunk_size: int = COHORT_CHUNK_SIZE,
+                 llm_concurrency: int = COHORT_LLM_CONCURRENCY, write_batch: int = COHORT_WRITE_BATCH):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.llm_concurrency = llm_concurrency
+        self.write_batch = write_batch
+        self.overview_client = None
+
+    def _candidates_by_bucket(self, members: List[CohortMember], days: int) -> Dict[tuple, List[dict]]:
+        # Same pools /meal-plan draws from, so a cohort also warms them for interactive use
+        from app.services.meal_planner import meal_planner_service
+        self.overview_client = meal_planner_service.client
+        pools = {}
+        for member in members:
+            bucket = retrieval_bucket(member.profile)
+            if bucket not in pools:
+                pools[bucket] = meal_planner_service.candidates_for(member.profile, days)
+        return pools
+
+    def _tasks(self, members: List[CohortMember], pools: Dict[tuple, List[dict]], days: int, meals_per_day: int):
+        targets = calculate_nutrition_profiles_batch([m.profile for m in members])
+        by_bucket: Dict[tuple, list] = {}
+        for member, target in zip(members, targets):
+            by_bucket.setdefault(retrieval_bucket(member.profile), []).append(
+                (member.member_id, member.profile.goal, target)
+            )
+        for bucket, group in by_bucket.items():
+            for i in range(0, len(group), self.chunk_size):
+                yield (group[i:i + self.chunk_size], pools[bucket], days, meals_per_day)
+
+    def _write_overview(self, record: dict) -> dict:
+        """Replace the templated overview with a Gemini one; keep the template on any failure."""
+        plan = record["plan"]
+        first_day = ", ".join(m["recipe_title"] for m in plan["days"][0]["meals"])
+        prompt = (
+            f"Write a friendly two-sentence overview for a {len(plan['days'])}-day meal plan. "
+            f"Daily targets: {json.dumps(plan['nutrition_targets'])}. Day 1: {first_day}. "
+            f"Plain text, no markdown."
+        )
+        try:
+            response = self.overview_client.models.generate_content(model=OVERVIEW_MODEL, contents=prompt)
+            if response.text and response.text.strip():
+                plan["overview"] = response.text.strip()
+        except Exception as e:
+            print(f"DEBUG: [Cohort] Overview for {record['member_id']} failed, keeping template: {str(e)}")
+        return record
+
+    def run(self, members: List[CohortMember], days: int = 7, meals_per_day: int = 3,
+            cohort_id: Optional[str] = None, llm_overviews: bool = False) -> Iterator[dict]:
+        """
+        Yields {"type": "plan"|"error", "member_id", ...} as members finish,
+        then one {"type": "summary"} with throughput. Plans are upserted
+        into cohort_plans when `cohort_id` is given.
+        """
+        start = time.perf_counter()
+        pools = self._candidates_by_bucket(members, days)
+        retrieval_s = time.perf_counter() - start
+        llm_overviews = llm_overviews and self.overview_client is not None
+        counts = {"plan": 0, "error": 0}
+        pending_writes: List[dict] = []
+        written = 0
+
+        def emit(record: dict):
+            nonlocal written
+            counts[record["type"]] += 1
+            if cohort_id and record["type"] == "plan":
+                pending_writes.append(record)
+                if len(pending_writes) >= self.write_batch:
+                    written += mongodb_client.save_cohort_plans(cohort_id, pending_writes)
+                    pending_writes.clear()
+            return record
+
+        tasks = list(self._tasks(members, pools, days, meals_per_day))
+        llm = ThreadPoolExecutor(max_workers=max(1, self.llm_concurrency)) if llm_overviews else None
+        overviews = []
+        try:
+            for chunk in self._planned_chunks(tasks):
+                for record in chunk:
+                    if llm and record["type"] == "plan":
+                        overviews.append(llm.submit(self._write_overview, record))
+                    else:
+                        yield emit(record)
+            for future in as_completed(overviews):
+                yield emit(future.result())
+        finally:
+            if llm:
+                llm.shutdown(wait=False, cancel_futures=True)
+
+        if pending_writes:
+            written += mongodb_client.save_cohort_plans(cohort_id, pending_writes)
+        elapsed = time.perf_counter() - start
+        yield {
+            "type": "summary",
+            "cohort_id": cohort_id,
+            "members": len(members),
+            "buckets": len(pools),
+            "tasks": len(tasks),
+            "plans": counts["plan"],
+            "errors": counts["error"],
+            "written": written,
+            "retrieval_seconds": round(retrieval_s, 3),
+            "seconds": round(elapsed, 3),
+            "plans_per_second": round(counts["plan"] / elapsed, 1) if elapsed else None,
+        }
+
+    def _planned_chunks(self, tasks: list) -> Iterator[List[dict]]:
+        """Chunks in completion order; in-process when workers <= 1 or there's a single task."""
+        if self.workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield _plan_chunk(task)
+            return
+        # spawn: never fork a process holding Mongo pools and client threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            for future in as_completed([pool.submit(_plan_chunk, task) for task in tasks]):
+                yield future.result()
+
+cohort_planner = CohortPlanner()
@@ -0,0 +1,189 @@
+"""
+Prompt Compression: shrink recipe context and chat history before Gemini calls.
+
+Recipe candidates are compressed locally and deterministically (recipe
+IDs must survive byte-for-byte, so they never go through a remote model):
+duplicate titles are dropped, macro lines are abbreviated, and the
+lowest-ranked candidates are cut to fit a token budget.
+
+Free text (chat history) goes to the ScaleDown endpoint when an API key
+is configured, with the local compressor as fallback. Results are cached
+by content hash, and token/latency savings are counted for /admin/metrics.
+"""
+import hashlib
+import re
+import threading
+import time
+from typing import List, Optional
+import requests
+from app.core.cache import LRUCache
+from app.core.resilience import Deadline
+from app.core.config import (
+    SCALEDOWN_API_KEY, SCALEDOWN_URL, SCALEDOWN_TIMEOUT_SECONDS, PROMPT_COMPRESSION_ENABLED,
+    PROMPT_RECIPE_TOKEN_BUDGET, PROMPT_HISTORY_TOKEN_BUDGET, PROMPT_PREFILL_MS_PER_1K_TOKENS
+)
+
+_WHITESPACE = re.compile(r"[ \t]+")
+
+RECIPE_LINE_LEGEND = "Format: - title #recipe_id kcal P=protein g C=carbs g F=fat g"
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token; good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _num(value) -> str:
+    try:
+        return str(int(round(float(value))))
+    except (TypeError, ValueError):
+        return "?"
+
+
+def abbreviate_recipe(r: dict) -> str:
+    return (
+        f"- {r.get('title', 'Untitled').strip()} #{r.get('id', r.get('_id', 'unknown'))} "
+        f"{_num(r.get('calories'))}kcal P{_num(r.get('protein_g'))} "
+        f"C{_num(r.get('carbs_g'))} F{_num(r.get('fat_g'))}"
+    )
+
+
+def compress_recipes_locally(recipes: List[dict], token_budget: int) -> str:
+    """Dedupe by title, abbreviate, and keep candidates in rank order until the budget is hit."""
+    lines = [RECIPE_LINE_LEGEND]
+    used = estimate_tokens(RECIPE_LINE_LEGEND)
+    seen_titles = set()
+    for recipe in recipes:
+        title_key = " ".join(str(recipe.get("title", "")).lower().split())
+        if title_key in seen_titles:
+            continue
+        line = abbreviate_recipe(recipe)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        seen_titles.add(title_key)
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+def compress_text_locally(text: str, token_budget: int) -> str:
+    """Collapse whitespace, drop repeated lines, then keep the newest lines that fit."""
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        line = _WHITESPACE.sub(" ", line).strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+class PromptCompressor:
+    def __init__(self, enabled: bool = PROMPT_COMPRESSION_ENABLED, api_key: Optional[str] = SCALEDOWN_API_KEY,
+                 url: str = SCALEDOWN_URL, timeout: float = SCALEDOWN_TIMEOUT_SECONDS,
+                 recipe_budget: int = PROMPT_RECIPE_TOKEN_BUDGET, history_budget: int = PROMPT_HISTORY_TOKEN_BUDGET):
+        self.enabled = enabled
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.recipe_budget = recipe_budget
+        self.history_budget = history_budget
+        self.cache = LRUCache(maxsize=2048, name="compressed_blocks")
+        self._lock = threading.Lock()
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.compress_ms = 0.0
+        self.remote_calls = 0
+        self.remote_failures = 0
+        self.remote_skipped = 0
+
+    def _record(self, before: str, after: str, started: float):
+        with self._lock:
+            self.tokens_before += estimate_tokens(before)
+            self.tokens_after += estimate_tokens(after)
+            self.compress_ms += (time.perf_counter() - started) * 1000
+
+    @staticmethod
+    def _digest(kind: str, text: str, budget: int) -> str:
+        return hashlib.sha256(f"{kind}\x00{budget}\x00{text}".encode("utf-8")).hexdigest()
+
+    def compress_recipes(self, recipes: List[dict], uncompressed: str) -> str:
+        """Compressed candidate block; `uncompressed` is only used for the savings count."""
+        if not self.enabled:
+            return uncompressed
+        started = time.perf_counter()
+        key = self._digest("recipes", uncompressed, self.recipe_budget)
+        compressed = self.cache.get_or_set(key, lambda: compress_recipes_locally(recipes, self.recipe_budget))
+        self._record(uncompressed, compressed, started)
+        return compressed
+
+    def compress_history(self, text: str, prompt: str = "Plan meals for this user",
+                         deadline: Optional[Deadline] = None) -> str:
+        """
+        ScaleDown when configured, local otherwise. With a `deadline` that
+        can't cover the remote timeout, compresses locally without caching,
+        so a later request with time to spare still gets the remote result.
+        """
+        if not self.enabled or estimate_tokens(text) <= self.history_budget:
+            return text
+        started = time.perf_counter()
+        key = self._digest("history", text, self.history_budget)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            if self.api_key and deadline is not None and deadline.remaining() < self.timeout:
+                with self._lock:
+                    self.remote_skipped += 1
+                compressed = compress_text_locally(text, self.history_budget)
+            else:
+                compressed = self._remote(text, prompt) if self.api_key else None
+                if compressed is None or estimate_tokens(compressed) > self.history_budget:
+                    compressed = compress_text_locally(compressed or text, self.history_budget)
+                self.cache.set(key, compressed)
+        self._record(text, compressed, started)
+        return compressed
+
+    def _remote(self, context: str, prompt: str) -> Optional[str]:
+        """ScaleDown raw compression; None on any failure so callers fall back locally."""
+        headers = {"x-api-key": self.api_key, "Content-Type": "application/json"}
+        payload = {"context": context, "prompt": prompt, "scaledown": {"rate": "auto"}}
+        try:
+            self.remote_calls += 1
+            resp = requests.post(self.url, headers=headers, json=payload, timeout=self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+            for field in ("compressed_prompt", "compressed_context", "content"):
+                if isinstance(data.get(field), str) and data[field].strip():
+                    return data[field]
+            raise ValueError(f"unexpected response keys: {sorted(data)}")
+        except Exception as e:
+            self.remote_failures += 1
+            print(f"DEBUG: [Compression] ScaleDown failed, using local compressor: {str(e)}")
+            return None
+
+    def stats(self) -> dict:
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "enabled": self.enabled,
+            "remote": bool(self.api_key),
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": saved,
+            "compress_ms": round(self.compress_ms, 2),
+            "estimated_prefill_ms_saved": round(saved / 1000 * PROMPT_PREFILL_MS_PER_1K_TOKENS, 1),
+            "remote_calls": self.remote_calls,
+            "remote_failures": self.remote_failures,
+            "remote_skipped": self.remote_skipped,
+            "cache": self.cache.stats(),
+        }
+
+prompt_compressor = PromptCompressor()
@@ -0,0 +1,208 @@
+"""
+Gemini explicit context caching for meal plan prompts.
+
+The static meal-plan instructions plus the recipe candidate block are
+uploaded once as a provider-side CachedContent and reused by every plan
+request in the same retrieval bucket until the corpus version changes or
+the cache's TTL runs out.
+"""
+import hashlib
+import threading
+import time
+from typing import Optional
+from app.core.config import (
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS, GEMINI_CONTEXT_CACHE_MAX_ENTRIES, GEMINI_CONTEXT_CACHE_MIN_CHARS
+)
+
+# Refresh the remote TTL once less than this fraction of it is left
+_REFRESH_FRACTION = 0.2
+# After a failed create, don't retry the same key for this long
+_FAILURE_BACKOFF_SECONDS = 300
+# Concurrent misses on a key wait this long for the in-flight create, then go uncached
+_CREATE_WAIT_SECONDS = 30
+
+
+class _Entry:
+    __slots__ = ("name", "expires_at", "corpus_version")
+
+    def __init__(self, name: str, expires_at: float, corpus_version: str):
+        self.name = name
+        self.expires_at = expires_at
+        self.corpus_version = corpus_version
+
+
+class GeminiContextCache:
+    """
+    Registry of provider-side cached contents keyed on
+    (model, retrieval bucket, corpus version, candidate-block digest).
+
+    `client` only needs `client.caches.create/update/delete`, so tests can
+    pass a local fake.
+    """
+
+    def __init__(self, client, model_name: str,
+                 ttl_seconds: int = GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+                 max_entries: int = GEMINI_CONTEXT_CACHE_MAX_ENTRIES,
+                 min_chars: int = GEMINI_CONTEXT_CACHE_MIN_CHARS):
+        self.client = client
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+        self._entries = {}
+        self._failures = {}
+        self._creating = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.creates = 0
+        self.refreshes = 0
+        self.deletes = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def _key(self, bucket: tuple, corpus_version: str, system_instruction: str, candidate_block: str) -> tuple:
+        digest = hashlib.sha1(f"{system_instruction}\x00{candidate_block}".encode("utf-8")).hexdigest()
+        return (self.model_name, bucket, corpus_version, digest)
+
+    def get_or_create(self, bucket: tuple, corpus_version: str,
+                      system_instruction: str, candidate_block: str) -> Optional[str]:
+        """
+        Return the cached content name to pass as `cached_content`, or None
+        when the block is too small to cache or the provider refused it.
+        """
+        if self.client is None:
+            return None
+        if len(system_instruction) + len(candidate_block) < self.min_chars:
+            self.skipped += 1
+            return None
+
+        key = self._key(bucket, corpus_version, system_instruction, candidate_block)
+        while True:
+            now = time.time()
+            with self._lock:
+                if self._failures.get(key, 0) > now:
+                    self.skipped += 1
+                    return None
+                entry = self._entries.get(key)
+                if entry and entry.expires_at > now:
+                    self.hits += 1
+                    refresh = (entry.expires_at - now < self.ttl_seconds * _REFRESH_FRACTION
+                               and entry.name not in self._refreshing)
+                    if refresh:
+                        self._refreshing.add(entry.name)
+                    name = entry.name
+                    break
+                if entry:
+                    # Expired on the provider side already; just forget it
+                    del self._entries[key]
+                pending = self._creating.get(key)
+                if pending is None:
+                    # This caller owns the create; concurrent misses wait on it
+                    self._creating[key] = threading.Event()
+                    refresh = False
+                    name = None
+                    break
+            if not pending.wait(_CREATE_WAIT_SECONDS):
+                self.skipped += 1
+                return None
+
+        if name is not None:
+            if refresh:
+                self._refresh(entry, now)
+            return name
+        return self._create(key, bucket, corpus_version, system_instruction, candidate_block)
+
+    def _create(self, key: tuple, bucket: tuple, corpus_version: str,
+                system_instruction: str, candidate_block: str) -> Optional[str]:
+        now = time.time()
+        try:
+            cached = self.client.caches.create(
+                model=self.model_name,
+                config={
+                    "system_instruction": system_instruction,
+                    "contents": [{"role": "user", "parts": [{"text": candidate_block}]}],
+                    "ttl": f"{self.ttl_seconds}s",
+                    "display_name": f"fitfork-plan-{key[3][:12]}",
+                },
+            )
+        except Exception as e:
+            print(f"DEBUG: [ContextCache] Create failed, falling back to uncached prompt: {str(e)}")
+            with self._lock:
+                self.errors += 1
+                self._failures[key] = now + _FAILURE_BACKOFF_SECONDS
+                self._creating.pop(key).set()
+            return None
+
+        with self._lock:
+            self.creates += 1
+            self._entries[key] = _Entry(cached.name, now + self.ttl_seconds, corpus_version)
+            evicted = self._evict(corpus_version)
+            self._creating.pop(key).set()
+        print(f"DEBUG: [ContextCache] Created {cached.name} for bucket {bucket}")
+        for stale_name in evicted:
+            self._delete_remote(stale_name)
+        return cached.name
+
+    def _refresh(self, entry: _Entry, now: float):
+        """Runs outside the lock; `_refreshing` keeps it to one update per cache."""
+        try:
+            self.client.caches.update(name=entry.name, config={"ttl": f"{self.ttl_seconds}s"})
+            with self._lock:
+                entry.expires_at = now + self.ttl_seconds
+                self.refreshes += 1
+        except Exception as e:
+            print(f"DEBUG: [ContextCache] TTL refresh failed for {entry.name}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(entry.name)
+
+    def _evict(self, current_version: str) -> list:
+        """
+        Drop caches built on an older corpus, then the soonest-expiring beyond
+        max_entries. Caller holds the lock; returns the names to delete remotely
+        once it's released.
+        """
+        stale = [k for k, e in self._entries.items() if e.corpus_version != current_version]
+        overflow = len(self._entries) - len(stale) - self.max_entries
+        if overflow > 0:
+            live = sorted(
+                (k for k, e in self._entries.items() if e.corpus_version == current_version),
+                key=lambda k: self._entries[k].expires_at,
+            )
+            stale.extend(live[:overflow])
+        return [self._entries.pop(k).name for k in stale]
+
+    def invalidate(self, name: str):
+        """Forget a cache the provider no longer knows about (e.g. expired early)."""
+        with self._lock:
+            for k, e in list(self._entries.items()):
+                if e.name == name:
+                    del self._entries[k]
+
+    def _delete_remote(self, name: str):
+        try:
+            self.client.caches.delete(name=name)
+            with self._lock:
+                self.deletes += 1
+        except Exception as e:
+            print(f"DEBUG: [ContextCache] Delete failed for {name}: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            names = [entry.name for entry in self._entries.values()]
+            self._entries.clear()
+            self._failures.clear()
+        for name in names:
+            self._delete_remote(name)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "creates": self.creates,
+            "refreshes": self.refreshes,
+            "deletes": self.deletes,
+            "errors": self.errors,
+            "skipped": self.skipped,
+        }
@@ -0,0 +1,495 @@
+"""
+Recipe corpus enrichment: the passes of data/data_enriching.ipynb as
+plain functions, plus a chunked, resumable, multi-process stage runner.
+
+scripts/enrich_recipes.py runs the stages:
+
+  cuisine_model  TF-IDF + RandomForest cuisine classifier trained on Yummly;
+                 cached on disk, keyed by a hash of train.json and the parameters
+  food_com       predict cuisine, convert nutrition_raw, then regions / allergens / difficulty
+  epicurious     CSV rows -> recipes (tags, cuisine, meal types, nutrition), regions
+  merge          quality filter, lift macros to the top level for RecipeResult,
+                 write final_recipes_enriched.jsonl, a 1k sample and the stats file
+
+Inputs are streamed in chunks of raw lines. Every chunk is one process-
+pool task that writes its own part file atomically, so an interrupted run
+resumes at the first missing part. A finished stage leaves a _DONE.json
+with its fingerprint, and is skipped while its inputs are unchanged.
+"""
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# --- Per-recipe passes (unchanged rules from the notebook) ---
+
+ALLERGEN_KEYWORDS = {
+    'dairy': ['milk', 'cheese', 'butter', 'cream', 'yogurt', 'whey',
+              'casein', 'ghee', 'buttermilk', 'sour cream', 'ricotta',
+              'mozzarella', 'cheddar', 'parmesan', 'brie'],
+    'eggs': ['egg', 'eggs', 'mayonnaise', 'mayo', 'meringue'],
+    'peanuts': ['peanut', 'peanuts', 'peanut butter'],
+    'tree_nuts': ['almond', 'walnut', 'cashew', 'pecan', 'pistachio',
+                  'hazelnut', 'macadamia', 'pine nut', 'brazil nut'],
+    'soy': ['soy', 'tofu', 'edamame', 'miso', 'tempeh', 'soy sauce',
+            'tamari', 'soybean'],
+    'wheat': ['flour', 'wheat', 'bread', 'pasta', 'couscous', 'bulgur',
+              'semolina', 'farro', 'spelt', 'wheat germ'],
+    'fish': ['salmon', 'tuna', 'cod', 'tilapia', 'fish', 'anchovy',
+             'sardine', 'mackerel', 'halibut', 'trout'],
+    'shellfish': ['shrimp', 'crab', 'lobster', 'clam', 'mussel',
+                  'oyster', 'scallop', 'prawn', 'crayfish'],
+}
+
+CUISINE_TO_REGION = {
+    'italian': 'europe', 'french': 'europe', 'greek': 'mediterranean', 'spanish': 'europe',
+    'mediterranean': 'mediterranean', 'british': 'europe', 'mexican': 'latin_america',
+    'brazilian': 'latin_america', 'cajun_creole': 'north_america', 'southern_us': 'north_america',
+    'american': 'north_america', 'chinese': 'asia', 'japanese': 'asia', 'thai': 'asia',
+    'indian': 'asia', 'korean': 'asia', 'vietnamese': 'asia', 'filipino': 'asia',
+    'moroccan': 'middle_east', 'middle-eastern': 'middle_east', 'irish': 'europe',
+    'russian': 'europe', 'jamaican': 'latin_america',
+}
+
+EXOTIC_KEYWORDS = [
+    'saffron', 'tamarind', 'miso', 'tahini', 'harissa', 'sumac', 'za\'atar', 'galangal',
+    'lemongrass', 'kaffir lime', 'fish sauce', 'garam masala', 'cardamom pods',
+]
+
+EPI_DIETARY_COLUMNS = {
+    'vegetarian': 'vegetarian', 'vegan': 'vegan', 'wheat/gluten-free': 'gluten-free',
+    'peanut free': 'peanut-free', 'soy free': 'soy-free', 'tree nut free': 'tree-nut-free',
+    'dairy free': 'dairy-free', 'egg free': 'egg-free', 'low-cal': 'low-calorie',
+    'low-fat': 'low-fat', 'low-sodium': 'low-sodium', 'high-protein': 'high-protein',
+    'paleo': 'paleo', 'kosher': 'kosher', 'pescatarian': 'pescatarian',
+}
+EPI_CUISINE_COLUMNS = ['italian', 'mexican', 'chinese', 'japanese', 'thai', 'indian', 'french', 'greek',
+                       'mediterranean', 'spanish', 'korean', 'vietnamese', 'middle eastern', 'moroccan']
+
+# Fields RecipeResult reads at the top level (the notebook only nested them under `nutrition`)
+TOP_LEVEL_MACROS = ("calories", "protein_g", "carbs_g", "fat_g")
+
+
+def detect_allergens(ingredients_list: List[str]) -> List[str]:
+    if not ingredients_list:
+        return []
+    text = ' '.join(ingredients_list).lower()
+    return [allergen for allergen, keywords in ALLERGEN_KEYWORDS.items() if any(kw in text for kw in keywords)]
+
+
+def add_regional_availability(recipe: dict) -> List[str]:
+    """Region of the cuisine, plus "global" unless an exotic ingredient is needed."""
+    regions = set()
+    cuisine = recipe.get('cuisine', 'american')
+    if cuisine in CUISINE_TO_REGION:
+        regions.add(CUISINE_TO_REGION[cuisine])
+    ingredients = recipe.get('ingredients', [])
+    if not ingredients or not any(kw in ' '.join(ingredients).lower() for kw in EXOTIC_KEYWORDS):
+        regions.add('global')
+    return sorted(regions)
+
+
+def estimate_difficulty(n_steps: int, total_time_min: float, n_ingredients: int) -> str:
+    score = sum(
+        1 if value <= low else 2 if value <= high else 3
+        for value, low, high in ((n_steps, 5, 10), (total_time_min, 30, 60), (n_ingredients, 5, 10))
+    )
+    return 'easy' if score <= 4 else 'medium' if score <= 7 else 'hard'
+
+
+def convert_food_com_nutrition(nutrition_raw) -> Optional[dict]:
+    """[calories, fat, sugar, sodium, protein, sat_fat, carbs] (% daily value) -> grams."""
+    if not nutrition_raw or len(nutrition_raw) < 7:
+        return None
+    try:
+        values = [float(v) for v in nutrition_raw[:7]]
+    except (TypeError, ValueError):
+        return None
+    return {
+        'calories': round(values[0], 1),
+        'fat_g': round(values[1] / 100 * 78, 1),
+        'sugar_g': round(values[2] / 100 * 50, 1),
+        'sodium_mg': round(values[3] / 100 * 2300, 1),
+        'protein_g': round(values[4] / 100 * 50, 1),
+        'saturated_fat_g': round(values[5] / 100 * 20, 1),
+        'carbs_g': round(values[6] / 100 * 275, 1),
+        'fiber_g': round(values[6] / 100 * 275 * 0.1, 1),
+    }
+
+
+def enrich_food_com(recipe: dict, cuisine: Optional[str], confidence: float) -> dict:
+    if cuisine is None:
+        # No ingredients to classify
+        recipe['cuisine'], recipe['cuisine_confidence'] = 'american', 0.0
+    else:
+        recipe['cuisine'], recipe['cuisine_confidence'] = cuisine, round(float(confidence), 3)
+    if 'nutrition' not in recipe:
+        recipe['nutrition'] = convert_food_com_nutrition(recipe.get('nutrition_raw'))
+    recipe['nutrition_valid'] = recipe['nutrition'] is not None
+    if 'total_time_min' not in recipe:
+        recipe['total_time_min'] = recipe.get('time_minutes', 0)
+    recipe.setdefault('meal_types', ['dinner'])
+    recipe.setdefault('dietary_tags', [])
+    recipe['regions'] = add_regional_availability(recipe)
+    recipe['allergens'] = detect_allergens(recipe.get('ingredients', []))
+    if not recipe.get('difficulty'):
+        recipe['difficulty'] = estimate_difficulty(
+            recipe.get('n_steps', 0), recipe.get('total_time_min', 0), recipe.get('n_ingredients', 0)
+        )
+    return recipe
+
+
+def _flag(row: dict, column: str) -> bool:
+    try:
+        return float(row.get(column) or 0) == 1.0
+    except ValueError:
+        return False
+
+
+def _number(row: dict, column: str) -> float:
+    try:
+        return float(row.get(column) or 0)
+    except ValueError:
+        return 0.0
+
+
+def epicurious_recipe(row: dict, index: int) -> dict:
+    """One epi_r.csv row -> recipe; carbs are estimated from the calorie remainder."""
+    dietary_tags = [tag for column, tag in EPI_DIETARY_COLUMNS.items() if _flag(row, column)]
+    cuisine = next((c.replace(' ', '-') for c in EPI_CUISINE_COLUMNS if _flag(row, c)), 'american')
+    meal_types = [m for m in ('dessert', 'breakfast', 'lunch') if _flag(row, m)] or ['dinner']
+    calories, protein_g, fat_g = _number(row, 'calories'), _number(row, 'protein'), _number(row, 'fat')
+    carbs_g = max(0.0, calories - protein_g * 4 - fat_g * 9) / 4
+    recipe = {
+        'id': f"epi_{index}",
+        'source_id': index,
+        'title': str(row.get('title', '')).strip(),
+        'description': '',
+        'ingredients': [],  # Epicurious doesn't have ingredient lists
+        'instructions': [],
+        'n_ingredients': 0,
+        'n_steps': 0,
+        'total_time_min': 0,
+        'submitted': None,
+        'nutrition': {
+            'calories': round(calories, 1),
+            'protein_g': round(protein_g, 1),
+            'fat_g': round(fat_g, 1),
+            'carbs_g': round(carbs_g, 1),
+            'sodium_mg': round(_number(row, 'sodium'), 1),
+            'fiber_g': round(carbs_g * 0.1, 1),
+            'sugar_g': 0,
+            'saturated_fat_g': 0,
+        },
+        'nutrition_valid': True,
+        'dietary_tags': dietary_tags,
+        'cuisine': cuisine,
+        'cuisine_confidence': 1.0,  # labelled, not predicted
+        'meal_types': meal_types,
+        'difficulty': 'medium',
+        'rating': round(_number(row, 'rating'), 2),
+        'allergens': [],
+        'source': 'epicurious',
+    }
+    recipe['regions'] = add_regional_availability(recipe)
+    return recipe
+
+
+def rejection_reasons(recipe: dict) -> List[str]:
+    """Why a recipe can't be served (empty list = keep): nutrition, title, ingredients, cuisine."""
+    reasons = []
+    if not (recipe.get('nutrition_valid') and recipe.get('nutrition') is not None):
+        reasons.append('no_nutrition')
+    if not str(recipe.get('title', '')).strip():
+        reasons.append('no_title')
+    if not recipe.get('ingredients'):
+        reasons.append('no_ingredients')
+    if not recipe.get('cuisine'):
+        reasons.append('no_cuisine')
+    return reasons
+
+
+def finalize_recipe(recipe: dict) -> dict:
+    """Top-level macros and time_minutes, as find_recipes / RecipeResult read them."""
+    nutrition = recipe.get('nutrition') or {}
+    for field in TOP_LEVEL_MACROS:
+        if recipe.get(field) is None and nutrition.get(field) is not None:
+            recipe[field] = nutrition[field]
+    if recipe.get('time_minutes') is None and recipe.get('total_time_min'):
+        recipe['time_minutes'] = int(recipe['total_time_min'])
+    return recipe
+
+
+# --- Cuisine model (optional dependency: scikit-learn) ---
+
+CUISINE_MODEL_PARAMS = {
+    "tfidf": {"max_features": 3000, "ngram_range": [1, 2], "min_df": 2, "max_df": 0.8},
+    "forest": {"n_estimators": 200, "max_depth": 30, "min_samples_split": 5, "random_state": 42},
+}
+
+
+def file_fingerprint(*paths: str) -> str:
+    """Cheap change detector: sizes and mtimes (not contents) of the given files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def cuisine_model_key(train_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(train_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(CUISINE_MODEL_PARAMS, sort_keys=True).encode())
+    try:
+        import sklearn
+        digest.update(sklearn.__version__.encode())
+    except ImportError:
+        pass
+    return digest.hexdigest()[:16]
+
+
+def train_cuisine_model(train_path: str, workers: int = -1) -> dict:
+    try:
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+    except ImportError as e:
+        raise RuntimeError("The cuisine stage needs scikit-learn: pip install scikit-learn") from e
+
+    with open(train_path, "r", encoding="utf-8") as f:
+        yummly = json.load(f)  # one JSON array (~40k recipes); only the training set is held in memory
+    texts = [' '.join(r['ingredients']).lower() for r in yummly]
+    labels = [r['cuisine'] for r in yummly]
+    x_train, x_test, y_train, y_test = train_test_split(texts, labels, test_size=0.2, random_state=42,
+                                                        stratify=labels)
+    tfidf = dict(CUISINE_MODEL_PARAMS["tfidf"], ngram_range=tuple(CUISINE_MODEL_PARAMS["tfidf"]["ngram_range"]))
+    vectorizer = TfidfVectorizer(lowercase=True, **tfidf)
+    classifier = RandomForestClassifier(n_jobs=workers, **CUISINE_MODEL_PARAMS["forest"])
+    classifier.fit(vectorizer.fit_transform(x_train), y_train)
+    accuracy = accuracy_score(y_test, classifier.predict(vectorizer.transform(x_test)))
+    return {"vectorizer": vectorizer, "classifier": classifier, "accuracy": float(accuracy),
+            "cuisines": sorted(set(labels))}
+
+
+def load_or_train_cuisine_model(train_path: str, artifact_path: str, workers: int = -1) -> dict:
+    """Reuse the pickled model when train.json and the parameters still hash to its key."""
+    key = cuisine_model_key(train_path)
+    meta_path = artifact_path + ".json"
+    if os.path.exists(artifact_path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("key") == key:
+            return {"cached": True, **meta}
+    start = time.perf_counter()
+    model = train_cuisine_model(train_path, workers)
+    atomic_write(artifact_path, pickle.dumps(model))
+    meta = {"key": key, "accuracy": round(model["accuracy"], 4), "cuisines": len(model["cuisines"]),
+            "train_seconds": round(time.perf_counter() - start, 1)}
+    atomic_write(meta_path, json.dumps(meta).encode())
+    return {"cached": False, **meta}
+
+
+# --- Chunk workers (module level so the process pool can pickle them) ---
+
+_worker_model = None
+
+
+def init_cuisine_worker(artifact_path: str):
+    """Process-pool initializer: unpickle the cuisine model once per worker, not per chunk."""
+    global _worker_model
+    with open(artifact_path, "rb") as f:
+        _worker_model = pickle.load(f)
+
+
+def predict_cuisines(recipes: List[dict]) -> List[tuple]:
+    """(cuisine, confidence) per recipe in one vectorized batch; (None, 0) without ingredients."""
+    texts, rows = [], []
+    for i, recipe in enumerate(recipes):
+        if recipe.get('ingredients'):
+            texts.append(' '.join(recipe['ingredients']).lower())
+            rows.append(i)
+    out = [(None, 0.0)] * len(recipes)
+    if texts:
+        vectors = _worker_model["vectorizer"].transform(texts)
+        probabilities = _worker_model["classifier"].predict_proba(vectors)
+        classes = _worker_model["classifier"].classes_
+        for row, probs in zip(rows, probabilities):
+            best = probs.argmax()
+            out[row] = (str(classes[best]), float(probs[best]))
+    return out
+
+
+def food_com_chunk(lines: List[str], first_index: int) -> Iterator[dict]:
+    recipes = [json.loads(line) for line in lines if line.strip()]
+    for recipe, (cuisine, confidence) in zip(recipes, predict_cuisines(recipes)):
+        yield enrich_food_com(recipe, cuisine, confidence)
+
+
+def epicurious_chunk(lines: List[str], first_index: int, header: List[str]) -> Iterator[dict]:
+    for offset, row in enumerate(csv.reader(io.StringIO("".join(lines)))):
+        if row:
+            yield epicurious_recipe(dict(zip(header, row)), first_index + offset)
+
+
+def run_chunk(transform: Callable, args: tuple, lines: List[str], first_index: int, part_path: str) -> int:
+    """Worker task: transform one chunk and write its part file (tmp + rename). Returns records written."""
+    buffer = io.StringIO()
+    count = 0
+    for recipe in transform(lines, first_index, *args):
+        buffer.write(json.dumps(recipe))
+        buffer.write("\n")
+        count += 1
+    atomic_write(part_path, buffer.getvalue().encode("utf-8"))
+    return count
+
+
+def atomic_write(path: str, data: bytes):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# --- Stage runner ---
+
+def read_chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(lines)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_csv_records(f) -> Iterator[str]:
+    """Raw CSV records, one string each, even when quoted fields span lines."""
+    buffer = ""
+    for line in f:
+        buffer += line
+        if buffer.count('"') % 2 == 0:
+            yield buffer
+            buffer = ""
+    if buffer:
+        yield buffer
+
+
+class ChunkedStage:
+    """
+    One enrichment pass: raw input chunks -> part-NNNNN.jsonl files under
+    `directory`. Finished parts are skipped on resume. The chunk size is
+    part of the fingerprint, so changing it starts the stage over.
+    """
+
+    def __init__(self, name: str, directory: str, transform: Callable, transform_args: tuple = (),
+                 chunk_size: int = 5000, workers: int = 1, initializer: Optional[Callable] = None,
+                 initargs: tuple = ()):
+        self.name = name
+        self.directory = directory
+        self.transform = transform
+        self.transform_args = transform_args
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._initialized = False
+
+    @property
+    def done_path(self) -> str:
+        return os.path.join(self.directory, "_DONE.json")
+
+    def part_path(self, chunk: int) -> str:
+        return os.path.join(self.directory, f"part-{chunk:05d}.jsonl")
+
+    def parts(self) -> List[str]:
+        return sorted(os.path.join(self.directory, p) for p in os.listdir(self.directory)
+                      if p.startswith("part-") and p.endswith(".jsonl"))
+
+    def completed(self, fingerprint: str) -> Optional[dict]:
+        if not os.path.exists(self.done_path):
+            return None
+        with open(self.done_path, "r", encoding="utf-8") as f:
+            done = json.load(f)
+        return done if done.get("fingerprint") == fingerprint else None
+
+    def run(self, lines: Iterable[str], fingerprint: str, force: bool = False) -> dict:
+        fingerprint = f"{fingerprint}:{self.chunk_size}"
+        os.makedirs(self.directory, exist_ok=True)
+        previous = None if force else self.completed(fingerprint)
+        if previous:
+            return {**previous, "status": "cached", "seconds": 0.0}
+        manifest_path = os.path.join(self.directory, "_FINGERPRINT")
+        manifest = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = f.read()
+        if force or manifest != fingerprint:
+            # Inputs or chunking changed: old parts don't line up any more
+            for path in self.parts() + ([self.done_path] if os.path.exists(self.done_path) else []):
+                os.remove(path)
+            atomic_write(manifest_path, fingerprint.encode())
+
+        start = time.perf_counter()
+        stats = {"chunks": 0, "resumed_chunks": 0, "records": 0}
+        tasks = self._tasks(lines, stats)
+        if self.workers <= 1:
+            records = sum(self._run_inline(task) for task in tasks)
+        else:
+            records = self._run_pool(tasks)
+        stats["records"] += records
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        done = {"stage": self.name, "fingerprint": fingerprint, **stats}
+        atomic_write(self.done_path, json.dumps(done).encode())
+        return {**done, "status": "ran"}
+
+    def _tasks(self, lines: Iterable[str], stats: dict) -> Iterator[tuple]:
+        """run_chunk arguments for each unfinished chunk, read lazily; resumed parts are counted into stats."""
+        for chunk, raw in enumerate(read_chunks(lines, self.chunk_size)):
+            stats["chunks"] += 1
+            part = self.part_path(chunk)
+            if os.path.exists(part):
+                stats["resumed_chunks"] += 1
+                with open(part, "r", encoding="utf-8") as f:
+                    stats["records"] += sum(1 for _ in f)
+                continue
+            yield self.transform, self.transform_args, raw, chunk * self.chunk_size, part
+
+    def _run_inline(self, task: tuple) -> int:
+        if self.initializer is not None and not self._initialized:
+            self.initializer(*self.initargs)
+            self._initialized = True  # once, like a pool worker
+        return run_chunk(*task)
+
+    def _run_pool(self, tasks: Iterable[tuple]) -> int:
+        # spawn: same reasoning as cohort_planner; at most 2 chunks per worker in flight.
+        # `tasks` is consumed as slots free up, so the raw input is never all in memory.
+        context = multiprocessing.get_context("spawn")
+        records = 0
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                 initializer=self.initializer, initargs=self.initargs) as pool:
+            pending = set()
+            for task in tasks:
+                if len(pending) >= self.workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    records += sum(f.result() for f in finished)
+                pending.add(pool.submit(run_chunk, *task))
+            records += sum(f.result() for f in pending)
+        return records
+
+
+def iter_parts(directory: str) -> Iterator[dict]:
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("part-") and name.endswith(".jsonl"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
@@ -8,6 +8,7 @@ from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from app.core.config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REDIRECT_URI
+from app.core.tracing import tracer
 
 # OAuth 2.0 scopes — only need event write access
 SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
@@ -107,6 +108,27 @@ def _meal_emoji(meal_type: str) -> str:
     return MEAL_EMOJI.get(key, "🍴")
 
 
+def meal_event_window(base_date: datetime, day_number: int, meal_type: str):
+    """Start/end of one meal's 30-minute slot in a plan that starts on base_date."""
+    event_date = base_date + timedelta(days=day_number - 1)
+    start_dt = event_date.replace(hour=_meal_time_hour(meal_type), minute=0, second=0, microsecond=0)
+    return start_dt, start_dt + timedelta(minutes=30)
+
+
+def meal_event_text(meal: dict):
+    """(summary, description) shown for a meal in any calendar."""
+    meal_type = meal.get("meal_type", "Meal")
+    summary = f"{_meal_emoji(meal_type)} {meal_type}: {meal.get('recipe_title', 'Untitled')}"
+    description = (
+        f"🔥 {int(meal.get('calories', 0))} kcal\n"
+        f"💪 Protein: {meal.get('protein_g', 0)}g\n"
+        f"🌾 Carbs: {meal.get('carbs_g', 0)}g\n"
+        f"🥑 Fat: {meal.get('fat_g', 0)}g\n\n"
+        f"Generated by FitFork"
+    )
+    return summary, description
+
+
 def sync_meal_plan(tokens: dict, plan_data: dict, start_date: str, timezone: str = "Asia/Kolkata") -> dict:
     """
     Push meal plan events to the user's Google Calendar.
@@ -120,7 +142,8 @@ def sync_meal_plan(tokens: dict, plan_data: dict, start_date: str, timezone: str
     Returns:
         dict with count of created events and any errors
     """
-    service = _get_calendar_service(tokens)
+    with tracer.span("google.build_service"):
+        service = _get_calendar_service(tokens)
     base_date = datetime.fromisoformat(start_date)
 
     created = 0
@@ -130,31 +153,15 @@ def sync_meal_plan(tokens: dict, plan_data: dict, start_date: str, timezone: str
 
     for day in days:
         day_number = day.get("day_number", 1)
-        event_date = base_date + timedelta(days=day_number - 1)
 
         for meal in day.get("meals", []):
             meal_type = meal.get("meal_type", "Meal")
-            recipe_title = meal.get("recipe_title", "Untitled")
-            calories = meal.get("calories", 0)
-            protein = meal.get("protein_g", 0)
-            carbs = meal.get("carbs_g", 0)
-            fat = meal.get("fat_g", 0)
-
-            hour = _meal_time_hour(meal_type)
-            emoji = _meal_emoji(meal_type)
-
-            start_dt = event_date.replace(hour=hour, minute=0, second=0)
-            end_dt = start_dt + timedelta(minutes=30)
+            start_dt, end_dt = meal_event_window(base_date, day_number, meal_type)
+            summary, description = meal_event_text(meal)
 
             event_body = {
-                "summary": f"{emoji} {meal_type}: {recipe_title}",
-                "description": (
-                    f"🔥 {int(calories)} kcal\n"
-                    f"💪 Protein: {protein}g\n"
-                    f"🌾 Carbs: {carbs}g\n"
-                    f"🥑 Fat: {fat}g\n\n"
-                    f"Generated by FitFork"
-                ),
+                "summary": summary,
+                "description": description,
                 "start": {
                     "dateTime": start_dt.isoformat(),
                     "timeZone": timezone,
@@ -173,7 +180,8 @@ def sync_meal_plan(tokens: dict, plan_data: dict, start_date: str, timezone: str
             }
 
             try:
-                service.events().insert(calendarId="primary", body=event_body).execute()
+                with tracer.span("google.events_insert"):
+                    service.events().insert(calendarId="primary", body=event_body).execute()
                 created += 1
             except Exception as e:
                 errors.append(f"Day {day_number} {meal_type}: {str(e)}")
@@ -0,0 +1,95 @@
+"""
+iCalendar (RFC 5545) export of a stored meal plan.
+
+A zero-API-call alternative to Google sync: the stored plan is rendered
+as VEVENTs, using the same meal times, emoji and text as
+google_calendar.sync_meal_plan, and streamed event by event. Times are
+"floating" (no TZID), so breakfast shows at 08:00 in whatever timezone
+the calendar is viewed in. UIDs depend only on user, day and slot, so
+re-importing or refreshing a subscription updates events instead of
+duplicating them.
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Iterator
+from app.services.google_calendar import meal_event_window, meal_event_text
+
+PRODID = "-//FitFork//Meal Plan//EN"
+# Hint for subscribed feeds; most clients poll on their own schedule anyway
+REFRESH_INTERVAL = "PT6H"
+
+
+def _escape(text: str) -> str:
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold to 75-octet lines (continuations start with a space) without splitting UTF-8 sequences."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, current, size = [], [], 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        limit = 75 if not parts else 74
+        if size + width > limit:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(ch)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _stamp(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def plan_etag(plan: dict, base_date: datetime, saved_at=None) -> str:
+    """Changes whenever the plan, its start date or its save time change."""
+    payload = json.dumps(plan, sort_keys=True, default=str) + base_date.date().isoformat() + str(saved_at)
+    return '"' + hashlib.sha1(payload.encode("utf-8")).hexdigest() + '"'
+
+
+def iter_plan_ics(plan: dict, user_id: str, base_date: datetime, dtstamp: datetime) -> Iterator[str]:
+    """Yields the calendar header, one chunk per VEVENT, then the footer."""
+    yield "".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        "X-WR-CALNAME:FitFork Meal Plan",
+        f"REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}",
+        f"X-PUBLISHED-TTL:{REFRESH_INTERVAL}",
+    ))
+    stamp = dtstamp.strftime("%Y%m%dT%H%M%SZ")
+    for day in plan.get("days", []):
+        day_number = day.get("day_number", 1)
+        for index, meal in enumerate(day.get("meals", [])):
+            meal_type = meal.get("meal_type", "Meal")
+            start_dt, end_dt = meal_event_window(base_date, day_number, meal_type)
+            summary, description = meal_event_text(meal)
+            slot = "".join(c for c in meal_type.lower() if c.isalnum()) or "meal"
+            yield "".join(_fold(line) for line in (
+                "BEGIN:VEVENT",
+                f"UID:{user_id}-d{day_number}-{index}-{slot}@fitfork",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{_stamp(start_dt)}",
+                f"DTEND:{_stamp(end_dt)}",
+                f"SUMMARY:{_escape(summary)}",
+                f"DESCRIPTION:{_escape(description)}",
+                "CATEGORIES:MEAL PLAN",
+                "TRANSP:TRANSPARENT",
+                "BEGIN:VALARM",
+                "ACTION:DISPLAY",
+                f"DESCRIPTION:{_escape(summary)}",
+                "TRIGGER:-PT30M",
+                "END:VALARM",
+                "END:VEVENT",
+            ))
+    yield "END:VCALENDAR\r\n"
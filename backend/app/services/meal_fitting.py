@@ -0,0 +1,152 @@
+"""
+Meal Fitting: local, LLM-free selection of recipes against a macro budget.
+
+Candidates come from the in-memory candidate pools, so ranking is pure
+arithmetic and runs in well under a millisecond for a 40-recipe pool.
+"""
+from typing import Iterable, List, Optional, Set
+from app.models.schemas import MealDetail, DayPlan, NutritionProfile
+
+MACROS = ("calories", "protein_g", "carbs_g", "fat_g")
+# Calories matter most; protein next since most goals are protein-driven
+MACRO_WEIGHTS = {"calories": 1.0, "protein_g": 0.6, "carbs_g": 0.3, "fat_g": 0.3}
+# Added to the score when a recipe isn't tagged for the requested meal type
+MEAL_TYPE_PENALTY = 0.25
+
+
+def _value(recipe: dict, macro: str) -> Optional[float]:
+    value = recipe.get(macro)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def fit_score(recipe: dict, budget: dict, meal_type: Optional[str] = None) -> Optional[float]:
+    """
+    Weighted relative distance between a recipe's macros and the budget
+    (lower is better). None when the recipe has no calorie data.
+    """
+    if _value(recipe, "calories") is None:
+        return None
+    score = 0.0
+    for macro in MACROS:
+        value = _value(recipe, macro)
+        target = max(budget.get(macro, 0.0), 1.0)
+        if value is None:
+            score += MACRO_WEIGHTS[macro]
+            continue
+        score += MACRO_WEIGHTS[macro] * abs(value - budget.get(macro, 0.0)) / target
+    if meal_type and recipe.get("meal_types"):
+        if meal_type.strip().lower() not in [t.lower() for t in recipe["meal_types"]]:
+            score += MEAL_TYPE_PENALTY
+    return score
+
+
+def rank_candidates(candidates: Iterable[dict], budget: dict, meal_type: Optional[str] = None,
+                    exclude_ids: Set[str] = frozenset()) -> List[dict]:
+    scored = []
+    for recipe in candidates:
+        if recipe.get("id") in exclude_ids:
+            continue
+        score = fit_score(recipe, budget, meal_type)
+        if score is not None:
+            scored.append((score, recipe))
+    scored.sort(key=lambda pair: pair[0])
+    return [recipe for _, recipe in scored]
+
+
+def to_meal_detail(recipe: dict, meal_type: str) -> MealDetail:
+    return MealDetail(
+        meal_type=meal_type,
+        recipe_id=str(recipe["id"]),
+        recipe_title=recipe.get("title", "Untitled"),
+        calories=_value(recipe, "calories") or 0.0,
+        protein_g=_value(recipe, "protein_g") or 0.0,
+        carbs_g=_value(recipe, "carbs_g") or 0.0,
+        fat_g=_value(recipe, "fat_g") or 0.0,
+    )
+
+
+def remaining_budget(targets: NutritionProfile, other_meals: Iterable[MealDetail]) -> dict:
+    """What's left of the daily targets once the other meals of the day are counted."""
+    budget = {
+        "calories": targets.target_calories,
+        "protein_g": targets.protein_g,
+        "carbs_g": targets.carbs_g,
+        "fat_g": targets.fat_g,
+    }
+    for meal in other_meals:
+        for macro in MACROS:
+            budget[macro] -= getattr(meal, macro)
+    return {macro: max(value, 0.0) for macro, value in budget.items()}
+
+
+def best_replacement(day: DayPlan, meal_index: int, candidates: List[dict], targets: NutritionProfile,
+                     used_ids: Set[str]) -> Optional[MealDetail]:
+    """Best candidate for one slot, given the rest of the day and recipes already in the plan."""
+    current = day.meals[meal_index]
+    others = [m for i, m in enumerate(day.meals) if i != meal_index]
+    budget = remaining_budget(targets, others)
+    ranked = rank_candidates(candidates, budget, current.meal_type, exclude_ids=used_ids | {current.recipe_id})
+    return to_meal_detail(ranked[0], current.meal_type) if ranked else None
+
+
+MEAL_SLOTS = {
+    1: ["Dinner"],
+    2: ["Lunch", "Dinner"],
+    3: ["Breakfast", "Lunch", "Dinner"],
+    4: ["Breakfast", "Lunch", "Snack", "Dinner"],
+    5: ["Breakfast", "Snack", "Lunch", "Snack", "Dinner"],
+}
+
+
+def meal_slots(meals_per_day: int) -> List[str]:
+    """Slot types for a day; past five, the extra meals are snacks."""
+    if meals_per_day < 1:
+        raise ValueError(f"meals_per_day must be at least 1, got {meals_per_day}")
+    return MEAL_SLOTS.get(meals_per_day) or MEAL_SLOTS[3] + ["Snack"] * (meals_per_day - 3)
+
+
+def fill_day(day_number: int, slot_types: List[str], candidates: List[dict], targets: NutritionProfile,
+             used_ids: Set[str]) -> Optional[DayPlan]:
+    """
+    Greedy day plan: each slot takes the best fit for an even share of
+    what's left of the day's budget. Prefers recipes not in `used_ids`
+    (and adds the chosen ones to it); repeats only when the pool runs dry.
+    """
+    meals: List[MealDetail] = []
+    for i, meal_type in enumerate(slot_types):
+        left = remaining_budget(targets, meals)
+        share = {macro: value / (len(slot_types) - i) for macro, value in left.items()}
+        today = {m.recipe_id for m in meals}
+        ranked = rank_candidates(candidates, share, meal_type, exclude_ids=used_ids | today)
+        if not ranked:
+            ranked = rank_candidates(candidates, share, meal_type, exclude_ids=today)
+        if not ranked:
+            return None
+        meal = to_meal_detail(ranked[0], meal_type)
+        used_ids.add(meal.recipe_id)
+        meals.append(meal)
+    return DayPlan(day_number=day_number, meals=meals, total_calories=round(sum(m.calories for m in meals), 1))
+
+
+def plan_days(days: int, meals_per_day: int, candidates: List[dict], targets: NutritionProfile) -> List[DayPlan]:
+    """Whole plan from one candidate pool, varying recipes across days where the pool allows."""
+    slots = meal_slots(meals_per_day)
+    used_ids: Set[str] = set()
+    plan = []
+    for day_number in range(1, days + 1):
+        day = fill_day(day_number, slots, candidates, targets, used_ids)
+        if day is None:
+            break
+        plan.append(day)
+    return plan
+
+
+def template_overview(days: int, targets: dict, goal: str, pool_size: int) -> str:
+    """Overview for plans built without the LLM (cohorts, deadline fallback)."""
+    return (
+        f"{days}-day {goal.replace('_', ' ')} plan at about {targets['target_calories']:.0f} kcal/day "
+        f"({targets['protein_g']:.0f}g protein), drawn from {pool_size} matching recipes."
+    )
@@ -1,89 +1,445 @@
+import contextvars
+import itertools
 import json
+import threading
+import time
 import requests
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Iterator, List, Optional, Tuple
 from google import genai
+from pydantic import ValidationError
 from app.core.config import (
-    SCALEDOWN_API_KEY, SCALEDOWN_URL, GEMINI_API_KEY
+    SCALEDOWN_API_KEY, SCALEDOWN_URL, GEMINI_API_KEY, GEMINI_CONTEXT_CACHE_ENABLED, MEAL_PLAN_DEADLINE_SECONDS,
+    LLM_PLAN_ESTIMATE_SECONDS, LOCAL_PLAN_RESERVE_SECONDS, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_MAX_IN_FLIGHT
 )
-from app.core.prompts import build_meal_plan_system_prompt, build_augmented_query
-from app.db.mongodb import mongodb_client
+from app.core.prompts import build_augmented_query, MEAL_PLAN_STATIC_INSTRUCTIONS
+from app.core.prompt_builder import prompt_builder, format_recipe_context
+from app.core.resilience import CircuitBreaker, Deadline
+from app.core.tracing import tracer
+from app.db.mongodb import mongodb_client, retrieval_bucket
+from app.services.context_cache import GeminiContextCache
+from app.services.candidate_pool import candidate_pool_cache
+from app.services.plan_stream import DayStreamParser
+from app.services.plan_repair import repair_json, validate_days, fill_missing_days
+from app.services.meal_fitting import plan_days, template_overview
+from app.services.compression import prompt_compressor
 from app.services.nutrition import calculate_nutrition_profile
-from app.models.schemas import UserProfile, CalendarResponse
+from app.models.schemas import (
+    UserProfile, CalendarResponse, DayPlan, DayPlanList, GeneratedMealPlan, PlanGeneration
+)
+
+
+class PlanUnavailable(Exception):
+    """Neither Gemini nor the local fallback could produce a plan (e.g. no candidate recipes)."""
+
+
+class LLMSaturated(Exception):
+    """Every Gemini call slot is taken, mostly by calls earlier requests stopped waiting for."""
+
 
 class MealPlannerService:
     def __init__(self):
         self.client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
         self.model_name = "gemini-2.5-flash"
+        self.context_cache = GeminiContextCache(self.client, self.model_name) if GEMINI_CONTEXT_CACHE_ENABLED else None
+        self.breaker = CircuitBreaker("gemini", LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS)
+        # Moving average of Gemini plan call times (timeouts count at least their timeout);
+        # the budget must cover it to try one
+        self.llm_estimate = LLM_PLAN_ESTIMATE_SECONDS
+        # Blocking SDK calls run here so the request thread can stop waiting at the deadline.
+        # A slot is held until the call really finishes, so abandoned calls count against the
+        # limit and new ones never queue behind them.
+        self.max_in_flight = LLM_MAX_IN_FLIGHT
+        self._llm_calls = ThreadPoolExecutor(max_workers=LLM_MAX_IN_FLIGHT, thread_name_prefix="gemini-call")
+        self._llm_in_flight = 0
+        self._llm_lock = threading.Lock()
+        self.paths = {}
 
-    def generate_interactive_meal_plan(self, query: str, profile: UserProfile, days: int = 7, user_id: str = None) -> CalendarResponse:
+    def _prepare(self, query: str, profile: UserProfile, days: int, user_id: Optional[str],
+                 deadline: Optional[Deadline] = None) -> dict:
         """
-        Orchestrates the RAG-based meal plan generation.
+        Retrieval and prompt assembly shared by the blocking and streaming
+        paths. Remote history compression only runs if `deadline` can cover it.
         """
         # 1. Broaden the search by augmenting the query
-        nut_profile = calculate_nutrition_profile(profile)
-        search_terms = build_augmented_query(query, profile, nut_profile)
-        
-        # 2. Find Candidates from MongoDB
-        recipes = mongodb_client.find_recipes(search_terms, profile, limit=40)
+        with tracer.span("nutrition.calculate"):
+            nut_profile = calculate_nutrition_profile(profile)
+        with tracer.span("prompt.build_augmented_query"):
+            search_terms = build_augmented_query(query, profile, nut_profile)
         
-        if not recipes:
-             print("DEBUG: [MealPlanner] No recipes found with strict filters, broadening search")
-             recipes = mongodb_client.find_recipes(profile.goal, profile, limit=20)
+        # 2. Find Candidates (in-memory pool per retrieval bucket, Mongo on first miss)
+        with tracer.span("recipes.candidates") as span:
+            recipes = candidate_pool_cache.get_candidates(search_terms, profile)
+            span.set_attribute("candidates", len(recipes))
 
         # 3. Build Prompts
-        system_prompt = build_meal_plan_system_prompt(profile, nut_profile, days)
-        
-        recipe_context = "\n".join([
-            f"- {r['title']} (ID: {str(r.get('id', r.get('_id', 'unknown')))}): {r.get('calories', 'N/A')} kcal, P: {r.get('protein_g','N/A')}g, C: {r.get('carbs_g','N/A')}g, F: {r.get('fat_g','N/A')}g"
-            for r in recipes
-        ])
+        with tracer.span("prompt.build"):
+            system_prompt = prompt_builder.meal_plan_system_prompt(profile, nut_profile, days)
+            recipe_context = prompt_compressor.compress_recipes(recipes, format_recipe_context(recipes))
 
         history_text = ""
         if user_id:
-            chat_history = mongodb_client.get_chat_history(user_id)
+            with tracer.span("mongo.get_chat_history"):
+                chat_history = mongodb_client.get_chat_history(user_id)
             history_text = "\n".join([f"{h['role']}: {h['content']}" for h in chat_history[-5:]])
+            with tracer.span("prompt.compress_history"):
+                history_text = prompt_compressor.compress_history(history_text, deadline=deadline)
 
-        final_prompt = f"""
-        User Request: {query}
-        Available Recipes (Inject these where possible):
-        {recipe_context}
-        
-        Recent Chat Context:
-        {history_text}
-        
-        Generate a {days}-day plan in JSON format.
+        final_prompt = prompt_builder.meal_plan_user_prompt(query, recipe_context, history_text, days)
+
+        return {
+            "query": query,
+            "profile": profile,
+            "days": days,
+            "nut_profile": nut_profile,
+            "recipes": recipes,
+            "recipe_context": recipe_context,
+            "history_text": history_text,
+            "system_prompt": system_prompt,
+            "final_prompt": final_prompt,
+        }
+
+    def candidates_for(self, profile: UserProfile, days: int = 7) -> List[dict]:
+        """The same candidate pool a /meal-plan request for this profile draws from."""
+        query = f"I want a {days}-day meal plan with 3 meals per day."
+        search_terms = build_augmented_query(query, profile, calculate_nutrition_profile(profile))
+        return candidate_pool_cache.get_candidates(search_terms, profile)
+
+    def _finalize(self, prep: dict, plan_data: Optional[dict],
+                  deadline: Optional[Deadline] = None) -> Tuple[CalendarResponse, List[int]]:
+        """
+        Validate the model output day by day. Missing or invalid days are
+        re-asked for (only those days) while the budget allows, then filled
+        locally if still absent. Returns the plan and the day numbers filled
+        locally.
         """
+        days = prep["days"]
+        plan_data = plan_data or {}
+        valid, missing = validate_days(plan_data.get("days"), days)
+        if missing:
+            skip = self._llm_skip_reason(deadline)
+            if skip is None:
+                print(f"DEBUG: [PlanRepair] Days {missing} missing or invalid, re-asking for them only")
+                with tracer.span("gemini.reask_days", days=len(missing)):
+                    valid.update(self._reask_days(prep, missing, deadline))
+            else:
+                print(f"DEBUG: [PlanRepair] Days {missing} missing or invalid, not re-asking ({skip})")
+            missing = [n for n in missing if n not in valid]
+            if missing:
+                print(f"DEBUG: [PlanRepair] Filling days {missing} from valid days")
 
-        # 4. Call Gemini (Modern SDK)
-        if not self.client:
-            raise Exception("Gemini API Key missing")
+        plan_days = fill_missing_days(valid, days)
+        if not plan_days:
+            raise Exception("Meal plan generation returned no usable days")
+
+        # The targets are computed server-side; the model's echo of them is never trusted
+        plan = CalendarResponse(
+            overview=plan_data.get("overview") or "Your personalized meal plan.",
+            days=plan_days,
+            nutrition_targets=prep["nut_profile"],
+        )
+        return plan, missing
 
+    def _reask_days(self, prep: dict, day_numbers: List[int], deadline: Optional[Deadline] = None) -> dict:
+        """One targeted call for the given days; never regenerates the whole plan."""
         try:
-            print(f"DEBUG: Calling Gemini with {len(recipes)} candidates")
-            response = self.client.models.generate_content(
+            response = self._call_llm(lambda: self.client.models.generate_content(
                 model=self.model_name,
-                contents=final_prompt,
+                contents=prompt_builder.meal_plan_reask_prompt(prep["final_prompt"], day_numbers),
                 config={
-                    "system_instruction": system_prompt,
-                    "response_mime_type": "application/json"
+                    "system_instruction": prep["system_prompt"],
+                    "response_mime_type": "application/json",
+                    "response_schema": DayPlanList,
                 }
-            )
-            
-            # Using response.text to get the JSON string
-            print(f"DEBUG: Gemini Response received: {response.text[:200]}...")
-            plan_data = json.loads(response.text)
-            
-            # Create Pydantic model
-            plan = CalendarResponse(**plan_data)
-            
-            # ENHANCEMENT: Always ensure nutrition_targets is populated
-            if not plan.nutrition_targets:
-                print("DEBUG: Injecting nutrition profile into plan")
-                plan.nutrition_targets = nut_profile
-                
-            return plan
+            ), deadline, update_estimate=False)
+            data = repair_json(response.text) or {}
         except Exception as e:
-            print(f"DEBUG: Meal Plan Generation Error: {str(e)}")
-            raise e
+            print(f"DEBUG: [PlanRepair] Re-ask failed: {str(e)}")
+            return {}
+        valid, _ = validate_days(data.get("days"), prep["days"])
+        return {n: day for n, day in valid.items() if n in day_numbers}
+
+    def _llm_skip_reason(self, deadline: Optional[Deadline]) -> Optional[str]:
+        """
+        Why the next Gemini call should be skipped, or None to make it. Checked
+        in this order so a half-open breaker's probe is only claimed by a call
+        that will actually happen.
+        """
+        if not self.client:
+            return "llm_unconfigured"
+        if deadline is not None and deadline.remaining() - LOCAL_PLAN_RESERVE_SECONDS < self.llm_estimate:
+            return "budget"
+        if self._llm_in_flight >= self.max_in_flight:
+            return "llm_saturated"
+        if not self.breaker.allow():
+            return "circuit_open"
+        return None
+
+    def _call_llm(self, call: Callable, deadline: Optional[Deadline], update_estimate: bool = True):
+        """
+        Run a blocking Gemini call, waiting at most until the deadline (less the
+        local-fallback reserve). Every outcome feeds the breaker; a timed-out
+        call is abandoned, not cancelled (the SDK can't be interrupted), and
+        keeps its slot until it returns. Raises LLMSaturated when no slot is free.
+        """
+        with self._llm_lock:
+            saturated = self._llm_in_flight >= self.max_in_flight
+            if not saturated:
+                self._llm_in_flight += 1
+        if saturated:
+            # Lost the race after _llm_skip_reason; slots full of unanswered calls count like a timeout
+            self.breaker.record_failure()
+            raise LLMSaturated(f"{self.max_in_flight} Gemini calls already in flight")
+
+        timeout = None if deadline is None else max(0.0, deadline.remaining() - LOCAL_PLAN_RESERVE_SECONDS)
+        start = time.monotonic()
+        future = self._llm_calls.submit(contextvars.copy_context().run, call)
+        future.add_done_callback(self._release_llm_slot)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            self.breaker.record_failure()
+            if update_estimate:
+                self._update_estimate(max(time.monotonic() - start, timeout))
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        if update_estimate:
+            self._update_estimate(time.monotonic() - start)
+        return result
+
+    def _next_chunk(self, chunks: Iterator, deadline: Deadline):
+        """
+        The next chunk of a started stream (None at its end), read on the LLM
+        executor and waited on like _call_llm, so a stream that stalls after
+        its first chunk can't hold the request past the budget. The read keeps
+        a slot without a saturation check (the stream was already admitted);
+        a timed-out read is abandoned and counted against the breaker.
+        """
+        with self._llm_lock:
+            self._llm_in_flight += 1
+        future = self._llm_calls.submit(contextvars.copy_context().run, next, chunks, None)
+        future.add_done_callback(self._release_llm_slot)
+        try:
+            return future.result(timeout=max(0.0, deadline.remaining() - LOCAL_PLAN_RESERVE_SECONDS))
+        except FutureTimeout:
+            self.breaker.record_failure()
+            raise
+
+    def _release_llm_slot(self, future):
+        with self._llm_lock:
+            self._llm_in_flight -= 1
+
+    def _update_estimate(self, seconds: float):
+        self.llm_estimate = 0.7 * self.llm_estimate + 0.3 * seconds
+
+    def _local_plan(self, prep: dict, meals_per_day: int) -> CalendarResponse:
+        """Macro-fitted plan from the retrieved candidates, no LLM (same fitting as cohort plans)."""
+        days, targets = prep["days"], prep["nut_profile"]
+        fitted = plan_days(days, meals_per_day, prep["recipes"], targets)
+        if not fitted:
+            raise PlanUnavailable("No candidate recipes match this profile")
+        return CalendarResponse(
+            overview=template_overview(days, targets.model_dump(), prep["profile"].goal, len(prep["recipes"])),
+            days=fill_missing_days({day.day_number: day for day in fitted}, days),
+            nutrition_targets=targets,
+        )
+
+    def _record_llm_path(self, plan: CalendarResponse, filled: List[int], cut_short: Optional[str],
+                         deadline: Deadline) -> CalendarResponse:
+        """"llm" only when every day came from Gemini; "partial" when some were filled locally or the stream broke."""
+        if cut_short or filled:
+            return self._record_path(plan, "partial", cut_short or "local_fill", deadline)
+        return self._record_path(plan, "llm", None, deadline)
+
+    def _record_path(self, plan: CalendarResponse, path: str, reason: Optional[str],
+                     deadline: Deadline) -> CalendarResponse:
+        key = path if reason is None else f"{path}:{reason}"
+        self.paths[key] = self.paths.get(key, 0) + 1
+        plan.generation = PlanGeneration(path=path, reason=reason, budget_ms=round(deadline.budget * 1000, 1),
+                                         elapsed_ms=deadline.elapsed_ms(), stages=dict(deadline.stages))
+        return plan
+
+    def generate_interactive_meal_plan(self, query: str, profile: UserProfile, days: int = 7, user_id: str = None,
+                                       meals_per_day: int = 3, deadline: Optional[Deadline] = None) -> CalendarResponse:
+        """
+        Orchestrates the RAG-based meal plan generation within `deadline`
+        (MEAL_PLAN_DEADLINE_SECONDS by default). Falls back to a local
+        macro-fitted plan when Gemini is unconfigured, the circuit is open, the
+        budget left can't cover a call, or the call fails or times out.
+        `plan.generation` says which path was taken.
+        """
+        deadline = deadline or Deadline(MEAL_PLAN_DEADLINE_SECONDS)
+        with deadline.stage("retrieval"):
+            prep = self._prepare(query, profile, days, user_id, deadline)
+
+        # 4. Call Gemini (Modern SDK) if the budget and the breaker allow
+        reason = self._llm_skip_reason(deadline)
+        if reason is None:
+            try:
+                print(f"DEBUG: Calling Gemini with {len(prep['recipes'])} candidates")
+                with tracer.span("gemini.generate"), deadline.stage("llm"):
+                    response = self._call_llm(lambda: self._generate(prep), deadline)
+
+                # Using response.text to get the JSON string (repaired locally if near-valid)
+                print(f"DEBUG: Gemini Response received: {(response.text or '')[:200]}...")
+                with deadline.stage("finalize"):
+                    plan, filled = self._finalize(prep, repair_json(response.text), deadline)
+                return self._record_llm_path(plan, filled, None, deadline)
+            except FutureTimeout:
+                reason = "llm_timeout"
+            except LLMSaturated:
+                reason = "llm_saturated"
+            except Exception as e:
+                print(f"DEBUG: Meal Plan Generation Error: {str(e)}")
+                reason = "llm_error"
+
+        print(f"DEBUG: [Deadline] Planning locally ({reason}), {deadline.remaining():.1f}s of budget left")
+        with tracer.span("plan.local", reason=reason), deadline.stage("local"):
+            plan = self._local_plan(prep, meals_per_day)
+        return self._record_path(plan, "local", reason, deadline)
+
+    def stream_interactive_meal_plan(self, query: str, profile: UserProfile, days: int = 7, user_id: str = None,
+                                     meals_per_day: int = 3,
+                                     deadline: Optional[Deadline] = None) -> Iterator[Tuple[str, object]]:
+        """
+        Streaming variant: yields ("day", DayPlan) as soon as each day object
+        closes in Gemini's output, then ("plan", CalendarResponse) once the
+        whole document has arrived. Same deadline and fallback rules as the
+        blocking path; every chunk is waited on within the budget, and if it
+        runs out mid-stream reading stops and the plan is finished (missing
+        days fitted locally) from the days received so far.
+        """
+        deadline = deadline or Deadline(MEAL_PLAN_DEADLINE_SECONDS)
+        with deadline.stage("retrieval"):
+            prep = self._prepare(query, profile, days, user_id, deadline)
+
+        reason = self._llm_skip_reason(deadline)
+        if reason is None:
+            print(f"DEBUG: Streaming Gemini plan with {len(prep['recipes'])} candidates")
+            parser = DayStreamParser()
+            # Spans across yields can't be "current" (each step may run in a new context)
+            stream_span = tracer.start_span("gemini.stream")
+            first_day = tracer.start_span("gemini.stream.first_day")
+            chunks = None
+            try:
+                # Wait for the first chunk within the budget, like a blocking call
+                chunks = self._call_llm(lambda: _prime(self._generate(prep, stream=True)), deadline)
+            except FutureTimeout:
+                reason = "llm_timeout"
+            except LLMSaturated:
+                reason = "llm_saturated"
+            except Exception as e:
+                print(f"DEBUG: [PlanStream] Gemini stream failed to start: {str(e)}")
+                reason = "llm_error"
+            if chunks is not None:
+                cut_short = None
+                try:
+                    for chunk in iter(lambda: self._next_chunk(chunks, deadline), None):
+                        for day_data in parser.feed(chunk.text or ""):
+                            first_day.end()
+                            try:
+                                yield "day", DayPlan(**day_data)
+                            except ValidationError as e:
+                                # The final CalendarResponse validation decides whether the plan is usable
+                                print(f"DEBUG: [PlanStream] Day failed validation: {str(e)}")
+                        if deadline.expired():
+                            print("DEBUG: [Deadline] Budget spent mid-stream, finishing from the days received")
+                            cut_short = "llm_timeout"
+                            break
+                except FutureTimeout:
+                    print("DEBUG: [Deadline] Stream stalled past the budget, finishing from the days received")
+                    cut_short = "llm_timeout"
+                except Exception as e:
+                    print(f"DEBUG: [PlanStream] Stream broke off: {str(e)}")
+                    self.breaker.record_failure()
+                    cut_short = "stream_error"
+                finally:
+                    stream_span.end()
+                try:
+                    with tracer.span("plan.finalize"):
+                        plan, filled = self._finalize(prep, repair_json(parser.text), deadline)
+                    yield "plan", self._record_llm_path(plan, filled, cut_short, deadline)
+                    return
+                except Exception as e:
+                    print(f"DEBUG: Meal Plan Generation Error: {str(e)}")
+                    reason = cut_short or "llm_error"
+            else:
+                stream_span.end()
+
+        print(f"DEBUG: [Deadline] Planning locally ({reason}), {deadline.remaining():.1f}s of budget left")
+        with tracer.span("plan.local", reason=reason), deadline.stage("local"):
+            plan = self._local_plan(prep, meals_per_day)
+        for day in plan.days:
+            yield "day", day
+        yield "plan", self._record_path(plan, "local", reason, deadline)
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "llm_estimate_s": round(self.llm_estimate, 2),
+            "llm_in_flight": self._llm_in_flight,
+            "paths": dict(self.paths),
+        }
+
+    def _generate(self, prep: dict, stream: bool = False):
+        """
+        Call Gemini, reusing a provider-side cached content for the static
+        instructions + candidate block when one can be had for this bucket.
+        """
+        call = self.client.models.generate_content_stream if stream else self.client.models.generate_content
+        profile = prep["profile"]
+
+        cache_name = None
+        if self.context_cache is not None:
+            with tracer.span("gemini.context_cache"):
+                cache_name = self.context_cache.get_or_create(
+                    bucket=retrieval_bucket(profile),
+                    corpus_version=mongodb_client.get_corpus_version(),
+                    system_instruction=MEAL_PLAN_STATIC_INSTRUCTIONS,
+                    candidate_block=prompt_builder.meal_plan_candidate_block(prep["recipe_context"]),
+                )
+
+        if cache_name:
+            try:
+                response = call(
+                    model=self.model_name,
+                    contents=prompt_builder.meal_plan_cached_request_prompt(
+                        profile, prep["nut_profile"], prep["query"], prep["history_text"], prep["days"]
+                    ),
+                    config={
+                        "cached_content": cache_name,
+                        "response_mime_type": "application/json",
+                        "response_schema": GeneratedMealPlan,
+                    }
+                )
+                # Streams fail lazily; pull the first chunk so a dead cache surfaces here
+                return _prime(response) if stream else response
+            except Exception as e:
+                # Cache may have expired provider-side; retry once without it
+                print(f"DEBUG: [ContextCache] Cached call failed, retrying uncached: {str(e)}")
+                self.context_cache.invalidate(cache_name)
+
+        return call(
+            model=self.model_name,
+            contents=prep["final_prompt"],
+            config={
+                "system_instruction": prep["system_prompt"],
+                "response_mime_type": "application/json",
+                "response_schema": GeneratedMealPlan,
+            }
+        )
+
+
+def _prime(stream):
+    iterator = iter(stream)
+    try:
+        first = next(iterator)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], iterator)
 
 meal_planner_service = MealPlannerService()
@@ -1,6 +1,9 @@
 """
 Nutrition Calculator: BMR, TDEE, and Macro Targets
 """
+from functools import lru_cache
+from typing import List
+import numpy as np
 from app.models.schemas import UserProfile, NutritionProfile
 
 
@@ -29,22 +32,41 @@ MACRO_RATIOS = {
 }
 
 
-def calculate_bmr(profile: UserProfile) -> float:
+def mifflin_st_jeor(weight_kg: float, height_cm: float, age: float, is_male: bool) -> float:
     """Mifflin-St Jeor Equation."""
-    base = (10 * profile.weight_kg) + (6.25 * profile.height_cm) - (5 * profile.age)
-    if profile.gender.lower() == "male":
-        return base + 5
-    return base - 161
+    base = (10 * weight_kg) + (6.25 * height_cm) - (5 * age)
+    return base + 5 if is_male else base - 161
 
 
-def calculate_nutrition_profile(profile: UserProfile) -> NutritionProfile:
-    bmr = calculate_bmr(profile)
-    multiplier = ACTIVITY_MULTIPLIERS.get(profile.activity_level, 1.375)
-    tdee = bmr * multiplier
-    adjustment = GOAL_CALORIC_ADJUSTMENTS.get(profile.goal, 0)
+def calculate_bmr(profile: UserProfile) -> float:
+    return mifflin_st_jeor(profile.weight_kg, profile.height_cm, profile.age, profile.gender.lower() == "male")
+
+
+def activity_multiplier(activity_level: str) -> float:
+    return ACTIVITY_MULTIPLIERS.get(activity_level, 1.375)
+
+
+def nutrition_cache_key(profile: UserProfile) -> tuple:
+    """Only the fields that feed the equations; diets/cuisines don't change targets."""
+    return (
+        float(profile.weight_kg),
+        float(profile.height_cm),
+        int(profile.age),
+        profile.gender.lower() == "male",
+        profile.activity_level,
+        profile.goal,
+    )
+
+
+@lru_cache(maxsize=4096)
+def _cached_nutrition(weight_kg: float, height_cm: float, age: int, is_male: bool,
+                      activity_level: str, goal: str) -> NutritionProfile:
+    bmr = mifflin_st_jeor(weight_kg, height_cm, age, is_male)
+    tdee = bmr * activity_multiplier(activity_level)
+    adjustment = GOAL_CALORIC_ADJUSTMENTS.get(goal, 0)
     target_calories = max(1200, tdee + adjustment)  # Floor at 1200
 
-    ratios = MACRO_RATIOS.get(profile.goal, MACRO_RATIOS["maintenance"])
+    ratios = MACRO_RATIOS.get(goal, MACRO_RATIOS["maintenance"])
     protein_g = (target_calories * ratios["protein"]) / 4   # 4 cal/g
     carbs_g   = (target_calories * ratios["carbs"]) / 4     # 4 cal/g
     fat_g     = (target_calories * ratios["fat"]) / 9       # 9 cal/g
@@ -57,3 +79,66 @@ def calculate_nutrition_profile(profile: UserProfile) -> NutritionProfile:
         carbs_g=round(carbs_g, 1),
         fat_g=round(fat_g, 1),
     )
+
+
+def calculate_nutrition_profile(profile: UserProfile) -> NutritionProfile:
+    """Memoized on nutrition_cache_key; returns a copy so callers can't poison the cache."""
+    return _cached_nutrition(*nutrition_cache_key(profile)).model_copy()
+
+
+def nutrition_cache_info() -> dict:
+    info = _cached_nutrition.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def calculate_nutrition_profiles_batch(profiles: List[UserProfile]) -> List[dict]:
+    """
+    Vectorized BMR/TDEE/macros for many profiles in one NumPy pass.
+    Unknown activity levels / goals fall back exactly like the dict lookups above.
+    Returns plain dicts in NutritionProfile shape.
+    """
+    if not profiles:
+        return []
+
+    weight = np.fromiter((p.weight_kg for p in profiles), dtype=np.float64, count=len(profiles))
+    height = np.fromiter((p.height_cm for p in profiles), dtype=np.float64, count=len(profiles))
+    age = np.fromiter((p.age for p in profiles), dtype=np.float64, count=len(profiles))
+    is_male = np.fromiter((p.gender.lower() == "male" for p in profiles), dtype=bool, count=len(profiles))
+    multiplier = np.fromiter(
+        (activity_multiplier(p.activity_level) for p in profiles),
+        dtype=np.float64, count=len(profiles),
+    )
+    adjustment = np.fromiter(
+        (GOAL_CALORIC_ADJUSTMENTS.get(p.goal, 0) for p in profiles),
+        dtype=np.float64, count=len(profiles),
+    )
+    ratios = np.array(
+        [
+            [r["protein"], r["carbs"], r["fat"]]
+            for r in (MACRO_RATIOS.get(p.goal, MACRO_RATIOS["maintenance"]) for p in profiles)
+        ],
+        dtype=np.float64,
+    )
+
+    base = (10 * weight) + (6.25 * height) - (5 * age)
+    bmr = np.where(is_male, base + 5, base - 161)
+    tdee = bmr * multiplier
+    target = np.maximum(1200, tdee + adjustment)
+    protein = target * ratios[:, 0] / 4
+    carbs = target * ratios[:, 1] / 4
+    fat = target * ratios[:, 2] / 9
+
+    # Python's round() keeps results byte-identical with the scalar path
+    columns = zip(bmr.tolist(), tdee.tolist(), target.tolist(),
+                  protein.tolist(), carbs.tolist(), fat.tolist())
+    return [
+        {
+            "bmr": round(b, 1),
+            "tdee": round(t, 1),
+            "target_calories": round(c, 1),
+            "protein_g": round(p, 1),
+            "carbs_g": round(cb, 1),
+            "fat_g": round(f, 1),
+        }
+        for b, t, c, p, cb, f in columns
+    ]
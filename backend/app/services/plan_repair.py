@@ -0,0 +1,127 @@
+"""
+Local repair for model-produced meal plan JSON.
+
+Gemini is constrained by a response schema, but output can still be cut
+off (token limits, dropped streams) or drift slightly. These helpers turn
+near-valid text into a dict, validate it day by day, and report which
+day numbers still need to be produced, so the planner only re-asks for
+those instead of regenerating the whole plan.
+"""
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from app.models.schemas import DayPlan
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    Cut a truncated JSON document back to the last point where every open
+    value was complete, then append the missing closers.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    safe_cut, safe_stack = None, None
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            # An empty container is a complete value
+            safe_cut, safe_stack = i + 1, list(stack)
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            safe_cut, safe_stack = i + 1, list(stack)
+            if not stack:
+                return text[:i + 1]
+        elif ch == ",":
+            # Everything before a separating comma is a complete member
+            safe_cut, safe_stack = i, list(stack)
+    if safe_cut is None:
+        return None
+    return text[:safe_cut] + "".join(reversed(safe_stack))
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """Best-effort parse of a (possibly fenced, truncated or comma-sloppy) JSON object."""
+    if not text:
+        return None
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+
+    candidates = [text, _TRAILING_COMMA.sub(r"\1", text)]
+    closed = _close_truncated(text)
+    if closed:
+        candidates.extend([closed, _TRAILING_COMMA.sub(r"\1", closed)])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _repair_day(raw: dict) -> dict:
+    """Fill fields that can be derived locally."""
+    day = dict(raw)
+    meals = day.get("meals")
+    if isinstance(meals, list) and day.get("total_calories") is None:
+        try:
+            day["total_calories"] = round(sum(float(m.get("calories", 0)) for m in meals), 1)
+        except (TypeError, ValueError, AttributeError):
+            pass
+    return day
+
+
+def validate_days(raw_days, days: int) -> Tuple[Dict[int, DayPlan], List[int]]:
+    """
+    Validate each day independently. Returns ({day_number: DayPlan}, missing)
+    where `missing` lists the day numbers in 1..days with no valid plan.
+    """
+    valid: Dict[int, DayPlan] = {}
+    for raw in raw_days if isinstance(raw_days, list) else []:
+        if not isinstance(raw, dict):
+            continue
+        try:
+            day = DayPlan(**_repair_day(raw))
+        except ValidationError as e:
+            print(f"DEBUG: [PlanRepair] Dropping invalid day {raw.get('day_number')}: {e.error_count()} error(s)")
+            continue
+        if 1 <= day.day_number <= days and day.day_number not in valid and day.meals:
+            valid[day.day_number] = day
+    missing = [n for n in range(1, days + 1) if n not in valid]
+    return valid, missing
+
+
+def fill_missing_days(valid: Dict[int, DayPlan], days: int) -> List[DayPlan]:
+    """Last resort: repeat the valid days in order to cover the gaps."""
+    if not valid:
+        return []
+    pool = [valid[n] for n in sorted(valid)]
+    result = []
+    for n in range(1, days + 1):
+        if n in valid:
+            result.append(valid[n])
+        else:
+            source = pool[(n - 1) % len(pool)]
+            result.append(source.model_copy(update={"day_number": n}, deep=True))
+    return result
@@ -0,0 +1,75 @@
+"""
+Incremental parser for streamed CalendarResponse JSON.
+
+Gemini streams the plan as arbitrary text chunks. The parser scans each
+chunk once, tracking string/escape state and container depth, and hands
+back every object in the top-level "days" array the moment it closes.
+"""
+import json
+from typing import List
+
+
+class DayStreamParser:
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []          # open containers: "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_key = None     # last string completed directly inside the root object
+        self._days_depth = None   # stack depth of the "days" array once entered
+        self._day_start = -1
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Consume a chunk; return the day objects completed by it."""
+        if not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        days = []
+        i = self._pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0] == "{":
+                        try:
+                            self._last_key = json.loads(text[self._string_start:i + 1])
+                        except ValueError:
+                            self._last_key = None
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{" or ch == "[":
+                self._stack.append(ch)
+                depth = len(self._stack)
+                if ch == "[" and depth == 2 and self._last_key == "days":
+                    self._days_depth = depth
+                elif ch == "{" and self._days_depth is not None and depth == self._days_depth + 1:
+                    self._day_start = i
+            elif ch == "}" or ch == "]":
+                depth = len(self._stack)
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._days_depth is not None and depth == self._days_depth + 1 and self._day_start >= 0:
+                    try:
+                        days.append(json.loads(text[self._day_start:i + 1]))
+                    except ValueError as e:
+                        print(f"DEBUG: [PlanStream] Skipping unparsable day object: {str(e)}")
+                    self._day_start = -1
+                elif ch == "]" and depth == self._days_depth:
+                    self._days_depth = None
+            i += 1
+        self._pos = i
+        return days
+
+    @property
+    def text(self) -> str:
+        return self._text
@@ -0,0 +1,80 @@
+"""
+Read-through cache of recipes keyed on recipe ID.
+
+Backs GET /recipes/{id} and POST /recipes/batch. Entries are validated
+against RecipeResult once when they enter the cache and stored as plain
+dicts, so reads can be serialized straight to JSON. The whole cache is
+dropped as soon as the recipe corpus version changes.
+"""
+import threading
+from typing import List, Optional
+from app.core.cache import LRUCache
+from app.core.config import RECIPE_CACHE_MAX_ENTRIES
+from app.db.mongodb import mongodb_client
+from app.models.schemas import RecipeResult
+
+
+class RecipeCache:
+    def __init__(self, maxsize: int = RECIPE_CACHE_MAX_ENTRIES):
+        self.cache = LRUCache(maxsize=maxsize, name="recipes")
+        self.corpus_version = None
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        version = mongodb_client.get_corpus_version()
+        if version != self.corpus_version:
+            with self._lock:
+                if version != self.corpus_version:
+                    if self.corpus_version is not None:
+                        self.invalidations += 1
+                    self.cache.clear()
+                    self.corpus_version = version
+
+    @staticmethod
+    def _validated(doc: dict) -> dict:
+        return RecipeResult(**doc).model_dump()
+
+    def get(self, recipe_id: str) -> Optional[dict]:
+        recipes = self.get_many([recipe_id])
+        return recipes[0] if recipes else None
+
+    def get_many(self, recipe_ids: List[str]) -> List[dict]:
+        """
+        Cached recipes in request order (duplicates collapsed, unknown IDs
+        dropped); all misses are fetched with one $in query.
+        """
+        self._check_version()
+        ordered = list(dict.fromkeys(recipe_ids))
+        found = {}
+        missing = []
+        for rid in ordered:
+            recipe = self.cache.get(rid)
+            if recipe is None:
+                missing.append(rid)
+            else:
+                found[rid] = recipe
+
+        if missing:
+            for doc in mongodb_client.get_recipes_by_ids(missing):
+                recipe = self._validated(doc)
+                self.cache.set(recipe["id"], recipe)
+                found[recipe["id"]] = recipe
+
+        return [found[rid] for rid in ordered if rid in found]
+
+    def warm(self, recipes: List[dict]) -> int:
+        """Seed the cache from already-fetched recipe documents."""
+        self._check_version()
+        for doc in recipes:
+            recipe = self._validated(doc)
+            self.cache.set(recipe["id"], recipe)
+        return len(recipes)
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["corpus_version"] = self.corpus_version
+        stats["invalidations"] = self.invalidations
+        return stats
+
+recipe_cache = RecipeCache()
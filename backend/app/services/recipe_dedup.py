@@ -0,0 +1,243 @@
+"""
+Near-duplicate recipe detection for the import pipeline.
+
+The merged Yummly / Epicurious / Food.com corpus holds many copies of
+the same dish ("Best Chocolate Chip Cookies" vs "Chocolate Chip
+Cookies" with the same ingredients). Each recipe becomes a set of
+features: title words plus normalized ingredient names, quantities and
+units dropped. MinHash signatures of those sets are computed with
+NumPy, and LSH banding proposes candidate pairs. Each pair is verified
+against the full signature (estimated Jaccard >= threshold), and
+union-find turns the verified pairs into clusters.
+
+One canonical recipe survives per cluster: the one with nutrition data,
+the most filled-in fields and the best rating. The others are recorded
+on it as `aliases`.
+
+Planning needs only the light per-recipe features, so
+scripts/import_recipes_mongo.py plans in a first pass over the JSONL and
+writes the canonical recipes in a second pass.
+"""
+import re
+import time
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+DEDUP_THRESHOLD = 0.8
+NUM_PERM = 128
+BANDS = 16  # 16 bands x 8 rows: pairs around Jaccard 0.7 and up become candidates
+BATCH_FEATURES = 50_000
+
+UNITS = {
+    "cup", "cups", "c", "tablespoon", "tablespoons", "tbsp", "tbs", "teaspoon", "teaspoons", "tsp",
+    "ounce", "ounces", "oz", "pound", "pounds", "lb", "lbs", "gram", "grams", "g", "kg", "ml", "l",
+    "liter", "liters", "pinch", "dash", "clove", "cloves", "can", "cans", "package", "packages",
+    "pkg", "slice", "slices", "stick", "sticks", "quart", "quarts", "pint", "pints", "large",
+    "medium", "small", "whole", "fresh", "chopped", "minced", "diced", "sliced", "ground",
+    "to", "taste", "of", "and", "or", "for", "about", "finely", "optional",
+}
+TITLE_STOPWORDS = {"the", "a", "an", "and", "with", "of", "in", "best", "easy", "my", "recipe", "s"}
+_WORDS = re.compile(r"[a-z]+")
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def recipe_features(recipe: dict) -> List[str]:
+    """Title words and ingredient names, normalized; the set MinHash estimates Jaccard over."""
+    features = {
+        "t:" + _stem(w) for w in _WORDS.findall(str(recipe.get("title", "")).lower())
+        if w not in TITLE_STOPWORDS
+    }
+    for ingredient in recipe.get("ingredients") or []:
+        words = [_stem(w) for w in _WORDS.findall(str(ingredient).lower()) if w not in UNITS]
+        if words:
+            features.add("i:" + " ".join(words))
+    return sorted(features)
+
+
+def recipe_quality(recipe: dict) -> float:
+    """Higher wins the canonical slot: has nutrition, then filled-in fields, then rating, then instructions."""
+    has_nutrition = recipe.get("calories") is not None and recipe.get("protein_g") is not None
+    filled = sum(1 for v in recipe.values() if v not in (None, "", [], {}))
+    rating = float(recipe.get("rating") or 0)
+    return has_nutrition * 1e6 + filled * 1e3 + rating * 100 + min(len(recipe.get("instructions") or []), 99)
+
+
+class DedupPlan:
+    """Outcome of RecipeDeduper.plan: which input rows to keep and what each keeper absorbs."""
+
+    def __init__(self, canonical_of: np.ndarray, aliases: Dict[int, List[dict]], stats: dict):
+        self.canonical_of = canonical_of
+        self.aliases = aliases
+        self.stats = stats
+
+    def is_canonical(self, index: int) -> bool:
+        return index >= len(self.canonical_of) or self.canonical_of[index] == index
+
+
+class RecipeDeduper:
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: h(x) = (a*x + b) >> 32 over wrapping uint64, a odd
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, feature_hashes: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """
+        MinHash signatures, shape (recipes, num_perm) uint32. `feature_hashes`
+        holds every recipe's feature hashes back to back, and recipe i owns
+        [offsets[i], offsets[i + 1]). Each recipe needs at least one feature.
+        """
+        count = len(offsets) - 1
+        out = np.empty((count, self.num_perm), dtype=np.uint32)
+        start = 0
+        shift = np.uint64(32)
+        while start < count:
+            # Whole recipes per batch, about BATCH_FEATURES features each
+            end = int(np.searchsorted(offsets, offsets[start] + BATCH_FEATURES, side="right")) - 1
+            end = min(max(end, start + 1), count)
+            lo, hi = offsets[start], offsets[end]
+            x = feature_hashes[lo:hi, None]
+            hashed = ((x * self._a + self._b) >> shift).astype(np.uint32)
+            out[start:end] = np.minimum.reduceat(hashed, offsets[start:end] - lo, axis=0)
+            start = end
+        return out
+
+    def candidate_pairs(self, signatures: np.ndarray) -> np.ndarray:
+        """(i, j) pairs, i < j, sharing at least one LSH band; each row linked to its bucket's first member."""
+        pairs = []
+        for band in range(self.bands):
+            rows = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys = (rows * self._band_mix).sum(axis=1)
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            starts = np.ones(len(order), dtype=bool)
+            starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+            head_position = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+            members = ~starts
+            if members.any():
+                pairs.append(np.stack([order[head_position[members]], order[members]], axis=1))
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.concatenate(pairs).astype(np.int64)
+        pairs.sort(axis=1)
+        return np.unique(pairs, axis=0)
+
+    def verify(self, signatures: np.ndarray, pairs: np.ndarray, chunk: int = 100_000) -> np.ndarray:
+        """Candidate pairs whose estimated Jaccard (share of equal signature slots) clears the threshold."""
+        keep = np.zeros(len(pairs), dtype=bool)
+        for start in range(0, len(pairs), chunk):
+            block = pairs[start:start + chunk]
+            similarity = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1)
+            keep[start:start + chunk] = similarity >= self.threshold
+        return pairs[keep]
+
+    def plan(self, recipes: Iterable[dict]) -> DedupPlan:
+        """One pass over the recipes; keeps features, quality and alias info only."""
+        start = time.perf_counter()
+        hashes = array("I")  # crc32 per feature; far lighter than a list of ints at 500k recipes
+        offsets = [0]
+        hashed_rows: List[int] = []
+        quality: List[float] = []
+        alias_info: List[dict] = []
+        total = 0
+        for index, recipe in enumerate(recipes):
+            total += 1
+            quality.append(recipe_quality(recipe))
+            alias = {"title": recipe.get("title", ""), "source": recipe.get("source")}
+            if recipe.get("id") is not None:
+                alias["source_id"] = recipe["id"]
+            alias_info.append(alias)
+            features = recipe_features(recipe)
+            if not features:
+                continue  # nothing to compare; always kept
+            hashes.extend(zlib.crc32(f.encode("utf-8")) for f in features)
+            offsets.append(len(hashes))
+            hashed_rows.append(index)
+        feature_s = time.perf_counter() - start
+
+        rows = np.array(hashed_rows, dtype=np.int64)
+        canonical_of = np.arange(total, dtype=np.int64)
+        aliases: Dict[int, List[dict]] = {}
+        timings = {"features_s": round(feature_s, 2)}
+        if len(rows) > 1:
+            t = time.perf_counter()
+            signatures = self.signatures(np.frombuffer(hashes, dtype=np.uint32).astype(np.uint64),
+                                         np.array(offsets, dtype=np.int64))
+            timings["minhash_s"] = round(time.perf_counter() - t, 2)
+            t = time.perf_counter()
+            candidates = self.candidate_pairs(signatures)
+            verified = self.verify(signatures, candidates)
+            timings["lsh_s"] = round(time.perf_counter() - t, 2)
+            canonical_of, aliases = self._clusters(rows[verified], total, quality, alias_info)
+            timings["candidates"] = len(candidates)
+            timings["verified_pairs"] = len(verified)
+
+        kept = int((canonical_of == np.arange(total)).sum())
+        cluster_sizes = [len(a) + 1 for a in aliases.values()]
+        stats = {
+            "input": total,
+            "kept": kept,
+            "removed": total - kept,
+            "reduction_pct": round(100 * (total - kept) / total, 2) if total else 0.0,
+            "clusters": len(aliases),
+            "largest_cluster": max(cluster_sizes, default=1),
+            "threshold": self.threshold,
+            "seconds": round(time.perf_counter() - start, 2),
+            **timings,
+        }
+        return DedupPlan(canonical_of, aliases, stats)
+
+    @staticmethod
+    def _clusters(pairs: np.ndarray, total: int, quality: List[float], alias_info: List[dict]):
+        parent = list(range(total))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in pairs.tolist():
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        members: Dict[int, List[int]] = {}
+        for i, j in pairs.tolist():
+            for node in (i, j):
+                members.setdefault(find(node), []).append(node)
+
+        canonical_of = np.arange(total, dtype=np.int64)
+        aliases: Dict[int, List[dict]] = {}
+        for group in members.values():
+            group = sorted(set(group))
+            # Best quality wins; earliest row breaks ties
+            keeper = max(group, key=lambda i: (quality[i], -i))
+            canonical_of[group] = keeper
+            aliases[keeper] = [alias_info[i] for i in group if i != keeper]
+        return canonical_of, aliases
+
+
+def dedupe_recipes(recipes: List[dict], deduper: Optional[RecipeDeduper] = None):
+    """In-memory convenience: (canonical recipes with `aliases`, stats)."""
+    plan = (deduper or RecipeDeduper()).plan(recipes)
+    kept = []
+    for index, recipe in enumerate(recipes):
+        if plan.is_canonical(index):
+            if index in plan.aliases:
+                recipe = {**recipe, "aliases": plan.aliases[index]}
+            kept.append(recipe)
+    return kept, plan.stats
@@ -0,0 +1,210 @@
+"""
+Recipe title typeahead behind GET /recipes/suggest.
+
+Titles are normalized (lowercase, accents and punctuation stripped) and
+every word start is stored as a key in one sorted list, so "chic" finds
+"Chicken Tikka" and "Grilled Chicken" with two binary searches. The
+entries of a prefix range are aligned NumPy arrays: an entry score
+(popularity, plus a bonus when the match is at the start of the title),
+the owning recipe, and diet/allergen bitmasks, so filtering and top-k
+never touch Python objects. Popularity is how many users' latest plans
+include the recipe, with the recipe rating as a tie-break.
+
+The index is rebuilt in the background when the corpus version changes;
+the old one keeps answering until the new one is swapped in.
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+import numpy as np
+from app.core.cache import LRUCache
+from app.core.config import SUGGEST_MAX_RESULTS, SUGGEST_CACHE_SIZE
+from app.db.mongodb import mongodb_client
+
+# A title-start match outranks any word-start match elsewhere in the title
+PREFIX_BONUS = 1e6
+RATING_WEIGHT = 0.2
+MAX_TAG_BITS = 64
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_title(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+class TitleIndex:
+    __slots__ = ("keys", "entry_recipe", "entry_score", "entry_diet", "entry_allergen", "ids", "titles",
+                 "diet_bits", "allergen_bits", "corpus_version", "build_ms", "results")
+
+    def __init__(self, docs: Iterable[dict], plan_counts: dict, corpus_version: str,
+                 cache_size: int = SUGGEST_CACHE_SIZE):
+        start = time.perf_counter()
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.diet_bits: dict = {}
+        self.allergen_bits: dict = {}
+        diet_masks, allergen_masks, scores, entries = [], [], [], []
+        for doc in docs:
+            normalized = normalize_title(doc.get("title", ""))
+            if not normalized:
+                continue
+            recipe = len(self.ids)
+            self.ids.append(doc["id"])
+            self.titles.append(doc["title"])
+            diet_masks.append(self._mask(doc.get("dietary_tags"), self.diet_bits))
+            allergen_masks.append(self._mask(doc.get("allergens"), self.allergen_bits))
+            scores.append(plan_counts.get(doc["id"], 0) + RATING_WEIGHT * float(doc.get("rating") or 0))
+            position = 0
+            while position != -1:
+                entries.append((normalized[position:], recipe, position == 0))
+                position = normalized.find(" ", position)
+                position = position + 1 if position != -1 else -1
+        entries.sort(key=lambda e: e[0])
+        recipe_scores = np.array(scores, dtype=np.float64)
+        self.keys = [e[0] for e in entries]
+        self.entry_recipe = np.fromiter((e[1] for e in entries), dtype=np.int32, count=len(entries))
+        title_start = np.fromiter((e[2] for e in entries), dtype=bool, count=len(entries))
+        self.entry_score = recipe_scores[self.entry_recipe] + PREFIX_BONUS * title_start
+        # Entry-aligned copies so filtering reads contiguous slices instead of gathering per recipe
+        self.entry_diet = np.array(diet_masks, dtype=np.uint64)[self.entry_recipe]
+        self.entry_allergen = np.array(allergen_masks, dtype=np.uint64)[self.entry_recipe]
+        self.corpus_version = corpus_version
+        self.results = LRUCache(maxsize=cache_size, name="suggest")
+        self.build_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    @staticmethod
+    def _mask(tags: Optional[list], bits: dict) -> int:
+        mask = 0
+        for tag in tags or []:
+            tag = str(tag).lower()
+            if tag not in bits:
+                if len(bits) >= MAX_TAG_BITS:
+                    continue
+                bits[tag] = 1 << len(bits)
+            mask |= bits[tag]
+        return mask
+
+    def search(self, prefix: str, k: int, diets: tuple = (), allergens: tuple = ()) -> List[dict]:
+        """
+        Top `k` recipes with a word starting with `prefix`, best first.
+        `diets` follows find_recipes ($in: any one of them); `allergens`
+        excludes recipes containing any of them.
+        """
+        key = (prefix, k, diets, allergens)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        result = self._search(prefix, k, diets, allergens)
+        self.results.set(key, result)
+        return result
+
+    def _search(self, prefix: str, k: int, diets: tuple, allergens: tuple) -> List[dict]:
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\x7f", lo)
+        if lo == hi:
+            return []
+        recipes = self.entry_recipe[lo:hi]
+        scores = self.entry_score[lo:hi]
+        wanted = sum(self.diet_bits.get(d, 0) for d in diets)
+        if diets and not wanted:
+            return []
+        excluded = sum(self.allergen_bits.get(a, 0) for a in allergens)
+        if wanted or excluded:
+            keep = (self.entry_allergen[lo:hi] & np.uint64(excluded)) == 0
+            if wanted:
+                keep &= (self.entry_diet[lo:hi] & np.uint64(wanted)) != 0
+            recipes, scores = recipes[keep], scores[keep]
+
+        # A recipe can match at several word starts: over-select, then keep its best entry
+        want = k
+        while True:
+            if len(recipes) > want:
+                top = np.argpartition(-scores, want - 1)[:want]
+            else:
+                top = np.arange(len(recipes))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            picked = list(dict.fromkeys(int(r) for r in recipes[top]))
+            if len(picked) >= k or len(top) == len(recipes):
+                break
+            want *= 4
+        return [{"id": self.ids[r], "title": self.titles[r]} for r in picked[:k]]
+
+    def stats(self) -> dict:
+        return {
+            "recipes": len(self.ids),
+            "keys": len(self.keys),
+            "corpus_version": self.corpus_version,
+            "build_ms": self.build_ms,
+            "results": self.results.stats(),
+        }
+
+
+class RecipeSuggester:
+    def __init__(self, max_results: int = SUGGEST_MAX_RESULTS):
+        self.max_results = max_results
+        self.index: Optional[TitleIndex] = None
+        self.rebuilds = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="suggest-index")
+        self._rebuilding = False
+        self._lock = threading.Lock()
+
+    def build(self) -> TitleIndex:
+        version = mongodb_client.get_corpus_version()
+        index = TitleIndex(mongodb_client.iter_recipe_titles(), mongodb_client.recipe_plan_counts(), version)
+        self.index = index
+        print(f"DEBUG: [Suggest] Indexed {len(index.ids)} titles ({len(index.keys)} keys) in {index.build_ms}ms")
+        return index
+
+    def _current(self) -> TitleIndex:
+        index = self.index
+        if index is None:
+            with self._lock:
+                if self.index is None:
+                    self.build()
+                return self.index
+        if index.corpus_version != mongodb_client.get_corpus_version():
+            self._schedule_rebuild()
+        return index
+
+    def _schedule_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                self.build()
+                self.rebuilds += 1
+            except Exception as e:
+                print(f"DEBUG: [Suggest] Background rebuild failed: {str(e)}")
+            finally:
+                self._rebuilding = False
+
+        self._executor.submit(rebuild)
+
+    def suggest(self, q: str, k: Optional[int] = None, diets: Iterable[str] = (),
+                allergens: Iterable[str] = ()) -> List[dict]:
+        prefix = normalize_title(q)
+        if not prefix:
+            return []
+        k = min(k or self.max_results, self.max_results)
+        return self._current().search(
+            prefix, k,
+            tuple(sorted({d.strip().lower() for d in diets if d.strip()})),
+            tuple(sorted({a.strip().lower() for a in allergens if a.strip()})),
+        )
+
+    def stats(self) -> dict:
+        stats = self.index.stats() if self.index else {"recipes": 0}
+        stats["rebuilds"] = self.rebuilds
+        stats["rebuilding"] = self._rebuilding
+        return stats
+
+recipe_suggester = RecipeSuggester()
@@ -0,0 +1,176 @@
+"""
+Startup warm-up and readiness.
+
+Run once per worker from the app lifespan, on a background thread, so
+the process can answer /health (liveness) immediately while /ready
+(readiness) reports 503 until the warm-up has finished. Steps:
+
+  mongo       ping + corpus version (opens the connection pool) - required
+  indexes     dry-run of the index registry; missing indexes are reported
+  recipes     recipes from recent users' plans into the recipe cache
+  candidates  candidate pools (and nutrition/prompt caches) for recent users' buckets
+  suggest     the typeahead title index
+  llm         metadata lookup of the planner model; no tokens generated
+
+Only "mongo" failing keeps the worker unready (it is retried every
+WARMUP_RETRY_SECONDS until it answers); the others degrade.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from pydantic import ValidationError
+from app.core.config import (
+    WARMUP_USER_SAMPLE, WARMUP_LLM_TIMEOUT_SECONDS, WARMUP_RETRY_SECONDS, RECIPE_BATCH_MAX_IDS
+)
+from app.core.tracing import tracer
+from app.db.indexes import apply_indexes
+from app.db.mongodb import mongodb_client, retrieval_bucket
+from app.models.schemas import UserProfile
+from app.services.meal_planner import meal_planner_service
+from app.services.recipe_cache import recipe_cache
+from app.services.suggest import recipe_suggester
+
+REQUIRED = ("mongo",)
+
+
+class WarmupService:
+    def __init__(self, user_sample: int = WARMUP_USER_SAMPLE, llm_timeout: float = WARMUP_LLM_TIMEOUT_SECONDS,
+                 retry_seconds: float = WARMUP_RETRY_SECONDS):
+        self.user_sample = user_sample
+        self.llm_timeout = llm_timeout
+        self.retry_seconds = retry_seconds
+        self.components: Dict[str, dict] = {}
+        self.started_at: Optional[str] = None
+        self.total_ms: Optional[float] = None
+        self.finished = False
+        self._users = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Kick off warm-up in the background (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="fitfork-warmup", daemon=True)
+        self._thread.start()
+
+    def skip(self):
+        """Warm-up disabled: ready immediately, caches fill on demand."""
+        self.started_at = datetime.utcnow().isoformat()
+        self.total_ms = 0.0
+        self.finished = True
+
+    def run(self):
+        self.started_at = datetime.utcnow().isoformat()
+        start = time.perf_counter()
+        steps = [
+            ("mongo", self._warm_mongo),
+            ("indexes", self._check_indexes),
+            ("recipes", self._warm_recipes),
+            ("candidates", self._warm_candidates),
+            ("suggest", self._build_suggest_index),
+            ("llm", self._probe_llm),
+        ]
+        for name, _ in steps:
+            self.components[name] = {"status": "pending"}
+        for name, step in steps:
+            self._run_step(name, step)
+            while name in REQUIRED and self.components[name]["status"] == "failed" and self.retry_seconds:
+                time.sleep(self.retry_seconds)
+                self._run_step(name, step)
+            if name in REQUIRED and self.components[name]["status"] != "ok":
+                for skipped, _ in steps:
+                    if self.components[skipped]["status"] == "pending":
+                        self.components[skipped] = {"status": "skipped", "detail": f"{name} unavailable"}
+                break
+        self.total_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.finished = True
+        print(f"DEBUG: [Warmup] Finished in {self.total_ms}ms: "
+              + ", ".join(f"{n}={c['status']}" for n, c in self.components.items()))
+
+    def _run_step(self, name: str, step: Callable[[], dict]):
+        self.components[name] = {"status": "running"}
+        start = time.perf_counter()
+        try:
+            # One background trace per step; never counted as a route in the trace summary
+            with tracer.span(f"warmup.{name}"):
+                result = step() or {}
+            status = result.pop("status", "ok")
+            self.components[name] = {"status": status, **result}
+        except Exception as e:
+            self.components[name] = {"status": "failed", "detail": str(e)[:200]}
+        self.components[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _warm_mongo(self) -> dict:
+        if not mongodb_client.ping():
+            # Not retried: nothing will change without a restart
+            return {"status": "unavailable", "detail": "MONGO_URI not configured"}
+        return {"corpus_version": mongodb_client.get_corpus_version()}
+
+    def _check_indexes(self) -> dict:
+        report = apply_indexes(mongodb_client.db, dry_run=True)
+        missing = [f"{coll}.{name}" for coll, r in report.items() for name in r["created"]]
+        errors = [f"{coll}: {e}" for coll, r in report.items() for e in r["errors"]]
+        if missing or errors:
+            # Serving still works, just slower; run scripts/migrate_indexes.py
+            return {"status": "degraded", "missing": missing, "errors": errors}
+        return {}
+
+    def _warm_recipes(self) -> dict:
+        self._users = mongodb_client.recent_users_for_warmup(self.user_sample)
+        ids = list(dict.fromkeys(rid for user in self._users for rid in user["recipe_ids"]))
+        return {"loaded": len(recipe_cache.get_many(ids[:RECIPE_BATCH_MAX_IDS]))}
+
+    def _warm_candidates(self) -> dict:
+        buckets = {}
+        for user in self._users:
+            if not user.get("profile"):
+                continue
+            try:
+                profile = UserProfile(**user["profile"])
+            except ValidationError:
+                continue
+            buckets.setdefault(retrieval_bucket(profile), profile)
+        for profile in buckets.values():
+            meal_planner_service.candidates_for(profile)
+        return {"buckets": len(buckets)}
+
+    def _build_suggest_index(self) -> dict:
+        index = recipe_suggester.build()
+        return {"titles": len(index.ids)}
+
+    def _probe_llm(self) -> dict:
+        client = meal_planner_service.client
+        if client is None:
+            return {"status": "degraded", "detail": "GEMINI_API_KEY missing"}
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(client.models.get, model=meal_planner_service.model_name)
+        try:
+            future.result(timeout=self.llm_timeout)
+        except FutureTimeout:
+            return {"status": "degraded", "detail": f"no answer within {self.llm_timeout}s"}
+        except Exception as e:
+            return {"status": "degraded", "detail": str(e)[:200]}
+        finally:
+            executor.shutdown(wait=False)
+        return {"model": meal_planner_service.model_name}
+
+    @property
+    def ready(self) -> bool:
+        # No components recorded means warm-up was skipped
+        return self.finished and all(
+            self.components.get(name, {}).get("status", "ok") == "ok" for name in REQUIRED
+        )
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "components": {name: dict(c) for name, c in self.components.items()},
+        }
+
+warmup_service = WarmupService()
@@ -0,0 +1,16 @@
+"""
+Archive old chat turns into bucketed documents for every user over the hot limit.
+
+Usage (from backend/, e.g. nightly cron):
+    python scripts/archive_chat.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chat_retention import chat_retention_service
+
+if __name__ == "__main__":
+    result = chat_retention_service.archive_all()
+    print(f"🗄️  Archived {result['archived']} messages across {result['users']} users.")
@@ -0,0 +1,76 @@
+"""
+Microbenchmark: server CPU per active session-hour, before and after refresh tokens.
+
+  before: 15-minute access tokens and no refresh, so 4 password logins per hour
+          (bcrypt verify_password + create_access_token each)
+  after:  one login per REFRESH_TOKEN_EXPIRE_DAYS, then 4 /auth/refresh calls
+          per hour (token generation, SHA-256 and create_access_token each)
+
+Only in-process CPU is measured. Both paths make one indexed Mongo round
+trip per renewal (login: find user; refresh: find_one_and_update + insert).
+
+Run from backend/: python scripts/bench_auth.py
+"""
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.auth import (
+    create_access_token, hash_refresh_token, verify_password, get_password_hash,
+    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+)
+
+LOGIN_ROUNDS = 20
+REFRESH_ROUNDS = 20000
+RENEWALS_PER_HOUR = 60 / 15
+
+
+def _password_check():
+    """The repo's passlib path; falls back to bcrypt at passlib's default cost if that backend is broken."""
+    try:
+        hashed = get_password_hash("correct horse battery staple")
+        return lambda: verify_password("correct horse battery staple", hashed)
+    except Exception:
+        import bcrypt
+        hashed = bcrypt.hashpw(b"correct horse battery staple", bcrypt.gensalt(rounds=12))
+        print("(passlib bcrypt backend unavailable, timing bcrypt.checkpw at cost 12)")
+        return lambda: bcrypt.checkpw(b"correct horse battery staple", hashed)
+
+
+def cpu_ms(fn, rounds: int) -> float:
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - start) * 1000 / rounds
+
+
+def main():
+    import secrets
+    check = _password_check()
+
+    def login():
+        check()
+        create_access_token({"sub": "bench@fitfork.dev"}, expires_delta=timedelta(minutes=15))
+
+    def refresh():
+        hash_refresh_token(secrets.token_urlsafe(32))  # presented token
+        hash_refresh_token(secrets.token_urlsafe(32))  # rotated replacement
+        create_access_token({"sub": "bench@fitfork.dev"},
+                            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+    login_ms = cpu_ms(login, LOGIN_ROUNDS)
+    refresh_ms = cpu_ms(refresh, REFRESH_ROUNDS)
+    before = login_ms * RENEWALS_PER_HOUR
+    after = refresh_ms * RENEWALS_PER_HOUR + login_ms / (REFRESH_TOKEN_EXPIRE_DAYS * 24)
+
+    print(f"login (bcrypt + JWT):   {login_ms:9.3f} ms CPU")
+    print(f"refresh (SHA-256 + JWT): {refresh_ms:9.3f} ms CPU")
+    print(f"per session-hour before: {before:9.3f} ms CPU")
+    print(f"per session-hour after:  {after:9.3f} ms CPU  ({before / after:.0f}x less)")
+
+
+if __name__ == "__main__":
+    main()
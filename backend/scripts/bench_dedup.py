@@ -0,0 +1,80 @@
+"""
+Dedup benchmark: corpus reduction and wall time of the import-time
+MinHash/LSH stage (app/services/recipe_dedup.py).
+
+With no argument, it builds a synthetic corpus shaped like the merged
+dataset: distinct dishes, plus re-posts with a reworded title,
+different quantities and one ingredient added or dropped. Pass a JSONL
+path (e.g. data/processed/final_recipes_enriched.jsonl) to measure the
+real corpus instead.
+
+Run from backend/: python scripts/bench_dedup.py [--recipes 500000] [path.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.recipe_dedup import RecipeDeduper, DEDUP_THRESHOLD
+
+WORDS = [
+    "chicken", "beef", "tofu", "lentil", "chickpea", "salmon", "shrimp", "pork", "egg", "rice", "quinoa",
+    "pasta", "noodle", "potato", "spinach", "kale", "tomato", "onion", "garlic", "ginger", "basil",
+    "cilantro", "lemon", "lime", "coconut", "curry", "chili", "pepper", "mushroom", "cheese", "yogurt",
+    "butter", "olive", "sesame", "soy", "honey", "maple", "almond", "walnut", "oat", "banana", "apple",
+    "berry", "chocolate", "vanilla", "cinnamon", "cumin", "paprika", "oregano", "thyme", "rosemary",
+]
+STYLES = ["roasted", "grilled", "spicy", "creamy", "baked", "stir fried", "slow cooker", "one pot",
+          "crispy", "quick", "smoky", "sheet pan", "braised", "tangy", "herbed"]
+DISHES = ["salad", "soup", "stew", "bowl", "curry", "tacos", "casserole", "pie", "bake", "skillet",
+          "wrap", "burger", "risotto", "muffins", "pancakes", "smoothie", "stir fry", "chili"]
+UNITS = ["1 cup", "2 tbsp", "1/2 tsp", "3 oz", "200 g", "1 large", "2 cloves", "1 can"]
+
+
+def synthetic_corpus(count: int, duplicate_rate: float = 0.2, seed: int = 7):
+    rng = random.Random(seed)
+    originals = []
+    for i in range(count):
+        if originals and rng.random() < duplicate_rate:
+            base = rng.choice(originals)
+            ingredients = [f"{rng.choice(UNITS)} {i.split(' ', 2)[-1]}" for i in base["ingredients"]]
+            if rng.random() < 0.5 and len(ingredients) > 6:
+                ingredients.pop(rng.randrange(len(ingredients)))
+            else:
+                ingredients.append(f"{rng.choice(UNITS)} salt")
+            prefix = rng.choice(["Best ", "Easy ", "My ", ""])
+            yield {"title": prefix + base["title"], "ingredients": ingredients, "source": "food.com"}
+            continue
+        mains = rng.sample(WORDS, rng.randint(7, 12))
+        recipe = {
+            "title": f"{rng.choice(STYLES).title()} {mains[0].title()} {rng.choice(DISHES).title()}",
+            "ingredients": [f"{rng.choice(UNITS)} {w}" for w in mains],
+            "calories": rng.randint(150, 900), "protein_g": rng.randint(5, 60),
+            "source": "epicurious",
+        }
+        if len(originals) < 50_000:
+            originals.append(recipe)
+        yield recipe
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import-time recipe dedup")
+    parser.add_argument("path", nargs="?", help="recipes JSONL (default: synthetic corpus)")
+    parser.add_argument("--recipes", type=int, default=500_000, help="synthetic corpus size")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.path:
+        recipes = (json.loads(line) for line in open(args.path, encoding="utf-8") if line.strip())
+    else:
+        recipes = synthetic_corpus(args.recipes)
+    stats = RecipeDeduper(threshold=args.threshold).plan(recipes).stats
+    for key, value in stats.items():
+        print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
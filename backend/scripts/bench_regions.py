@@ -0,0 +1,150 @@
+"""
+Recall and latency of region-partitioned retrieval, per region.
+
+For every region and query, compares find_recipes_regional (the region's
+partition, widened to global when short) with the old unpartitioned
+find_recipes over the whole corpus:
+
+  regional_recall  share of the top-k slots that could be filled from the
+                   region's own partition and were
+  available        share of returned recipes obtainable in the region
+                   (tagged with it, "global" or untagged)
+  p50/p95 ms       query latency
+
+Seeds a synthetic corpus into a scratch database unless --use-corpus, which
+reads the configured database instead (read-only).
+
+Usage (from backend/, needs a reachable MongoDB):
+    MONGO_URI=mongodb://localhost:27017 python scripts/bench_regions.py --recipes 50000
+    python scripts/bench_regions.py --use-corpus
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.db.indexes import apply_indexes
+from app.db.mongodb import GLOBAL_PARTITION, RECIPE_REGIONS, MongoDBClient, recipe_filter
+from app.models.schemas import UserProfile
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+SCRATCH_DB = os.getenv("BENCH_DB_NAME", "fitfork_region_bench")
+QUERIES = ["", "chicken", "rice", "salad"]
+WORDS = ["chicken", "rice", "salad", "curry", "pasta", "tofu", "beef", "soup", "noodle", "taco", "stew", "bowl"]
+# Rough shape of the enriched corpus: most recipes are obtainable anywhere
+REGION_WEIGHTS = {"north_america": 40, "europe": 20, "asia": 20, "latin_america": 10,
+                  "mediterranean": 5, "middle_east": 5}
+
+
+def seed(client: MongoDBClient, count: int):
+    rng = random.Random(7)
+    regions, weights = zip(*REGION_WEIGHTS.items())
+    batch = []
+    for i in range(count):
+        home = rng.choices(regions, weights)[0]
+        batch.append({
+            "title": " ".join(rng.sample(WORDS, 3)) + f" {i}",
+            "description": "",
+            "dietary_tags": ["vegetarian"] if rng.random() < 0.3 else [],
+            "allergens": [],
+            "calories": rng.randint(200, 900),
+            "protein_g": rng.randint(5, 60),
+            # Exotic-ingredient recipes (about 15%) are only available at home
+            "regions": [home] if rng.random() < 0.15 else [home, "global"],
+        })
+        if len(batch) == 5000:
+            client.recipes_collection.insert_many(batch)
+            batch = []
+    if batch:
+        client.recipes_collection.insert_many(batch)
+
+
+def timed(fn, repeats: int):
+    samples, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, samples[len(samples) // 2], samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def ids_matching(client: MongoDBClient, query: str, profile: UserProfile, regions) -> set:
+    cursor = client.recipes_collection.find(recipe_filter(query, profile, None, regions), {"_id": 1})
+    return {str(doc["_id"]) for doc in cursor}
+
+
+def measure(client: MongoDBClient, region: str, query: str, limit: int, repeats: int) -> dict:
+    profile = UserProfile(height_cm=170, weight_kg=70, age=30, gender="female",
+                          activity_level="moderately_active", goal="maintenance", region=region)
+    home = ids_matching(client, query, profile, region)
+    available = home | ids_matching(client, query, profile, GLOBAL_PARTITION)
+    fillable = min(limit, len(home)) or 1
+
+    (regional, info), regional_p50, regional_p95 = timed(
+        lambda: client.find_recipes_regional(query, profile, limit=limit), repeats)
+    flat, flat_p50, flat_p95 = timed(lambda: client.find_recipes(query, profile, limit=limit), repeats)
+
+    def quality(recipes):
+        ids = [r["id"] for r in recipes]
+        return (min(1.0, sum(i in home for i in ids) / fillable),
+                sum(i in available for i in ids) / len(ids) if ids else 0.0)
+
+    regional_recall, regional_available = quality(regional)
+    flat_recall, flat_available = quality(flat)
+    return {
+        "region": region, "query": query or "(none)", "widened": info["widened"],
+        "regional": (regional_recall, regional_available, regional_p50, regional_p95),
+        "global": (flat_recall, flat_available, flat_p50, flat_p95),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-region recall and latency of partitioned retrieval")
+    parser.add_argument("--recipes", type=int, default=50000, help="Synthetic corpus size")
+    parser.add_argument("--use-corpus", action="store_true", help="Benchmark the configured database as-is")
+    parser.add_argument("--limit", type=int, default=40, help="Candidates per query (the planner's pool size)")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.use_corpus:
+        client = MongoDBClient(uri=MONGO_URI)
+    else:
+        client = MongoDBClient(uri=MONGO_URI, db_name=SCRATCH_DB)
+        client.client.drop_database(SCRATCH_DB)
+        apply_indexes(client.db)
+        print(f"Seeding {args.recipes} recipes into {SCRATCH_DB}...")
+        seed(client, args.recipes)
+
+    print(f"\n{'region':<14} {'query':<8} {'strategy':<12} {'recall':>7} {'available':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    totals = {}
+    for region in RECIPE_REGIONS[1:]:
+        for query in QUERIES:
+            row = measure(client, region, query, args.limit, args.repeats)
+            for strategy in ("regional", "global"):
+                recall, available, p50, p95 = row[strategy]
+                label = strategy + ("*" if strategy == "regional" and row["widened"] else "")
+                print(f"{region:<14} {row['query']:<8} {label:<12} {recall:>7.1%} {available:>10.1%} "
+                      f"{p50:>8.2f} {p95:>8.2f}")
+                totals.setdefault((region, strategy), []).append(row[strategy])
+    print("* widened to the global partition\n")
+
+    print(f"{'region':<14} {'strategy':<10} {'recall':>7} {'available':>10} {'p50 ms':>8}")
+    for (region, strategy), rows in totals.items():
+        recall, available, p50, _ = (statistics.mean(column) for column in zip(*rows))
+        print(f"{region:<14} {strategy:<10} {recall:>7.1%} {available:>10.1%} {p50:>8.2f}")
+
+    if not args.use_corpus:
+        client.client.drop_database(SCRATCH_DB)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
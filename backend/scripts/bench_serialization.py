@@ -0,0 +1,84 @@
+"""
+Microbenchmark: per-request serialization cost of a 50-recipe /search response.
+
+  old: RecipeResult(**r) per doc, then FastAPI's response_model re-validation + JSON encoding
+  new: projection-shaped dicts straight into ORJSONResponse
+
+Run from backend/: python scripts/bench_serialization.py
+"""
+import os
+import sys
+import time
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from app.core.responses import ORJSONResponse
+from app.db.mongodb import shape_recipe
+from app.models.schemas import RecipeResult
+
+N_RECIPES = 50
+ROUNDS = 2000
+LEGACY_ENCODER = False
+
+
+def make_docs():
+    """Documents as the Mongo projection returns them."""
+    return [
+        {
+            "id": f"65f0c0ffee{i:014d}",
+            "title": f"Roasted Chickpea Bowl #{i}",
+            "description": "Crispy chickpeas, tahini, greens and quinoa. " * 3,
+            "cuisine": "mediterranean",
+            "calories": 520.0 + i,
+            "protein_g": 24.5,
+            "carbs_g": 61.0,
+            "fat_g": 18.2,
+            "ingredients": [f"ingredient {j}" for j in range(12)],
+            "instructions": [f"Step {j}: do the thing carefully." for j in range(8)],
+            "time_minutes": 35,
+            "meal_types": ["lunch", "dinner"],
+            "dietary_tags": ["vegetarian", "vegan"],
+            "allergens": ["sesame"],
+        }
+        for i in range(N_RECIPES)
+    ]
+
+
+def old_path(docs, adapter):
+    models = [RecipeResult(**r) for r in docs]
+    # What FastAPI does with response_model=List[RecipeResult]: re-validate, then
+    # encode (older releases go through jsonable_encoder, newer ones dump_json)
+    validated = adapter.validate_python(models, from_attributes=True)
+    if LEGACY_ENCODER:
+        return JSONResponse(jsonable_encoder(adapter.dump_python(validated, mode="json"))).body
+    return adapter.dump_json(validated)
+
+
+def new_path(docs):
+    return ORJSONResponse([shape_recipe(dict(r)) for r in docs]).body
+
+
+def bench(fn, *args):
+    fn(*args)  # warm up
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+if __name__ == "__main__":
+    docs = make_docs()
+    adapter = TypeAdapter(List[RecipeResult])
+    new_us = bench(new_path, docs)
+    old_us = bench(old_path, docs, adapter)
+    LEGACY_ENCODER = True
+    legacy_us = bench(old_path, docs, adapter)
+    print(f"{N_RECIPES}-recipe search response, {ROUNDS} rounds")
+    print(f"  old, jsonable_encoder:         {legacy_us:8.1f} µs/request")
+    print(f"  old, pydantic dump_json:       {old_us:8.1f} µs/request")
+    print(f"  new (projection + orjson):     {new_us:8.1f} µs/request")
+    print(f"  speedup vs dump_json:          {old_us / new_us:8.1f}x")
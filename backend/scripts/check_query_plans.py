@@ -0,0 +1,221 @@
+"""
+Explain-plan regression check.
+
+Exercises every MongoDBClient query path against a scratch database that
+has the registry indexes applied, captures the commands it actually sends
+(pymongo command monitoring), re-runs each through `explain` and fails if
+any winning plan contains a COLLSCAN, or if a $text query is sorted on
+anything but its text score (that sorts every match in memory and drops
+relevance order).
+
+Usage (from backend/, needs a reachable MongoDB):
+    MONGO_URI=mongodb://localhost:27017 python scripts/check_query_plans.py
+"""
+import os
+import sys
+from pymongo import monitoring
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.db.indexes import apply_indexes
+from app.db.mongodb import MongoDBClient
+from app.models.schemas import RecipeFilters, UserProfile
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+SCRATCH_DB = os.getenv("EXPLAIN_DB_NAME", "fitfork_explain_check")
+
+EXPLAINABLE = {"find", "update", "delete", "count", "aggregate", "findAndModify", "distinct"}
+# Session/transport fields that `explain` rejects or ignores
+STRIP_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber",
+                "writeConcern", "readConcern", "autocommit", "startTransaction", "apiVersion"}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+        self.enabled = False
+
+    def started(self, event):
+        if self.enabled and event.command_name in EXPLAINABLE and event.database_name == SCRATCH_DB:
+            command = {k: v for k, v in event.command.items() if k not in STRIP_FIELDS}
+            self.commands.append(command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _has_filter(command: dict) -> bool:
+    """Unfiltered limit scans (and metadata counts) are allowed to COLLSCAN."""
+    name = next(iter(command))
+    if name == "find":
+        return bool(command.get("filter"))
+    if name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        return any(s.get("q") for s in statements)
+    if name == "count":
+        return bool(command.get("query"))
+    return True
+
+
+def _explain_targets(command: dict):
+    """explain takes one write statement at a time."""
+    name = next(iter(command))
+    if name == "update":
+        for statement in command["updates"]:
+            yield {"update": command["update"], "updates": [statement]}
+    elif name == "delete":
+        for statement in command["deletes"]:
+            yield {"delete": command["delete"], "deletes": [statement]}
+    else:
+        yield command
+
+
+def _text_sort_problem(command: dict):
+    """The sort key a $text query leads with, if it isn't the text score."""
+    name = next(iter(command))
+    if name == "find":
+        query, sort, score_fields = command.get("filter") or {}, command.get("sort") or {}, set()
+    elif name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        query = pipeline[0].get("$match", {}) if pipeline else {}
+        sort = next((stage["$sort"] for stage in pipeline if "$sort" in stage), {})
+        score_fields = {field for stage in pipeline for field, value in stage.get("$addFields", {}).items()
+                        if value == {"$meta": "textScore"}}
+    else:
+        return None
+    if "$text" not in query or not sort:
+        return None
+    lead, direction = next(iter(sort.items()))
+    if direction == {"$meta": "textScore"} or lead in score_fields:
+        return None
+    return lead
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def exercise(client: MongoDBClient):
+    """Call every query path MongoDBClient exposes with representative arguments."""
+    from bson import ObjectId
+    from datetime import datetime, timedelta
+
+    user = client.create_user({"email": "explain@fitfork.dev", "full_name": "Explain", "hashed_password": "x"})
+    user_id = user["id"] if user else str(ObjectId())
+    profile = UserProfile(
+        height_cm=175, weight_kg=70, age=30, gender="female",
+        activity_level="moderately_active", goal="maintenance",
+        dietary_restrictions=["vegetarian"], allergens_to_avoid=["peanuts"],
+        cuisine_preferences=["italian"],
+    )
+    bare_profile = UserProfile(
+        height_cm=175, weight_kg=70, age=30, gender="male",
+        activity_level="sedentary", goal="bulking",
+    )
+
+    client.get_user_by_email("explain@fitfork.dev")
+    client.save_refresh_token({"_id": "explain-hash", "user_id": user_id, "email": "explain@fitfork.dev",
+                               "family_id": "explain-family", "expires_at": datetime.utcnow() + timedelta(days=1),
+                               "used_at": None})
+    client.consume_refresh_token("explain-hash")
+    client.get_refresh_token("explain-hash")
+    client.delete_refresh_family("explain-family")
+    client.delete_user_refresh_tokens(user_id)
+    client.recent_users_for_warmup(10)
+    client.save_user_profile(user_id, profile)
+    client.get_user_profile(user_id)
+    client.save_meal_plan(user_id, {"overview": "", "days": []})
+    client.get_latest_meal_plan(user_id)
+    client.get_meal_plan_export(user_id)
+    client.set_calendar_feed_hash(user_id, "explain-feed-hash")
+    client.get_user_id_by_feed_hash("explain-feed-hash")
+    client.set_calendar_feed_hash(user_id, None)
+    client.save_google_tokens(user_id, {"access_token": "t"})
+    client.get_google_tokens(user_id)
+    client.delete_google_tokens(user_id)
+
+    for i in range(6):
+        client.save_chat_message(user_id, "user", f"hello {i}")
+    client.archive_chat_messages(user_id, keep_recent=2, bucket_size=3)
+    client.chat_users_over(2)
+    client.get_chat_history(user_id)
+    client.clear_chat_history(user_id)
+
+    client.get_corpus_version()
+    client.bump_corpus_version()
+    client.find_recipes("pasta", profile, limit=10)
+    client.find_recipes("", profile, limit=10)
+    client.find_recipes("pasta", bare_profile, limit=10)
+    client.find_recipes("", bare_profile, limit=10)
+    regional_profile = bare_profile.model_copy(update={"region": "asia"})
+    client.find_recipes_regional("", regional_profile, limit=10, min_results=100)  # partition, then widen
+    client.find_recipes_regional("pasta", regional_profile, limit=10)
+    filters = RecipeFilters(max_calories=600, min_protein_g=20, max_time_minutes=45)
+    client.find_recipes_page("", profile, filters, limit=5)
+    client.find_recipes_page("", bare_profile, filters.model_copy(update={"meal_type": "dinner"}), limit=5)
+    client.find_recipes_page("", bare_profile, filters.model_copy(update={"cuisine": "italian"}), limit=5,
+                             after=str(ObjectId()))
+    client.find_recipes_page("", bare_profile, RecipeFilters(), limit=5)
+    client.find_recipes_page("pasta", bare_profile, filters, limit=5)
+    _, text_cursor = client.find_recipes_page("pasta", bare_profile, RecipeFilters(), limit=2)
+    client.find_recipes_page("pasta", bare_profile, RecipeFilters(), limit=2, after=text_cursor)
+    client.get_recipes_by_ids([str(ObjectId())])
+    client.save_cohort_plans("explain-cohort", [{"member_id": "m-1", "plan": {"days": []}}])
+
+
+def main() -> int:
+    recorder = CommandRecorder()
+    client = MongoDBClient(uri=MONGO_URI, db_name=SCRATCH_DB, event_listeners=[recorder])
+    client.client.drop_database(SCRATCH_DB)
+    apply_indexes(client.db)
+    # A few documents so the planner has something to choose between
+    client.recipes_collection.insert_many([
+        {"title": f"Pasta {i}", "description": "tomato basil", "dietary_tags": ["vegetarian"],
+         "allergens": ["gluten"], "calories": 500, "regions": ["asia", "global"] if i % 2 else ["global"]}
+        for i in range(20)
+    ])
+
+    recorder.enabled = True
+    exercise(client)
+    recorder.enabled = False
+
+    failures = []
+    checked = 0
+    for command in recorder.commands:
+        lead = _text_sort_problem(command)
+        if lead is not None:
+            failures.append(command)
+            print(f"❌ $text sorted on {lead!r}, not the text score: {command}")
+        if not _has_filter(command):
+            continue
+        for target in _explain_targets(command):
+            explain = client.db.command({"explain": target, "verbosity": "queryPlanner"})
+            stages = set(_stages(explain.get("queryPlanner", explain)))
+            checked += 1
+            shape = {k: v for k, v in target.items() if k in ("find", "filter", "sort", "aggregate", "pipeline", "update", "updates", "delete", "deletes", "count", "query")}
+            if "COLLSCAN" in stages:
+                failures.append(shape)
+                print(f"❌ COLLSCAN: {shape}")
+            else:
+                print(f"✅ {sorted(stages)}: {shape}")
+
+    client.client.drop_database(SCRATCH_DB)
+    print(f"\nChecked {checked} query plans, {len(failures)} failure(s).")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
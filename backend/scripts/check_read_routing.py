@@ -0,0 +1,193 @@
+"""
+Read-routing check against a local three-member replica set.
+
+Starts `mongod` x3 (MONGOD_BIN, default `mongod` on PATH) on throwaway
+ports and data directories, or uses an existing replica set given as
+MONGO_RS_URI. It then exercises MongoDBClient and records which server
+each read was sent to (pymongo command monitoring). The check fails if:
+
+  - a recipe corpus read (find_recipes, recipes by ID, corpus version)
+    was served by the primary while secondaries were available
+  - a user or chat read was served by a secondary
+  - a user or chat read missed a write made just before it
+  - either role's pool size differs from its config
+
+Usage (from backend/):
+    python scripts/check_read_routing.py
+    MONGO_RS_URI="mongodb://h1,h2,h3/?replicaSet=rs0" python scripts/check_read_routing.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pymongo import MongoClient, monitoring
+from pymongo.write_concern import WriteConcern
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import MONGO_PRIMARY_POOL_SIZE, MONGO_RECIPE_POOL_SIZE
+from app.db.indexes import apply_indexes
+from app.db.mongodb import MongoDBClient
+from app.models.schemas import UserProfile
+
+SCRATCH_DB = "fitfork_routing_check"
+REPLICA_SET = "fitfork-routing"
+BASE_PORT = int(os.getenv("ROUTING_BASE_PORT", "27217"))
+READS = {"find", "aggregate", "count", "distinct"}
+
+
+class ReadRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.reads = []
+
+    def started(self, event):
+        if event.command_name in READS and event.database_name == SCRATCH_DB:
+            self.reads.append((event.command[event.command_name], event.connection_id))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def start_replica_set(workdir: str):
+    """Three local members; the first gets priority so it's the primary. Returns (uri, processes)."""
+    mongod = os.getenv("MONGOD_BIN", "mongod")
+    if shutil.which(mongod) is None:
+        raise SystemExit(f"{mongod} not found: install MongoDB or set MONGO_RS_URI")
+    ports = [BASE_PORT + i for i in range(3)]
+    processes = []
+    for port in ports:
+        dbpath = os.path.join(workdir, str(port))
+        os.makedirs(dbpath)
+        processes.append(subprocess.Popen([
+            mongod, "--replSet", REPLICA_SET, "--port", str(port), "--bind_ip", "127.0.0.1",
+            "--dbpath", dbpath, "--logpath", os.path.join(dbpath, "mongod.log"), "--quiet",
+        ]))
+
+    seed = MongoClient(f"mongodb://127.0.0.1:{ports[0]}/?directConnection=true", serverSelectionTimeoutMS=30000)
+    seed.admin.command("ping")
+    seed.admin.command("replSetInitiate", {
+        "_id": REPLICA_SET,
+        "members": [
+            {"_id": i, "host": f"127.0.0.1:{port}", "priority": 2 if i == 0 else 1}
+            for i, port in enumerate(ports)
+        ],
+    })
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        states = [m["stateStr"] for m in seed.admin.command("replSetGetStatus")["members"]]
+        if states.count("PRIMARY") == 1 and states.count("SECONDARY") == 2:
+            break
+        time.sleep(0.5)
+    else:
+        raise SystemExit(f"replica set did not come up: {states}")
+    seed.close()
+    hosts = ",".join(f"127.0.0.1:{port}" for port in ports)
+    return f"mongodb://{hosts}/?replicaSet={REPLICA_SET}", processes
+
+
+def wait_for_topology(client: MongoClient, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.primary and len(client.secondaries) >= 1:
+            return
+        time.sleep(0.2)
+    raise SystemExit("client never saw both a primary and a secondary")
+
+
+def check(uri: str) -> list:
+    recorder = ReadRecorder()
+    client = MongoDBClient(uri=uri, db_name=SCRATCH_DB, event_listeners=[recorder])
+    client.client.drop_database(SCRATCH_DB)
+    apply_indexes(client.db)
+    client.ping()
+    wait_for_topology(client.client)
+    wait_for_topology(client.recipe_client)
+    primary = client.client.primary
+
+    failures = []
+    primary_pool = client.client.options.pool_options.max_pool_size
+    recipe_pool = client.recipe_client.options.pool_options.max_pool_size
+    print(f"pools: primary={primary_pool} recipes={recipe_pool}")
+    if (primary_pool, recipe_pool) != (MONGO_PRIMARY_POOL_SIZE, MONGO_RECIPE_POOL_SIZE):
+        failures.append("pool sizes do not match config")
+
+    # Seed on every member so secondary reads have data to return
+    everywhere = WriteConcern(w=3, wtimeout=30000)
+    recipes = client.db.get_collection("recipes", write_concern=everywhere)
+    inserted = recipes.insert_many([
+        {"title": f"Dal {i}", "description": "lentils", "dietary_tags": ["vegetarian"],
+         "allergens": [], "calories": 450}
+        for i in range(10)
+    ])
+    client.db.get_collection("meta", write_concern=everywhere).update_one(
+        {"_id": "recipes"}, {"$set": {"version": "routing-check"}}, upsert=True
+    )
+    user_id = str(client.db.get_collection("users", write_concern=everywhere).insert_one(
+        {"email": "routing@fitfork.dev"}
+    ).inserted_id)
+
+    recorder.reads.clear()
+    bare = UserProfile(height_cm=170, weight_kg=70, age=30, gender="female",
+                       activity_level="moderately_active", goal="maintenance")
+    if not client.find_recipes("", bare, limit=5):
+        failures.append("find_recipes returned nothing from the secondary")
+    client.get_recipes_by_ids([str(inserted.inserted_ids[0])])
+    client._corpus_version = None
+    client.get_corpus_version()
+    recipe_reads = list(recorder.reads)
+
+    recorder.reads.clear()
+    profile = bare.model_copy(update={"goal": "bulking"})
+    client.save_user_profile(user_id, profile)
+    saved = client.get_user_profile(user_id)
+    if saved is None or saved.goal != "bulking":
+        failures.append("profile read missed the write just before it")
+    client.save_chat_message(user_id, "user", "routing check")
+    if client.get_chat_history(user_id)[-1:] != [{"role": "user", "content": "routing check"}]:
+        failures.append("chat read missed the write just before it")
+    client.get_latest_meal_plan(user_id)
+    user_reads = list(recorder.reads)
+
+    for collection, address in recipe_reads:
+        ok = address != primary
+        print(f"{'✅' if ok else '❌'} recipes role  {collection:<14} -> {address[0]}:{address[1]}")
+        if not ok:
+            failures.append(f"{collection} read hit the primary")
+    for collection, address in user_reads:
+        ok = address == primary
+        print(f"{'✅' if ok else '❌'} primary role  {collection:<14} -> {address[0]}:{address[1]}")
+        if not ok:
+            failures.append(f"{collection} read left the primary")
+
+    client.client.drop_database(SCRATCH_DB)
+    return failures
+
+
+def main() -> int:
+    uri = os.getenv("MONGO_RS_URI")
+    processes, workdir = [], None
+    try:
+        if not uri:
+            workdir = tempfile.mkdtemp(prefix="fitfork-rs-")
+            uri, processes = start_replica_set(workdir)
+        failures = check(uri)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(f"\n{len(failures)} routing failure(s).")
+    for failure in failures:
+        print(f"  - {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Rebuild the enriched recipe corpus (replaces the data_enriching.ipynb Colab run).
+
+Reads from --raw-dir:
+    train.json               Yummly, cuisine classifier training data
+    food_com_cleaned.jsonl   Food.com recipes
+    epi_r.csv                Epicurious (optional; skipped if missing)
+
+Writes to --out-dir (where import_recipes_mongo.py looks):
+    final_recipes_enriched.jsonl, sample_recipes_1k.jsonl, dataset_final_stats.json
+
+Stages checkpoint under --work-dir (model artifact, per-chunk part files,
+_DONE.json per stage). Re-running resumes an interrupted stage and skips
+finished stages whose inputs haven't changed.
+
+Usage (from backend/):
+    python scripts/enrich_recipes.py --workers 4
+    python scripts/enrich_recipes.py --force food_com merge
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.enrichment import (
+    ChunkedStage, epicurious_chunk, file_fingerprint, finalize_recipe, food_com_chunk, init_cuisine_worker,
+    iter_csv_records, iter_parts, load_or_train_cuisine_model, rejection_reasons, atomic_write,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+STAGES = ["cuisine_model", "food_com", "epicurious", "merge"]
+SAMPLE_SIZE = 1000
+
+
+def merge(stage_dirs: list, out_dir: str, fingerprint: str, done_path: str, force: bool) -> dict:
+    """Filter and write the final corpus in one streaming pass; stats are counted on the way."""
+    if not force and os.path.exists(done_path):
+        with open(done_path, "r", encoding="utf-8") as f:
+            done = json.load(f)
+        if done.get("fingerprint") == fingerprint:
+            return {**done, "status": "cached", "seconds": 0.0}
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    final_path = os.path.join(out_dir, "final_recipes_enriched.jsonl")
+    counts = {name: Counter() for name in ("source", "cuisine", "difficulty", "meal_types",
+                                            "dietary_tags", "allergens", "regions", "rejected")}
+    kept = 0
+    sample = []
+    with open(final_path + ".tmp", "w", encoding="utf-8") as out:
+        for directory in stage_dirs:
+            for recipe in iter_parts(directory):
+                reasons = rejection_reasons(recipe)
+                if reasons:
+                    counts["rejected"].update(reasons)
+                    continue
+                recipe = finalize_recipe(recipe)
+                line = json.dumps(recipe)
+                out.write(line + "\n")
+                kept += 1
+                if len(sample) < SAMPLE_SIZE:
+                    sample.append(line)
+                for field in ("source", "cuisine", "difficulty"):
+                    counts[field][recipe.get(field, "unknown")] += 1
+                for field in ("meal_types", "dietary_tags", "allergens", "regions"):
+                    counts[field].update(recipe.get(field) or [])
+    os.replace(final_path + ".tmp", final_path)
+    atomic_write(os.path.join(out_dir, "sample_recipes_1k.jsonl"), "".join(s + "\n" for s in sample).encode())
+
+    stats = {
+        "total_recipes": kept,
+        "rejected": dict(counts["rejected"]),
+        "by_source": dict(counts["source"]),
+        "cuisines": dict(counts["cuisine"].most_common()),
+        "difficulty": dict(counts["difficulty"]),
+        "meal_types": dict(counts["meal_types"]),
+        "dietary_tags": dict(counts["dietary_tags"].most_common()),
+        "allergens": dict(counts["allergens"].most_common()),
+        "regions": dict(counts["regions"].most_common()),
+    }
+    atomic_write(os.path.join(out_dir, "dataset_final_stats.json"), json.dumps(stats, indent=2).encode())
+    done = {"stage": "merge", "fingerprint": fingerprint, "records": kept,
+            "seconds": round(time.perf_counter() - start, 2)}
+    atomic_write(done_path, json.dumps(done).encode())
+    return {**done, "status": "ran"}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Enrich raw recipe datasets into final_recipes_enriched.jsonl")
+    parser.add_argument("--raw-dir", default=os.path.join(DATA_DIR, "raw"))
+    parser.add_argument("--work-dir", default=os.path.join(DATA_DIR, "work"), help="Checkpoints and model cache")
+    parser.add_argument("--out-dir", default=os.path.join(DATA_DIR, "processed"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Input records per task / part file")
+    parser.add_argument("--force", nargs="*", choices=STAGES + ["all"], default=[],
+                        help="Redo these stages even if checkpointed")
+    args = parser.parse_args()
+    force = set(STAGES) if "all" in args.force else set(args.force)
+
+    train_path = os.path.join(args.raw_dir, "train.json")
+    food_com_path = os.path.join(args.raw_dir, "food_com_cleaned.jsonl")
+    epi_path = os.path.join(args.raw_dir, "epi_r.csv")
+    for path in (train_path, food_com_path):
+        if not os.path.exists(path):
+            print(f"❌ Error: {path} not found")
+            return 1
+    os.makedirs(args.work_dir, exist_ok=True)
+    artifact = os.path.join(args.work_dir, "cuisine_classifier.pkl")
+    report = {}
+
+    print("🧠 cuisine_model")
+    if "cuisine_model" in force and os.path.exists(artifact + ".json"):
+        os.remove(artifact + ".json")
+    start = time.perf_counter()
+    model = load_or_train_cuisine_model(train_path, artifact, workers=args.workers)
+    report["cuisine_model"] = {**model, "seconds": round(time.perf_counter() - start, 2),
+                               "status": "cached" if model["cached"] else "ran"}
+    print(f"   accuracy {model['accuracy']:.1%} over {model['cuisines']} cuisines"
+          f"{' (cached)' if model['cached'] else ''}")
+
+    stage_dirs = []
+    print("🍲 food_com")
+    stage = ChunkedStage("food_com", os.path.join(args.work_dir, "food_com"), food_com_chunk,
+                         chunk_size=args.chunk_size, workers=args.workers,
+                         initializer=init_cuisine_worker, initargs=(artifact,))
+    with open(food_com_path, "r", encoding="utf-8") as f:
+        report["food_com"] = stage.run(f, f"{file_fingerprint(food_com_path)}:{model['key']}",
+                                       force="food_com" in force)
+    stage_dirs.append(stage.directory)
+
+    if os.path.exists(epi_path):
+        print("📖 epicurious")
+        with open(epi_path, "r", encoding="utf-8", newline="") as f:
+            records = iter_csv_records(f)
+            header = next(csv.reader([next(records)]))
+            stage = ChunkedStage("epicurious", os.path.join(args.work_dir, "epicurious"), epicurious_chunk,
+                                 transform_args=(header,), chunk_size=args.chunk_size, workers=args.workers)
+            report["epicurious"] = stage.run(records, file_fingerprint(epi_path), force="epicurious" in force)
+        stage_dirs.append(stage.directory)
+    else:
+        print(f"⚠️  {epi_path} not found, skipping Epicurious")
+
+    print("📦 merge")
+    fingerprint = ":".join(str(report[s].get("fingerprint")) for s in ("food_com", "epicurious") if s in report)
+    upstream_ran = any(report[s]["status"] == "ran" for s in ("food_com", "epicurious") if s in report)
+    report["merge"] = merge(stage_dirs, args.out_dir, fingerprint, os.path.join(args.work_dir, "merge_DONE.json"),
+                            force="merge" in force or upstream_ran)
+
+    print("\n⏱️  Stage timings")
+    for name, result in report.items():
+        extra = ""
+        if "chunks" in result:
+            extra = f"  {result['chunks']} chunks ({result['resumed_chunks']} resumed)"
+        records = f"{result['records']:>9} records" if "records" in result else " " * 17
+        print(f"   {name:<14} {result['status']:<7} {result['seconds']:>8.2f}s  {records}{extra}")
+    atomic_write(os.path.join(args.work_dir, "pipeline_report.json"), json.dumps(report, indent=2).encode())
+    print(f"\n✅ {report['merge']['records']} recipes -> {os.path.join(args.out_dir, 'final_recipes_enriched.jsonl')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Local stand-in for the ScaleDown compression API, for tests and offline dev.
+
+Usage (from backend/):
+    python scripts/fake_scaledown.py --port 8765
+    SCALEDOWN_URL=http://127.0.0.1:8765/compress/raw/ SCALEDOWN_API_KEY=fake PROMPT_COMPRESSION_ENABLED=true uvicorn app.main:app
+
+Mirrors the request shape used by the app ({"context", "prompt", "scaledown"})
+and answers {"compressed_prompt": ...} using the deterministic local compressor
+at half the input size. Requests without an x-api-key header get a 401.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.compression import compress_text_locally, estimate_tokens
+
+
+class FakeScaleDownHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.headers.get("x-api-key"):
+            return self._reply(401, {"detail": "missing api key"})
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._reply(400, {"detail": "invalid json"})
+        context = payload.get("context", "")
+        compressed = compress_text_locally(context, max(1, estimate_tokens(context) // 2))
+        self._reply(200, {
+            "compressed_prompt": compressed,
+            "original_prompt_tokens": estimate_tokens(context),
+            "compressed_prompt_tokens": estimate_tokens(compressed),
+        })
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(port: int = 0):
+    """Start in a daemon thread; returns (server, url). Port 0 picks a free port."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeScaleDownHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/compress/raw/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake ScaleDown compression server")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server, url = start_fake_server(args.port)
+    print(f"🧪 Fake ScaleDown listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
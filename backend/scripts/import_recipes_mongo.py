@@ -9,6 +9,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
+from app.services.recipe_dedup import RecipeDeduper, DEDUP_THRESHOLD
+
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "fitfork")
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,7 +20,26 @@ if not os.path.exists(RECIPES_FILE):
     print(f"❌ Error: {RECIPES_FILE} not found")
     sys.exit(1)
 
-def import_recipes():
+def read_recipes(report_errors: bool = True):
+    """Parsed recipes in file order; unparseable lines are skipped (the same way on every pass)."""
+    with open(RECIPES_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                recipe = json.loads(line.strip())
+            except Exception as e:
+                if report_errors:
+                    print(f"❌ Error parsing line: {e}")
+                continue
+            # Ensure fields are consistent with MongoDBClient search
+            # Dietary tags should be lowercase for easier matching
+            if "dietary_tags" in recipe and isinstance(recipe["dietary_tags"], list):
+                recipe["dietary_tags"] = [t.lower() for t in recipe["dietary_tags"]]
+            # Region partition tags (scripts/enrich_recipes.py); untagged recipes are global
+            recipe["regions"] = [str(r).lower() for r in recipe.get("regions") or []] or ["global"]
+            yield recipe
+
+
+def import_recipes(dedup: bool = True, threshold: float = DEDUP_THRESHOLD):
     client = MongoClient(MONGO_URI)
     db = client.get_database(DB_NAME)
     recipes_collection = db.get_collection("recipes")
@@ -28,45 +49,59 @@ def import_recipes():
     # Check if empty, or if we should just clear it for a clean migration
     # recipes_collection.delete_many({}) 
 
+    # Pass 1: near-duplicate clusters (features only, the recipes aren't held in memory)
+    plan = None
+    if dedup:
+        print("🔍 Finding near-duplicate recipes (MinHash LSH)...")
+        plan = RecipeDeduper(threshold=threshold).plan(read_recipes())
+        stats = plan.stats
+        print(f"🧹 {stats['input']} -> {stats['kept']} recipes ({stats['reduction_pct']}% fewer, "
+              f"{stats['clusters']} clusters) in {stats['seconds']}s")
+
+    # Pass 2: insert canonical recipes, each carrying its duplicates as aliases
     batch = []
     count = 0
     total_imported = 0
 
-    with open(RECIPES_FILE, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                recipe = json.loads(line.strip())
-                # Ensure fields are consistent with MongoDBClient search
-                # Dietary tags should be lowercase for easier matching
-                if "dietary_tags" in recipe and isinstance(recipe["dietary_tags"], list):
-                    recipe["dietary_tags"] = [t.lower() for t in recipe["dietary_tags"]]
-                
-                batch.append(recipe)
-                count += 1
-                
-                if count >= 1000:
-                    recipes_collection.insert_many(batch)
-                    total_imported += count
-                    print(f"✅ Imported {total_imported} recipes...")
-                    batch = []
-                    count = 0
-            except Exception as e:
-                print(f"❌ Error parsing line: {e}")
+    for index, recipe in enumerate(read_recipes(report_errors=plan is None)):
+        if plan is not None:
+            if not plan.is_canonical(index):
+                continue
+            if index in plan.aliases:
+                recipe["aliases"] = plan.aliases[index]
+
+        batch.append(recipe)
+        count += 1
+
+        if count >= 1000:
+            recipes_collection.insert_many(batch)
+            total_imported += count
+            print(f"✅ Imported {total_imported} recipes...")
+            batch = []
+            count = 0
 
     if batch:
         recipes_collection.insert_many(batch)
         total_imported += count
         print(f"✅ Finished! Imported total: {total_imported} recipes.")
 
-    # Create indexes
+    # Create indexes (same registry as scripts/migrate_indexes.py)
+    from app.db.indexes import apply_indexes
     print("🧠 Creating search indexes...")
-    recipes_collection.create_index([("dietary_tags", 1)])
-    recipes_collection.create_index([("allergens", 1)])
-    recipes_collection.create_index([
-        ("title", "text"),
-        ("description", "text")
-    ])
-    print("✨ Indexes created.")
+    report = apply_indexes(db)
+    print(f"✨ Indexes ready: {report['recipes']}")
+
+    # Bump the corpus version so running API workers drop their recipe caches
+    import time
+    version = str(int(time.time() * 1000))
+    db.get_collection("meta").update_one({"_id": "recipes"}, {"$set": {"version": version}}, upsert=True)
+    print(f"🔖 Corpus version bumped to {version}.")
 
 if __name__ == "__main__":
-    import_recipes()
+    import argparse
+    parser = argparse.ArgumentParser(description="Import recipes JSONL into MongoDB")
+    parser.add_argument("--no-dedup", action="store_true", help="import every recipe, duplicates included")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="estimated Jaccard above which two recipes are one dish")
+    args = parser.parse_args()
+    import_recipes(dedup=not args.no_dedup, threshold=args.dedup_threshold)
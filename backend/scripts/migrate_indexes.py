@@ -0,0 +1,47 @@
+"""
+Apply the declarative index registry (app/db/indexes.py) to the database.
+
+Usage (from backend/):
+    python scripts/migrate_indexes.py              # create missing indexes
+    python scripts/migrate_indexes.py --dry-run    # show what would change
+    python scripts/migrate_indexes.py --drop-unknown
+"""
+import argparse
+import os
+import sys
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+
+from app.db.indexes import apply_indexes
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "fitfork")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply FitFork MongoDB indexes")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without applying them")
+    parser.add_argument("--drop-unknown", action="store_true", help="drop indexes not in the registry")
+    args = parser.parse_args()
+
+    db = MongoClient(MONGO_URI).get_database(DB_NAME)
+    report = apply_indexes(db, dry_run=args.dry_run, drop_unknown=args.drop_unknown)
+
+    failed = False
+    for collection, result in report.items():
+        print(f"📚 {collection}")
+        for key in ("created", "existing", "dropped"):
+            if result[key]:
+                print(f"   {key}: {', '.join(result[key])}")
+        for error in result["errors"]:
+            failed = True
+            print(f"   ❌ {error}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
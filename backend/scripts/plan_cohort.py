@@ -0,0 +1,65 @@
+"""
+Batch meal plans for a cohort of members (e.g. a partner gym).
+
+Input is JSONL, one member per line: {"member_id": "m-1", "profile": {...UserProfile}}
+or a bare UserProfile object. Plans stream to the output JSONL as they finish
+and are upserted into Mongo's cohort_plans collection unless --no-db.
+
+Usage (from backend/):
+    python scripts/plan_cohort.py members.jsonl --output plans.jsonl --cohort-id gym-42 --days 7 --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import COHORT_WORKERS, COHORT_LLM_CONCURRENCY
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate meal plans for a cohort JSONL")
+    parser.add_argument("input", help="JSONL of member profiles")
+    parser.add_argument("--output", default="-", help="Output JSONL (default: stdout)")
+    parser.add_argument("--cohort-id", help="Cohort ID for Mongo (default: input file name)")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--meals-per-day", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=COHORT_WORKERS)
+    parser.add_argument("--llm-overviews", action="store_true", help="Write overviews with Gemini")
+    parser.add_argument("--llm-concurrency", type=int, default=COHORT_LLM_CONCURRENCY)
+    parser.add_argument("--no-db", action="store_true", help="Only write the output file")
+    args = parser.parse_args()
+
+    from app.services.cohort_planner import CohortPlanner, parse_members
+
+    with open(args.input, encoding="utf-8") as f:
+        members, parse_errors = parse_members(f)
+    cohort_id = None if args.no_db else (args.cohort_id or os.path.splitext(os.path.basename(args.input))[0])
+    planner = CohortPlanner(workers=args.workers, llm_concurrency=args.llm_concurrency)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    summary = {}
+    try:
+        for record in parse_errors:
+            out.write(json.dumps(record) + "\n")
+        for record in planner.run(members, args.days, args.meals_per_day, cohort_id, args.llm_overviews):
+            if record["type"] == "summary":
+                summary = record
+                continue
+            out.write(json.dumps(record) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"🏋️  {summary['plans']} plans ({summary['errors'] + len(parse_errors)} errors) for "
+        f"{summary['members']} members in {summary['buckets']} buckets: {summary['seconds']}s, "
+        f"{summary['plans_per_second']} plans/s, {summary['written']} written to Mongo",
+        file=sys.stderr,
+    )
+    return 0 if summary["plans"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 from dotenv import load_dotenv
@@ -37,6 +38,869 @@ def test_mongodb_persistence():
     else:
         print("[FAILURE] MongoDB Persistence Failed!")
 
+def test_nutrition_batch():
+    print("\n--- Testing Batch Nutrition (NumPy vs scalar) ---")
+    from app.services.nutrition import calculate_nutrition_profile, calculate_nutrition_profiles_batch
+    profiles = [
+        UserProfile(height_cm=180, weight_kg=75, age=30, gender="male",
+                    activity_level="moderately_active", goal="weight_loss"),
+        UserProfile(height_cm=160, weight_kg=48, age=70, gender="female",
+                    activity_level="couch_potato", goal="unknown_goal"),
+    ]
+    batch = calculate_nutrition_profiles_batch(profiles)
+    assert batch == [calculate_nutrition_profile(p).model_dump() for p in profiles]
+
+    from pydantic import ValidationError
+    from app.core.config import NUTRITION_BATCH_MAX_PROFILES
+    from app.models.schemas import NutritionBatchRequest
+    try:
+        NutritionBatchRequest(profiles=[profiles[0]] * (NUTRITION_BATCH_MAX_PROFILES + 1))
+        raise AssertionError("oversized batch accepted")
+    except ValidationError:
+        pass
+    print("[SUCCESS] Batch nutrition matches scalar path!")
+
+class _FakeCaches:
+    def __init__(self):
+        self.created, self.deleted = [], []
+
+    def create(self, model, config):
+        name = f"cachedContents/fake-{len(self.created)}"
+        self.created.append(name)
+        return type("Cached", (), {"name": name})()
+
+    def update(self, name, config):
+        pass
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+def test_gemini_context_cache():
+    print("\n--- Testing Gemini Context Cache (fake client) ---")
+    from app.services.context_cache import GeminiContextCache
+    fake = type("FakeClient", (), {})()
+    fake.caches = _FakeCaches()
+    cache = GeminiContextCache(fake, "gemini-test", ttl_seconds=3600, max_entries=1, min_chars=10)
+    bucket = ((), (), ("Italian",), "bulking")
+    block = "Available Recipes:\n- Pasta (ID: 1): 500 kcal"
+
+    first = cache.get_or_create(bucket, "v1", "system", block)
+    assert cache.get_or_create(bucket, "v1", "system", block) == first
+    assert cache.hits == 1 and cache.creates == 1
+    # New corpus version -> new cache, the old one is deleted remotely
+    second = cache.get_or_create(bucket, "v2", "system", block)
+    assert second != first and fake.caches.deleted == [first]
+    # Too small to be worth caching
+    assert cache.get_or_create(bucket, "v2", "", "") is None
+
+    # Concurrent misses on one key share a single remote create
+    import threading, time
+    slow = _FakeCaches()
+    create = slow.create
+    slow.create = lambda model, config: (time.sleep(0.05), create(model, config))[1]
+    fake.caches = slow
+    cache = GeminiContextCache(fake, "gemini-test", ttl_seconds=3600, min_chars=10)
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(cache.get_or_create(bucket, "v1", "system", block)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(slow.created) == 1 and names == slow.created * 4
+    print("[SUCCESS] Context cache reuse and lifetime management work!")
+
+def test_day_stream_parser():
+    print("\n--- Testing Incremental Day Parser ---")
+    import json
+    from app.services.plan_stream import DayStreamParser
+    plan = {
+        "overview": "Tricky \"days\": [{ text }]",
+        "days": [{"day_number": i, "total_calories": 2000, "meals": []} for i in range(1, 8)],
+    }
+    text = json.dumps(plan, indent=2)
+    parser = DayStreamParser()
+    seen = []
+    for i in range(0, len(text), 5):
+        seen.extend(parser.feed(text[i:i + 5]))
+    assert seen == plan["days"]
+    print("[SUCCESS] Days emitted as soon as they close!")
+
+def test_plan_repair():
+    print("\n--- Testing Local Meal Plan JSON Repair ---")
+    from app.services.plan_repair import repair_json, validate_days, fill_missing_days
+    meal = '{"meal_type": "Lunch", "recipe_id": "1", "recipe_title": "Dal", "calories": 500, "protein_g": 20, "carbs_g": 60, "fat_g": 10}'
+    truncated = '```json\n{"overview": "ok", "days": [{"day_number": 1, "meals": [' + meal + ']}, {"day_number": 2, "meals": [{"meal_ty'
+    data = repair_json(truncated)
+    valid, missing = validate_days(data["days"], days=3)
+    assert list(valid) == [1] and missing == [2, 3]
+    assert valid[1].total_calories == 500  # derived locally
+    assert [d.day_number for d in fill_missing_days(valid, 3)] == [1, 2, 3]
+    print("[SUCCESS] Truncated plan repaired, only missing days flagged!")
+
+def test_prompt_builder_cache():
+    print("\n--- Testing Memoized Prompt Assembly ---")
+    from app.core.prompt_builder import PromptBuilder
+    from app.core.prompts import build_augmented_query, build_meal_plan_system_prompt
+    from app.services.nutrition import calculate_nutrition_profile
+    builder = PromptBuilder(maxsize=8)
+    profile = UserProfile(height_cm=170, weight_kg=68, age=33, gender="female", activity_level="very_active",
+                          goal="cutting", dietary_restrictions=["vegetarian"], cuisine_preferences=["Thai"])
+    targets = calculate_nutrition_profile(profile)
+
+    first = builder.meal_plan_system_prompt(profile, targets, 7)
+    assert builder.meal_plan_system_prompt(profile, targets, 7) is first
+    assert first == build_meal_plan_system_prompt(profile, targets, 7)
+    assert builder.system_prompts.stats()["hits"] == 1
+
+    vegan = profile.model_copy(update={"dietary_restrictions": ["vegan"]})
+    assert "vegan" in builder.meal_plan_system_prompt(vegan, targets, 7)
+    assert builder.system_prompts.stats()["misses"] == 2
+
+    # Precompiled noise patterns strip the boilerplate, case-insensitively
+    query = build_augmented_query("I WANT A 5-day meal plan with 4 meals per day, spicy noodles for me", profile, targets)
+    assert "meal" not in query.lower() and "for me" not in query
+    assert "spicy noodles" in query and query.endswith("cutting Thai vegetarian")
+    print("[SUCCESS] Cached prompts reused; a profile change misses!")
+
+def test_finalize_nutrition_targets():
+    print("\n--- Testing Server-Side Nutrition Targets ---")
+    from app.services.meal_planner import MealPlannerService
+    from app.services.nutrition import calculate_nutrition_profile
+    profile = UserProfile(height_cm=175, weight_kg=70, age=40, gender="female",
+                          activity_level="lightly_active", goal="maintenance")
+    targets = calculate_nutrition_profile(profile)
+    meal = {"meal_type": "Lunch", "recipe_id": "1", "recipe_title": "Dal", "calories": 500,
+            "protein_g": 20, "carbs_g": 60, "fat_g": 10}
+    echoed = {"overview": "ok", "days": [{"day_number": 1, "total_calories": 500, "meals": [meal]}],
+              "nutrition_targets": {k: 0 for k in targets.model_dump()}}
+    plan, filled = MealPlannerService()._finalize({"days": 1, "nut_profile": targets}, echoed)
+    assert plan.nutrition_targets == targets and filled == []
+    print("[SUCCESS] Zeroed model targets replaced by the computed ones!")
+
+def test_prompt_compression():
+    print("\n--- Testing Local Prompt Compression ---")
+    from app.services.compression import PromptCompressor, estimate_tokens
+    compressor = PromptCompressor(enabled=True, api_key=None, recipe_budget=120, history_budget=40)
+    recipes = [{"id": f"r{i}", "title": f"Dish {i % 10}", "calories": 400 + i, "protein_g": 20, "carbs_g": 50, "fat_g": 12}
+               for i in range(30)]
+    block = compressor.compress_recipes(recipes, "x" * 4000)
+    assert estimate_tokens(block) <= 120 and "#r0 " in block and "#r10 " not in block  # deduped by title
+    history = "\n".join(f"user: I   like dish {i}" for i in range(50))
+    assert estimate_tokens(compressor.compress_history(history)) <= 40
+    assert compressor.compress_history(history).endswith("dish 49")  # newest turns survive
+    assert compressor.stats()["tokens_saved"] > 0
+    print("[SUCCESS] Prompts compressed within budget!")
+
+def test_remote_history_compression():
+    print("\n--- Testing ScaleDown History Compression (fake server) ---")
+    import requests
+    from app.core.resilience import Deadline
+    from app.services import compression
+    from app.services.compression import PromptCompressor, estimate_tokens
+    from scripts.fake_scaledown import start_fake_server
+    history = "\n".join(f"user: turn {i} about lentils and rice" for i in range(40))
+    server, url = start_fake_server()
+    try:
+        compressor = PromptCompressor(enabled=True, api_key="fake", url=url, timeout=2, history_budget=200)
+        # Success: the fake halves the text, which fits the budget as-is
+        compressed = compressor.compress_history(history)
+        assert compressor.remote_calls == 1 and compressor.remote_failures == 0
+        assert estimate_tokens(compressed) <= 200 and compressed.endswith("turn 39 about lentils and rice")
+        assert compressor.compress_history(history) == compressed and compressor.remote_calls == 1  # cached
+    finally:
+        server.shutdown()
+
+    # Timeout and unusable responses fall back to the local compressor
+    def timeout(*args, **kwargs):
+        raise requests.Timeout("read timed out")
+    original = compression.requests.post
+    compression.requests.post = timeout
+    try:
+        compressor = PromptCompressor(enabled=True, api_key="fake", url=url, timeout=2, history_budget=100)
+        assert estimate_tokens(compressor.compress_history(history)) <= 100 and compressor.remote_failures == 1
+        compression.requests.post = lambda *args, **kwargs: type("Resp", (), {
+            "raise_for_status": lambda self: None, "json": lambda self: {"unexpected": 1}})()
+        assert compressor.compress_history(history + "\nuser: more") and compressor.remote_failures == 2
+
+        # A deadline that can't cover the remote timeout skips the call and doesn't cache
+        compression.requests.post = timeout
+        compressor = PromptCompressor(enabled=True, api_key="fake", url=url, timeout=2, history_budget=100)
+        compressor.compress_history(history, deadline=Deadline(0.5))
+        assert compressor.remote_calls == 0 and compressor.remote_skipped == 1 and compressor.cache.stats()["size"] == 0
+    finally:
+        compression.requests.post = original
+    print("[SUCCESS] Remote compression used when it answers, local fallback otherwise!")
+
+def test_request_profiler():
+    print("\n--- Testing Sampling Request Profiler ---")
+    import time
+    from app.core.profiling import StackSampler
+    sampler = StackSampler(interval_ms=2, include=os.path.abspath("."))
+    sampler.start()
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        sum(i * i for i in range(1000))
+    sampler.stop()
+    doc = sampler.to_speedscope("busy loop")
+    assert sampler.sample_count > 0 and doc["profiles"][0]["type"] == "sampled"
+    names = {frame["name"] for frame in doc["shared"]["frames"]}
+    assert "test_request_profiler" in names
+
+    # Through the middleware: the sampler is stopped off the event loop and the profile stored
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.core.profiling import ProfileStore, ProfilingMiddleware
+    app, store = FastAPI(), ProfileStore()
+    app.get("/busy")(lambda: {"ok": True})
+    app.add_middleware(ProfilingMiddleware, is_admin=lambda auth: False, store=store, sample_rate=1.0, interval_ms=50)
+    res = TestClient(app).get("/busy")
+    assert res.status_code == 200 and store.get(res.headers["X-Profile-ID"]) is not None
+    print(f"[SUCCESS] {sampler.sample_count} stack samples captured in speedscope format!")
+
+def test_tracing_summary():
+    print("\n--- Testing Tracing Spans and Route Summary ---")
+    import time
+    from app.core.tracing import Tracer
+    tracer = Tracer(enabled=True, exporter="none")
+    for _ in range(3):
+        with tracer.span("POST /meal-plan", **{"span.kind": "server"}):
+            with tracer.span("recipes.candidates"):
+                with tracer.span("mongo.find_recipes"):
+                    time.sleep(0.002)
+            with tracer.span("gemini.generate"):
+                time.sleep(0.01)
+    with tracer.span("warmup.candidates"):  # background root, e.g. from the warm-up thread
+        with tracer.span("recipes.candidates"):
+            pass
+    assert list(tracer.summary.view()) == ["POST /meal-plan"]
+    summary = tracer.summary.view()["POST /meal-plan"]
+    assert summary["requests"] == 3 and summary["slowest_stage"] == "gemini.generate"
+    # Self time: the candidates wrapper doesn't re-count the Mongo query it contains
+    assert summary["stages"]["recipes.candidates"]["avg_ms"] < summary["stages"]["mongo.find_recipes"]["avg_ms"]
+    print(f"[SUCCESS] Slowest stage: {summary['slowest_stage']} ({summary['stages']['gemini.generate']['avg_ms']}ms avg)")
+
+def test_cohort_chunk_planning():
+    print("\n--- Testing Local Cohort Planning ---")
+    from app.services.cohort_planner import parse_members, _plan_chunk
+    from app.services.nutrition import calculate_nutrition_profiles_batch
+    profile = {"height_cm": 180, "weight_kg": 80, "age": 30, "gender": "male",
+               "activity_level": "moderately_active", "goal": "bulking"}
+    members, errors = parse_members([json.dumps({"member_id": "m-1", "profile": profile}), json.dumps(profile), "{oops"])
+    assert [m.member_id for m in members] == ["m-1", "2"] and errors[0]["line"] == 3
+    pool = [{"id": f"r{i}", "title": f"Dish {i}", "calories": 300 + 40 * i, "protein_g": 20 + i,
+             "carbs_g": 40, "fat_g": 15, "meal_types": ["breakfast" if i % 3 == 0 else "dinner"]} for i in range(20)]
+    targets = calculate_nutrition_profiles_batch([m.profile for m in members])
+    results = _plan_chunk(([(m.member_id, m.profile.goal, t) for m, t in zip(members, targets)], pool, 5, 3))
+    plan = results[0]["plan"]
+    assert all(r["type"] == "plan" for r in results) and len(plan["days"]) == 5
+    day_one = [m["recipe_id"] for m in plan["days"][0]["meals"]]
+    assert len(set(day_one)) == 3  # no repeats within a day
+    assert abs(plan["days"][0]["total_calories"] - targets[0]["target_calories"]) < 0.35 * targets[0]["target_calories"]
+    print("[SUCCESS] Cohort members planned locally from one shared pool!")
+
+def test_ical_export():
+    print("\n--- Testing iCalendar Export ---")
+    from datetime import datetime
+    from app.services.ical import iter_plan_ics, plan_etag
+    meal = {"meal_type": "Dinner", "recipe_title": "Dal, rice; " + "and a long garnish " * 5,
+            "calories": 600, "protein_g": 30, "carbs_g": 70, "fat_g": 15}
+    plan = {"days": [{"day_number": 2, "meals": [meal]}]}
+    ics = "".join(iter_plan_ics(plan, "u1", datetime(2026, 3, 1), datetime(2026, 2, 28)))
+    assert ics.startswith("BEGIN:VCALENDAR\r\n") and ics.endswith("END:VCALENDAR\r\n")
+    assert "UID:u1-d2-0-dinner@fitfork" in ics and "DTSTART:20260302T190000" in ics
+    assert "Dal\\, rice\\;" in ics
+    assert max(len(line.encode("utf-8")) for line in ics.split("\r\n")) <= 75
+    assert plan_etag(plan, datetime(2026, 3, 1)) != plan_etag(plan, datetime(2026, 3, 2))
+    print("[SUCCESS] Plan rendered as folded RFC 5545 events with stable UIDs!")
+
+def test_recipe_cache_invalidation():
+    print("\n--- Testing Recipe Cache Corpus Invalidation ---")
+    from app.services import recipe_cache as recipe_cache_module
+    from app.services.recipe_cache import RecipeCache
+    db = recipe_cache_module.mongodb_client
+    version, fetched = ["v1"], []
+
+    def by_ids(ids):
+        fetched.append(list(ids))
+        return [{"id": rid, "title": f"{rid} {version[0]}"} for rid in ids if rid != "gone"]
+
+    db.get_corpus_version = lambda: version[0]
+    db.get_recipes_by_ids = by_ids
+    try:
+        cache = RecipeCache(maxsize=10)
+        assert [r["id"] for r in cache.get_many(["a", "b", "a", "gone"])] == ["a", "b"]
+        assert cache.get("b")["title"] == "b v1" and fetched == [["a", "b", "gone"]]  # second read: cached
+        version[0] = "v2"
+        assert cache.get("b")["title"] == "b v2" and fetched[-1] == ["b"]
+        assert cache.stats()["invalidations"] == 1 and cache.stats()["corpus_version"] == "v2"
+    finally:
+        del db.get_corpus_version, db.get_recipes_by_ids
+    print("[SUCCESS] Recipe cache dropped on corpus version change!")
+
+def test_orjson_response_shape():
+    print("\n--- Testing Pre-shaped Recipe JSON ---")
+    import orjson
+    from datetime import datetime
+    from app.core.responses import ORJSONResponse
+    from app.db.mongodb import RECIPE_PROJECTION, shape_recipe
+    from app.models.schemas import RecipeResult
+    # Mongo returns `id` as a string and never `_id`
+    assert RECIPE_PROJECTION["_id"] == 0 and RECIPE_PROJECTION["id"] == {"$toString": "$_id"}
+    doc = shape_recipe({"id": "65f0c0ffee", "title": "Miso soup", "calories": 120.5})
+    body = orjson.loads(ORJSONResponse([doc]).body)
+    assert body == [RecipeResult(id="65f0c0ffee", title="Miso soup", calories=120.5).model_dump(mode="json")]
+    saved = ORJSONResponse({"saved_at": datetime(2026, 3, 1, 8, 30), "days": {1: "ok"}}).body
+    assert saved == b'{"saved_at":"2026-03-01T08:30:00","days":{"1":"ok"}}'
+    print("[SUCCESS] Shaped docs serialize exactly like RecipeResult!")
+
+def test_recipe_filters():
+    print("\n--- Testing Structured Recipe Filters ---")
+    from app.db.mongodb import recipe_filter
+    from app.models.schemas import RecipeFilters
+    profile = UserProfile(height_cm=170, weight_kg=65, age=28, gender="female", activity_level="sedentary",
+                          goal="cutting", dietary_restrictions=["Vegetarian"], allergens_to_avoid=["peanuts"])
+    filters = RecipeFilters(min_calories=300, max_calories=600, min_protein_g=25, max_time_minutes=30,
+                            meal_type="Dinner", cuisine="Italian")
+    query = recipe_filter("", profile, filters)
+    assert query["dietary_tags"] == {"$in": ["vegetarian"]} and query["allergens"] == {"$nin": ["peanuts"]}
+    assert query["calories"] == {"$gte": 300, "$lte": 600}
+    assert query["protein_g"] == {"$gte": 25} and query["time_minutes"] == {"$lte": 30}
+    assert "dinner" in query["meal_types"]["$in"] and "italian" in query["cuisine"]["$in"]
+    assert "$text" not in query
+    assert recipe_filter("tofu", profile, None)["$text"] == {"$search": "tofu"}
+    print("[SUCCESS] Structured filters mapped to index-friendly equality and range bounds!")
+
+def test_text_search_paging():
+    print("\n--- Testing Relevance-Ordered Text Search Pages ---")
+    from bson import ObjectId
+    from app.db.mongodb import mongodb_client as db, parse_page_cursor
+    profile = UserProfile(height_cm=170, weight_kg=65, age=28, gender="female", activity_level="sedentary",
+                          goal="cutting")
+    ids = [str(ObjectId()) for _ in range(3)]
+    pipelines = []
+
+    def aggregate(pipeline):
+        pipelines.append(pipeline)
+        return [{"id": rid, "title": rid, "_score": score} for rid, score in zip(ids, (2.5, 1.5, 1.5))]
+
+    original = db.recipes_collection
+    db.recipes_collection = type("Recipes", (), {"aggregate": staticmethod(aggregate)})()
+    try:
+        recipes, cursor = db.find_recipes_page("tofu", profile, limit=2)
+        assert [r["id"] for r in recipes] == ids[:2] and "_score" not in recipes[0]
+        assert cursor == f"1.5:{ids[1]}" and parse_page_cursor(cursor) == (1.5, ids[1])
+        assert "$text" in pipelines[0][0]["$match"]
+        assert {"$sort": {"_score": -1, "_id": 1}} in pipelines[0] and {"$limit": 3} in pipelines[0]
+        db.find_recipes_page("tofu", profile, limit=2, after=cursor)
+        resume = pipelines[1][2]["$match"]["$or"]
+        assert resume == [{"_score": {"$lt": 1.5}}, {"_score": 1.5, "_id": {"$gt": ObjectId(ids[1])}}]
+        try:
+            db.find_recipes_page("tofu", profile, limit=2, after=ids[1])  # an _id-order cursor
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    finally:
+        db.recipes_collection = original
+    assert parse_page_cursor(ids[0]) == (None, ids[0])
+    assert parse_page_cursor("high:" + ids[0]) is None and parse_page_cursor(":" + ids[0]) is None
+    assert parse_page_cursor("1.5:nope") is None
+    print("[SUCCESS] Text pages sorted by (score, _id) and resumed from the score cursor!")
+
+def test_title_suggest():
+    print("\n--- Testing Title Typeahead Index ---")
+    from app.services.suggest import TitleIndex, normalize_title
+    docs = [
+        {"id": "a", "title": "Chicken Tikka Masala", "dietary_tags": [], "allergens": ["dairy"], "rating": 4.5},
+        {"id": "b", "title": "Grilled Chicken Salad", "dietary_tags": ["gluten-free"], "allergens": []},
+        {"id": "c", "title": "Chickpea Curry", "dietary_tags": ["vegan", "vegetarian"], "allergens": []},
+        {"id": "d", "title": "Crème Brûlée", "dietary_tags": ["vegetarian"], "allergens": ["dairy", "eggs"]},
+    ]
+    index = TitleIndex(docs, {"b": 3, "c": 1}, "v1")
+    assert normalize_title("Crème  Brûlée!") == "creme brulee"
+    assert [r["id"] for r in index.search("chick", 5)] == ["c", "a", "b"]  # title starts first, by popularity
+    assert [r["id"] for r in index.search("chicken", 5)] == ["a", "b"]
+    assert [r["id"] for r in index.search("chick", 5, allergens=("dairy",))] == ["c", "b"]
+    assert [r["id"] for r in index.search("c", 5, diets=("vegetarian",))] == ["c", "d"]
+    assert index.search("chick", 5, diets=("keto",)) == []
+    assert index.search("creme b", 1) == [{"id": "d", "title": "Crème Brûlée"}]
+    print("[SUCCESS] Prefix index ranked, filtered and deduplicated suggestions!")
+
+def test_recipe_dedup():
+    print("\n--- Testing MinHash Recipe Dedup ---")
+    from app.services.recipe_dedup import dedupe_recipes, recipe_features
+    ingredients = ["2 cups flour", "1 cup sugar", "2 large eggs", "1/2 cup butter", "1 tsp vanilla",
+                   "1 cup chocolate chips", "1 tsp baking soda", "1/2 tsp salt"]
+    recipes = [
+        {"title": "Chocolate Chip Cookies", "ingredients": ingredients, "source": "food.com"},
+        {"title": "Best Chocolate Chip Cookies", "ingredients": ["3 cups flour"] + ingredients[1:],
+         "calories": 210, "protein_g": 3, "source": "epicurious"},
+        {"title": "Chickpea Curry", "ingredients": ["1 can chickpeas", "1 onion", "2 tbsp curry powder",
+                                                    "1 can coconut milk"], "source": "yummly"},
+    ]
+    assert "i:flour" in recipe_features(recipes[0]) and "t:cookie" in recipe_features(recipes[0])
+    kept, stats = dedupe_recipes(recipes)
+    assert [r["title"] for r in kept] == ["Best Chocolate Chip Cookies", "Chickpea Curry"]  # has nutrition
+    assert kept[0]["aliases"] == [{"title": "Chocolate Chip Cookies", "source": "food.com"}]
+    assert stats["removed"] == 1 and stats["clusters"] == 1
+    print("[SUCCESS] Near-duplicates clustered with one canonical recipe and aliases!")
+
+def test_enrichment_stage_resume():
+    print("\n--- Testing Enrichment Pipeline Stages ---")
+    import tempfile
+    from app.services.enrichment import (ChunkedStage, detect_allergens, epicurious_chunk, estimate_difficulty,
+                                         finalize_recipe, iter_parts, rejection_reasons)
+    assert detect_allergens(["2 cups milk", "1 egg"]) == ["dairy", "eggs"]
+    assert estimate_difficulty(3, 20, 4) == "easy" and estimate_difficulty(15, 90, 14) == "hard"
+    header = ["title", "rating", "calories", "protein", "fat", "sodium", "vegan", "thai", "dessert"]
+    lines = [f"Dish {i},4.5,300,10,5,100,1,1,0\n" for i in range(7)]
+    with tempfile.TemporaryDirectory() as work:
+        stage = ChunkedStage("epicurious", work, epicurious_chunk, transform_args=(header,), chunk_size=3)
+        assert stage.run(lines, "v1")["records"] == 7
+        os.remove(stage.part_path(1))  # interrupted run
+        resumed = stage.run(lines, "v1", force=False)
+        assert resumed["status"] == "cached"  # _DONE.json still matches
+        os.remove(stage.done_path)
+        resumed = stage.run(lines, "v1")
+        assert resumed["resumed_chunks"] == 2 and resumed["records"] == 7
+        recipes = list(iter_parts(work))
+    with tempfile.TemporaryDirectory() as work:
+        # Pool path: chunks are read as they are submitted, not all up front
+        stage = ChunkedStage("epicurious", work, epicurious_chunk, transform_args=(header,), chunk_size=3, workers=2)
+        read = []
+        source = (read.append(line) or line for line in lines)
+        next(stage._tasks(source, {"chunks": 0, "resumed_chunks": 0, "records": 0}))
+        assert len(read) == 3
+        assert stage.run(iter(lines), "v1")["records"] == 7
+        assert list(iter_parts(work)) == recipes
+    assert [r["id"] for r in recipes] == [f"epi_{i}" for i in range(7)]
+    assert recipes[0]["cuisine"] == "thai" and recipes[0]["dietary_tags"] == ["vegan"]
+    assert rejection_reasons(recipes[0]) == ["no_ingredients"]
+    assert finalize_recipe(recipes[0])["calories"] == 300.0
+    print("[SUCCESS] Enrichment stage resumed from its part files!")
+
+def test_candidate_pool():
+    print("\n--- Testing Candidate Pool Cache ---")
+    import threading, time
+    from app.services import candidate_pool
+    from app.services.candidate_pool import CandidatePoolCache
+    db = candidate_pool.mongodb_client
+    version, queries = ["v1"], []
+
+    def find_regional(terms, profile, limit):
+        queries.append((terms, profile.region))
+        time.sleep(0.05)
+        return ([{"id": f"{profile.region}-{version[0]}", "title": "Dish", "calories": 500, "extra": 1}],
+                {"region": profile.region, "regional": 1, "widened": False})
+
+    db.get_corpus_version = lambda: version[0]
+    db.find_recipes_regional = find_regional
+    try:
+        pools = CandidatePoolCache()
+        profile = UserProfile(height_cm=170, weight_kg=65, age=28, gender="female", activity_level="sedentary",
+                              goal="cutting", region="asia")
+        # Cold bucket hit by several requests at once: one Mongo query
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pools.get_candidates("tofu", profile)))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(queries) == 1 and all(r == [{"id": "asia-v1", "title": "Dish", "calories": 500}] for r in results)
+        # Warm hit: no query
+        pools.get_candidates("tofu", profile)
+        assert len(queries) == 1
+        # Region is part of the key
+        europe = profile.model_copy(update={"region": "europe"})
+        assert pools.get_candidates("tofu", europe)[0]["id"] == "europe-v1" and len(queries) == 2
+        # New corpus version: stale pool served while the background rebuild runs
+        version[0] = "v2"
+        assert pools.get_candidates("tofu", profile)[0]["id"] == "asia-v1"
+        pools._executor.submit(lambda: None).result()  # single worker: drains the rebuild
+        assert pools.get_candidates("tofu", profile)[0]["id"] == "asia-v2" and pools.background_rebuilds == 1
+        assert pools.stats()["regions"]["asia"]["builds"] == 2
+    finally:
+        del db.get_corpus_version, db.find_recipes_regional
+    print("[SUCCESS] Pool single-flights cold misses, hits, splits by region, rebuilds on new corpus!")
+
+def test_region_partitioning():
+    print("\n--- Testing Region-Partitioned Retrieval ---")
+    from bson import ObjectId
+    from app.db.mongodb import MongoDBClient, recipe_filter, region_partition, retrieval_bucket
+    from app.services.candidate_pool import CandidatePoolCache
+
+    class FakeRecipes:
+        def __init__(self, docs):
+            self.docs, self.queries = docs, []
+
+        def find(self, query, projection):
+            self.queries.append(query)
+            wanted = query.get("regions")
+            wanted = wanted["$in"] if isinstance(wanted, dict) else [wanted]
+            skip = query.get("_id", {}).get("$nin", [])
+            hits = [{"id": str(d["_id"]), "title": d["title"]} for d in self.docs
+                    if d["_id"] not in skip and any(r in wanted for r in (d.get("regions") or [None]))]
+            return type("Cursor", (), {"limit": lambda _, n: hits[:n]})()
+
+    profile = UserProfile(height_cm=170, weight_kg=65, age=28, gender="female", activity_level="sedentary",
+                          goal="cutting", region="Middle East")
+    assert region_partition(profile) == "middle_east"
+    assert region_partition(profile.model_copy(update={"region": "global"})) is None
+    assert retrieval_bucket(profile) != retrieval_bucket(profile.model_copy(update={"region": "asia"}))
+    assert recipe_filter("", profile, None, "asia")["regions"] == "asia"
+
+    docs = [{"_id": ObjectId(), "title": "Shakshuka", "regions": ["middle_east", "global"]},
+            {"_id": ObjectId(), "title": "Za'atar flatbread", "regions": ["middle_east"]},
+            {"_id": ObjectId(), "title": "Pad thai", "regions": ["asia"]},
+            {"_id": ObjectId(), "title": "Omelette", "regions": ["global"]},
+            {"_id": ObjectId(), "title": "Toast"}]  # untagged counts as global
+    client = MongoDBClient(uri="mongodb://127.0.0.1:1", connect=False)
+    client.recipes_collection = FakeRecipes(docs)
+    recipes, info = client.find_recipes_regional("", profile, limit=10, min_results=2)
+    assert [r["title"] for r in recipes] == ["Shakshuka", "Za'atar flatbread"] and not info["widened"]
+    recipes, info = client.find_recipes_regional("", profile, limit=10, min_results=5)
+    assert [r["title"] for r in recipes] == ["Shakshuka", "Za'atar flatbread", "Omelette", "Toast"]
+    assert info == {"region": "middle_east", "regional": 2, "widened": True}
+
+    pools = CandidatePoolCache()
+    pools._record_region(info, len(recipes), 4.0)
+    assert pools.stats()["regions"]["middle_east"] == {"builds": 1, "widened_pct": 100.0,
+                                                       "regional_share": 0.5, "avg_build_ms": 4.0}
+    print("[SUCCESS] Region partition searched first, widened to global only when short!")
+
+def test_deadline_fallback():
+    print("\n--- Testing Deadline-Aware Planning ---")
+    import threading, time
+    from types import SimpleNamespace
+    from app.core.resilience import Deadline
+    from app.services.meal_planner import MealPlannerService
+    from app.services.nutrition import calculate_nutrition_profile
+    profile = UserProfile(height_cm=180, weight_kg=80, age=30, gender="male",
+                          activity_level="moderately_active", goal="bulking")
+    pool = [{"id": f"r{i}", "title": f"Dish {i}", "calories": 300 + 40 * i, "protein_g": 20 + i,
+             "carbs_g": 40, "fat_g": 15, "meal_types": ["breakfast" if i % 3 == 0 else "dinner"]} for i in range(20)]
+    prep = {"query": "", "profile": profile, "days": 3, "nut_profile": calculate_nutrition_profile(profile),
+            "recipes": pool, "final_prompt": "", "system_prompt": ""}
+    planner = MealPlannerService()
+    planner.client, planner.context_cache = object(), None
+    planner._prepare = lambda *args: prep
+
+    plan = planner.generate_interactive_meal_plan("", profile, days=3, deadline=Deadline(2))
+    assert (plan.generation.path, plan.generation.reason) == ("local", "budget")
+    assert len(plan.days) == 3 and plan.nutrition_targets is not None and "retrieval" in plan.generation.stages
+
+    planner.llm_estimate = 0.05
+    planner._generate = lambda prep, stream=False: time.sleep(0.5)
+    start = time.monotonic()
+    plan = planner.generate_interactive_meal_plan("", profile, days=3, deadline=Deadline(1.2))
+    assert plan.generation.reason == "llm_timeout" and time.monotonic() - start < 1.0  # stopped waiting at 0.2s
+    assert planner.llm_estimate > 0.05  # the timeout fed the estimate
+    # The abandoned call still holds its slot, so a full pool goes local without queueing
+    planner.max_in_flight = 1
+    assert planner.generate_interactive_meal_plan("", profile, days=3).generation.reason == "llm_saturated"
+    planner.max_in_flight = 8
+
+    def fail(prep, stream=False):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+    planner._generate = fail
+    for _ in range(2):
+        assert planner.generate_interactive_meal_plan("", profile, days=3).generation.reason == "llm_error"
+    assert planner.breaker.state == "open"  # timeout + two errors
+    assert planner.generate_interactive_meal_plan("", profile, days=3).generation.reason == "circuit_open"
+
+    planner.breaker.record_success()
+    text = json.dumps({"overview": "LLM plan", "days": [d.model_dump() for d in plan.days]})
+    planner._generate = lambda prep, stream=False: SimpleNamespace(text=text)
+    plan = planner.generate_interactive_meal_plan("", profile, days=3)
+    assert plan.generation.path == "llm" and plan.overview == "LLM plan"
+
+    # Day 3 missing and not recovered by the re-ask -> filled locally, reported as partial
+    two_days = json.dumps({"overview": "LLM plan", "days": [d.model_dump() for d in plan.days[:2]]})
+    planner._generate = lambda prep, stream=False: SimpleNamespace(text=two_days)
+    plan = planner.generate_interactive_meal_plan("", profile, days=3)
+    assert (plan.generation.path, plan.generation.reason) == ("partial", "local_fill") and len(plan.days) == 3
+
+    def broken_stream(prep, stream=False):
+        yield SimpleNamespace(text=text[:len(text) // 2])
+        raise ConnectionError("stream reset")
+    planner.breaker.record_success()
+    planner._generate = broken_stream
+    *_, (kind, plan) = planner.stream_interactive_meal_plan("", profile, days=3)
+    assert kind == "plan" and (plan.generation.path, plan.generation.reason) == ("partial", "stream_error")
+
+    # A stream that stalls after its first chunk is cut off at the budget, not waited on
+    release = threading.Event()
+    def stalled_stream(prep, stream=False):
+        yield SimpleNamespace(text='{"overview": "LLM plan", "days": [' + json.dumps(plan.days[0].model_dump()) + ",")
+        release.wait(5)
+        yield SimpleNamespace(text="]}")
+    planner.breaker.record_success()
+    planner._generate = stalled_stream
+    start = time.monotonic()
+    events = list(planner.stream_interactive_meal_plan("", profile, days=3, deadline=Deadline(1.2)))
+    release.set()
+    kind, plan = events[-1]
+    assert time.monotonic() - start < 1.0 and events[0][0] == "day" and events[0][1].day_number == 1
+    assert (plan.generation.path, plan.generation.reason) == ("partial", "llm_timeout") and len(plan.days) == 3
+    assert planner.breaker.failures >= 1  # the stalled read counted against the breaker
+    assert planner.stats()["paths"] == {"local:budget": 1, "local:llm_timeout": 1, "local:llm_error": 2,
+                                        "local:circuit_open": 1, "local:llm_saturated": 1, "llm": 1, "partial:local_fill": 1,
+                                        "partial:stream_error": 1, "partial:llm_timeout": 1}
+
+    from pydantic import ValidationError
+    from app.models.schemas import MealPlanRequest
+    from app.services.meal_fitting import meal_slots
+    assert len(meal_slots(6)) == 6
+    for bad in (0, 99):
+        try:
+            MealPlanRequest(user_profile=profile, meals_per_day=bad)
+            raise AssertionError(f"meals_per_day={bad} accepted")
+        except ValidationError:
+            pass
+    try:
+        meal_slots(0)
+        raise AssertionError("meal_slots(0) returned slots")
+    except ValueError:
+        pass
+    print("[SUCCESS] Planner fell back locally on budget, timeout and open circuit!")
+
+def test_meal_swap():
+    print("\n--- Testing PATCH /meal-plan/latest/meals ---")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import endpoints
+    from app.api.auth import get_current_user
+    from app.models.schemas import User
+    from app.services.nutrition import calculate_nutrition_profile
+
+    planned = UserProfile(height_cm=180, weight_kg=80, age=30, gender="male",
+                          activity_level="moderately_active", goal="bulking")
+    edited = planned.model_copy(update={"weight_kg": 55, "goal": "cutting"})
+    meal = lambda kind, rid, kcal: {"meal_type": kind, "recipe_id": rid, "recipe_title": rid, "calories": kcal,
+                                    "protein_g": 40, "carbs_g": 80, "fat_g": 25}
+    plan = {"overview": "", "nutrition_targets": calculate_nutrition_profile(planned).model_dump(),
+            "days": [{"day_number": 1, "total_calories": 2100,
+                      "meals": [meal("Breakfast", "b1", 600), meal("Lunch", "l1", 700), meal("Dinner", "d1", 800)]}]}
+    pool = [{"id": rid, "title": rid, "calories": kcal, "protein_g": 40, "carbs_g": 80, "fat_g": 25,
+             "meal_types": ["dinner"]} for rid, kcal in (("d1", 800), ("d2", 810), ("d3", 900), ("d4", 500))]
+    seen, saved = [], []
+
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    app.dependency_overrides[get_current_user] = lambda: User(id="u1", email="swap@test.dev", profile=edited)
+    client = endpoints.mongodb_client
+    client.get_latest_meal_plan_with_profile = lambda user_id: {"plan": plan, "profile": planned}
+    client.replace_plan_meal = lambda *args: saved.append(args) or True
+    endpoints.meal_planner_service.candidates_for = lambda profile, days: seen.append(profile) or pool
+    try:
+        res = TestClient(app).patch("/meal-plan/latest/meals", json={
+            "day_number": 1, "meal_type": "dinner", "exclude_recipe_ids": ["d2"]})
+    finally:
+        del client.get_latest_meal_plan_with_profile, client.replace_plan_meal
+        del endpoints.meal_planner_service.candidates_for
+    assert res.status_code == 200, res.text
+    dinner = res.json()["days"][0]["meals"][2]
+    assert dinner["recipe_id"] == "d3" and dinner["meal_type"] == "Dinner"  # d1 in plan, d2 excluded
+    assert seen == [planned] and saved[0][3] == "d1"  # the plan's profile, not the edited one
+    print("[SUCCESS] Swap kept the slot, skipped excluded recipes, used the plan's profile!")
+
+def test_chat_archive_claim():
+    print("\n--- Testing Concurrent Chat Archival ---")
+    import threading, time
+    from datetime import datetime, timedelta
+    from pymongo.errors import DuplicateKeyError
+    from app.db.mongodb import MongoDBClient
+
+    class FakeMeta:
+        def __init__(self):
+            self.docs, self.lock = {}, threading.Lock()
+
+        def update_one(self, query, update, upsert=False):
+            with self.lock:
+                doc = self.docs.get(query["_id"])
+                if doc is None:
+                    self.docs[query["_id"]] = dict(update["$set"])
+                elif doc["locked_until"] < query["locked_until"]["$lt"]:
+                    doc.update(update["$set"])
+                else:
+                    raise DuplicateKeyError("E11000 duplicate key")
+
+        def delete_one(self, query):
+            with self.lock:
+                if self.docs.get(query["_id"], {}).get("locked_until") == query["locked_until"]:
+                    del self.docs[query["_id"]]
+
+    start = datetime(2026, 1, 1)
+    hot = [{"_id": i, "role": "user", "content": f"m{i}", "timestamp": start + timedelta(seconds=i)}
+           for i in range(10)]
+    chat = type("Chat", (), {})()
+    chat.find = lambda query, projection: type("Cursor", (), {
+        "sort": lambda c, *a: c, "skip": lambda c, n: (time.sleep(0.05), sorted(hot, key=lambda m: -m["_id"])[n:])[1],
+    })()
+    chat.delete_many = lambda query: None
+    writes = []
+    archive = type("Archive", (), {})()
+    archive.find_one = lambda *args, **kwargs: None
+    archive.bulk_write = lambda ops, ordered: writes.append(ops)
+
+    client = MongoDBClient(uri="mongodb://127.0.0.1:1", connect=False)
+    client.chat_collection, client.chat_archive_collection, client.meta_collection = chat, archive, FakeMeta()
+    moved = []
+    threads = [threading.Thread(target=lambda: moved.append(client.archive_chat_messages("u1", 4, 100)))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(moved) == [0, 0, 6] and len(writes) == 1
+    assert client.meta_collection.docs == {}  # lease released
+    assert client.archive_chat_messages("u1", 4, 100) == 6  # and claimable again
+
+    from app.services.chat_retention import ChatRetentionService
+    retention = ChatRetentionService(check_every=3)
+    retention.archive_user = lambda user_id: archived.append(user_id)
+    archived = []
+    for _ in range(3):
+        retention.record_write("u1")
+    retention.record_write("u2")
+    retention._executor.submit(lambda: None).result()
+    assert archived == ["u1"] and retention._writes.keys() == ["u2"]  # u1's counter dropped, not kept at 0
+    print("[SUCCESS] Only one concurrent archiver moved the range!")
+
+def test_gemini_response_schemas():
+    print("\n--- Testing Gemini Response Schemas (SDK conversion) ---")
+    from types import SimpleNamespace
+    from google import genai
+    from google.genai import _transformers
+    from app.services.meal_planner import MealPlannerService
+    from app.services.nutrition import calculate_nutrition_profile
+    profile = UserProfile(height_cm=170, weight_kg=70, age=35, gender="female",
+                          activity_level="sedentary", goal="maintenance")
+    prep = {"query": "", "profile": profile, "days": 2, "nut_profile": calculate_nutrition_profile(profile),
+            "recipes": [], "recipe_context": "", "history_text": "", "final_prompt": "", "system_prompt": ""}
+    configs = []
+    record = lambda model, contents, config: configs.append(config) or SimpleNamespace(text="{}")
+    planner = MealPlannerService()
+    planner.context_cache = None
+    planner.client = SimpleNamespace(models=SimpleNamespace(generate_content=record, generate_content_stream=record))
+    planner._generate(prep)
+    planner._generate(prep, stream=True)
+    planner._reask_days(prep, [2])
+
+    # Developer API mode (api_key, not Vertex) is the strict one about additionalProperties
+    api_client = genai.Client(api_key="schema-test")._api_client
+    for config in configs:
+        schema = _transformers.t_schema(api_client, config["response_schema"])
+        assert "generation" not in (schema.properties or {})
+    print(f"[SUCCESS] {len(configs)} response schemas convert in Developer API mode!")
+
+def test_warmup_readiness():
+    print("\n--- Testing Warm-up and /ready ---")
+    import threading
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.services.warmup import WarmupService
+    gate = threading.Event()
+    service = WarmupService(retry_seconds=0)
+    service._warm_mongo = lambda: gate.wait(5) and {}
+    for step in ("_check_indexes", "_warm_recipes", "_warm_candidates", "_build_suggest_index", "_probe_llm"):
+        setattr(service, step, lambda: {})
+    original, main.warmup_service = main.warmup_service, service
+    try:
+        client = TestClient(main.app)  # no lifespan: the test drives warm-up itself
+        service.start()
+        res = client.get("/ready")
+        assert res.status_code == 503 and res.json()["components"]["mongo"]["status"] == "running"
+        assert client.get("/health").status_code == 200  # liveness never waits
+        gate.set()
+        service._thread.join(5)
+        res = client.get("/ready")
+        assert res.status_code == 200 and res.json()["ready"]
+        assert set(res.json()["components"]) == {"mongo", "indexes", "recipes", "candidates", "suggest", "llm"}
+    finally:
+        main.warmup_service = original
+    print("[SUCCESS] /ready held at 503 until warm-up finished, then 200!")
+
+def test_index_option_drift():
+    print("\n--- Testing Index Registry Option Drift ---")
+    from app.db import indexes
+    from app.db.indexes import apply_indexes
+    from pymongo import ASCENDING, IndexModel
+
+    class FakeCollection:
+        def __init__(self, info):
+            self.info, self.calls = info, []
+
+        def index_information(self):
+            return {"_id_": {"key": [("_id", 1)]}, **self.info}
+
+        def drop_index(self, name):
+            self.calls.append(("drop", name))
+
+        def create_indexes(self, models):
+            self.calls.append(("create", models[0].document["name"]))
+
+    registry = {
+        "sessions": [IndexModel([("last_ts", ASCENDING)], expireAfterSeconds=3600)],
+        "tokens": [IndexModel([("email", ASCENDING)], unique=True, sparse=True)],
+        "plans": [IndexModel([("user_id", ASCENDING)])],
+    }
+    collections = {
+        "sessions": FakeCollection({"last_ts_1": {"key": [("last_ts", 1)], "expireAfterSeconds": 60}}),
+        "tokens": FakeCollection({"email_1": {"key": [("email", 1)], "unique": True}}),
+        "plans": FakeCollection({"user_id_1": {"key": [("user_id", 1)]}}),
+    }
+    commands = []
+    db = type("FakeDB", (), {"get_collection": lambda _, name: collections[name],
+                             "command": lambda _, cmd: commands.append(cmd)})()
+    original, indexes.INDEXES = indexes.INDEXES, registry
+    try:
+        report = apply_indexes(db)
+    finally:
+        indexes.INDEXES = original
+    assert commands == [{"collMod": "sessions", "index": {"name": "last_ts_1", "expireAfterSeconds": 3600}}]
+    assert collections["sessions"].calls == []
+    assert collections["tokens"].calls == [("drop", "email_1"), ("create", "email_1")]
+    assert report["tokens"]["created"] == ["email_1 (rebuilt: sparse)"] and report["plans"]["existing"] == ["user_id_1"]
+    print("[SUCCESS] TTL drift fixed with collMod, other option drift rebuilt!")
+
+def test_read_routing():
+    print("\n--- Testing Read Routing ---")
+    from pymongo.read_preferences import Primary, SecondaryPreferred
+    from app.db.mongodb import MongoDBClient
+    # connect=False: routing is configuration, no server needed (scripts/check_read_routing.py runs it live)
+    client = MongoDBClient(uri="mongodb://127.0.0.1:1/?replicaSet=rs0", db_name="routing", primary_pool_size=7,
+                           recipe_pool_size=30, recipe_read_preference="secondaryPreferred",
+                           recipe_max_staleness=120, connect=False)
+    assert client.recipes_collection.read_preference == SecondaryPreferred(max_staleness=120)
+    assert client.corpus_meta_collection.read_preference == SecondaryPreferred(max_staleness=120)
+    for collection in (client.users_collection, client.chat_collection, client.refresh_tokens_collection):
+        assert collection.read_preference == Primary()
+    assert client.client.options.pool_options.max_pool_size == 7
+    assert client.recipe_client.options.pool_options.max_pool_size == 30
+    print("[SUCCESS] Recipe reads routed to secondaries, user/chat reads pinned to the primary!")
+
+def test_refresh_token_rotation():
+    print("\n--- Testing Refresh Token Rotation ---")
+    from fastapi import HTTPException
+    from app.api import auth
+    from app.db.mongodb import mongodb_client
+    if mongodb_client.db is None:
+        print("[SKIP] MongoDB not configured.")
+        return
+    first = auth.issue_refresh_token("refresh-test-user", "refresh@test.dev")
+    assert mongodb_client.get_refresh_token(first) is None  # only the hash is stored
+    email, second = auth.rotate_refresh_token(first)
+    assert email == "refresh@test.dev" and second != first
+    try:
+        auth.rotate_refresh_token(first)
+        assert False, "a used refresh token must be rejected"
+    except HTTPException as e:
+        assert e.status_code == 401
+    mongodb_client.delete_user_refresh_tokens("refresh-test-user")
+    print("[SUCCESS] Refresh token rotated once and rejected on reuse!")
+
 def test_rag_loop():
     print("\n--- Testing RAG Generation Loop (Scaledown + OpenRouter) ---")
     profile = UserProfile(
@@ -73,4 +937,33 @@ def test_rag_loop():
 
 if __name__ == "__main__":
     test_mongodb_persistence()
+    test_nutrition_batch()
+    test_gemini_context_cache()
+    test_day_stream_parser()
+    test_plan_repair()
+    test_prompt_builder_cache()
+    test_finalize_nutrition_targets()
+    test_prompt_compression()
+    test_remote_history_compression()
+    test_request_profiler()
+    test_tracing_summary()
+    test_cohort_chunk_planning()
+    test_ical_export()
+    test_recipe_cache_invalidation()
+    test_orjson_response_shape()
+    test_recipe_filters()
+    test_text_search_paging()
+    test_title_suggest()
+    test_recipe_dedup()
+    test_enrichment_stage_resume()
+    test_candidate_pool()
+    test_region_partitioning()
+    test_deadline_fallback()
+    test_meal_swap()
+    test_chat_archive_claim()
+    test_gemini_response_schemas()
+    test_warmup_readiness()
+    test_index_option_drift()
+    test_read_routing()
+    test_refresh_token_rotation()
     test_rag_loop()
@@ -17,10 +17,30 @@ axiosClient.interceptors.request.use((config) => {
   return config;
 });
 
+// One refresh at a time; concurrent 401s wait for the same promise
+let refreshPromise = null;
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refresh_token = localStorage.getItem("ff_refresh");
+    refreshPromise = axios
+      .post(`${BASE_URL}/auth/refresh`, { refresh_token })
+      .then((r) => {
+        localStorage.setItem("ff_token", r.data.access_token);
+        localStorage.setItem("ff_refresh", r.data.refresh_token);
+        return r.data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
 // Centralized error handling
 axiosClient.interceptors.response.use(
   (res) => res,
-  (error) => {
+  async (error) => {
     if (!error.response) {
       return Promise.reject(
         new Error(
@@ -32,6 +52,23 @@ axiosClient.interceptors.response.use(
     const { status, data, config } = error.response;
     let msg = `Server error (HTTP ${status})`;
 
+    // Expired access token: renew it with the refresh token and retry once
+    if (
+      status === 401 &&
+      !config._retried &&
+      !["/auth/login", "/auth/refresh"].includes(config.url) &&
+      localStorage.getItem("ff_refresh")
+    ) {
+      try {
+        const token = await refreshAccessToken();
+        config._retried = true;
+        config.headers.Authorization = `Bearer ${token}`;
+        return axiosClient(config);
+      } catch {
+        localStorage.removeItem("ff_refresh");
+      }
+    }
+
     // Handle session expiration (401 Unauthorized)
     if (status === 401) {
       // Don't redirect if we're actually trying to login - allow the local catch to handle "Invalid email/password"
@@ -41,6 +78,7 @@ axiosClient.interceptors.response.use(
         // Clear auth state and redirect
         localStorage.removeItem("fitfork_user");
         localStorage.removeItem("ff_token");
+        localStorage.removeItem("ff_refresh");
         localStorage.removeItem("ff_profile");
         localStorage.removeItem("ff_nutrition");
 
@@ -87,6 +125,9 @@ export const api = {
       .then((r) => r.data);
   },
 
+  logout: (refresh_token) =>
+    axiosClient.post("/auth/logout", { refresh_token }).then((r) => r.data),
+
   getMe: () => axiosClient.get("/user/me").then((r) => r.data),
   getProfile: () => axiosClient.get("/user/profile").then((r) => r.data),
   getNutrition: (profile) =>
@@ -97,7 +138,22 @@ export const api = {
       .post("/search", { query, user_profile, top_k })
       .then((r) => r.data),
 
+  // One page of structured search; pass the returned nextCursor back for the next page
+  searchRecipesPage: (query, user_profile, { filters, cursor, top_k = 12 } = {}) =>
+    axiosClient
+      .post("/search", { query, user_profile, top_k, filters, cursor })
+      .then((r) => ({ recipes: r.data, nextCursor: r.headers["x-next-cursor"] || null })),
+
+  suggestRecipes: (q, { diet, allergens, k } = {}) =>
+    axiosClient
+      .get("/recipes/suggest", {
+        params: { q, k, diet: diet?.join(","), allergens: allergens?.join(",") },
+      })
+      .then((r) => r.data),
+
   getRecipe: (id) => axiosClient.get(`/recipes/${id}`).then((r) => r.data),
+  getRecipesBatch: (ids) =>
+    axiosClient.post("/recipes/batch", { ids }).then((r) => r.data),
 
   getMealPlan: (user_profile, days = 7, meals_per_day = 3) =>
     axiosClient
@@ -107,6 +163,11 @@ export const api = {
   getLatestMealPlan: () =>
     axiosClient.get("/meal-plan/latest").then((r) => r.data),
 
+  swapMeal: (day_number, meal_type, exclude_recipe_ids = []) =>
+    axiosClient
+      .patch("/meal-plan/latest/meals", { day_number, meal_type, exclude_recipe_ids })
+      .then((r) => r.data),
+
   // Google Calendar
   getGoogleAuthUrl: () => axiosClient.get("/auth/google").then((r) => r.data),
 
@@ -121,5 +182,17 @@ export const api = {
   disconnectCalendar: () =>
     axiosClient.delete("/calendar/disconnect").then((r) => r.data),
 
+  // iCalendar export (no Google account needed)
+  downloadMealPlanIcs: (start) =>
+    axiosClient
+      .get("/meal-plan/latest.ics", { params: start ? { start } : {}, responseType: "blob" })
+      .then((r) => r.data),
+
+  createCalendarFeed: () =>
+    axiosClient.post("/calendar/feed").then((r) => r.data),
+
+  revokeCalendarFeed: () =>
+    axiosClient.delete("/calendar/feed").then((r) => r.data),
+
   health: () => axiosClient.get("/health").then((r) => r.data),
 };
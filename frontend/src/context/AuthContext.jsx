@@ -33,6 +33,7 @@ export const AuthProvider = ({ children }) => {
     try {
       const res = await api.login(email, password);
       localStorage.setItem("ff_token", res.access_token);
+      if (res.refresh_token) localStorage.setItem("ff_refresh", res.refresh_token);
       
       // Fetch real user info from the backend
       let userData;
@@ -78,8 +79,11 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem("ff_refresh");
+    if (refreshToken) api.logout(refreshToken).catch(() => {});
     localStorage.removeItem("fitfork_user");
     localStorage.removeItem("ff_token");
+    localStorage.removeItem("ff_refresh");
     localStorage.removeItem("ff_profile");
     localStorage.removeItem("ff_nutrition");
     setUser(null);
@@ -21,6 +21,15 @@ const GOAL_OPTIONS = [
 
 const DIETARY   = ["vegetarian","vegan","gluten-free","dairy-free","keto","paleo","halal","kosher","low-carb","low-fat"];
 const ALLERGENS = ["peanuts","tree nuts","dairy","eggs","wheat","soy","fish","shellfish","sesame"];
+const REGIONS = [
+  { value: "global",        label: "Anywhere / not sure" },
+  { value: "north_america", label: "North America" },
+  { value: "latin_america", label: "Latin America" },
+  { value: "europe",        label: "Europe" },
+  { value: "mediterranean", label: "Mediterranean" },
+  { value: "middle_east",   label: "Middle East" },
+  { value: "asia",          label: "Asia" },
+];
 const CUISINES  = ["Italian","Indian","Mexican","Chinese","Japanese","Thai","Mediterranean","American","French","Middle Eastern","Korean","Greek"];
 
 function Section({ title, children, delay = 0 }) {
@@ -132,6 +141,12 @@ export default function ProfilePage({ profile, onSave }) {
                 {ACTIVITY_OPTIONS.map(o => <option key={o.value} value={o.value}>{o.label}</option>)}
               </select>
             </div>
+            <div className="fg" style={{ gridColumn: "1 / -1" }}>
+              <label>Where you shop</label>
+              <select value={form.region || "global"} onChange={e => set("region", e.target.value)}>
+                {REGIONS.map(o => <option key={o.value} value={o.value}>{o.label}</option>)}
+              </select>
+            </div>
           </div>
         </Section>
 